@@ -1,8 +1,25 @@
+import os
+import random
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import json
 
-def remove_header_blocks(text, header_patterns, min_repetition_for_removal=3):
+# patrons específics detectats en la teva anàlisi
+METADATA_PATTERNS = [
+    r"\[source:\s*\d{1,3}\]",        # [source: 12]
+    r"\[font:\s*\d{1,3}\]",          # [font: 3]
+    r"\[fonte:\s*\d{1,3}\]",         # variants
+    r"\[\s*Nota:\s*.*?\]",           # [Nota: ...]
+    r"\s*\[\s*\d+\s*\]\s*$",         # [12] al final de línia
+    r"\s*\(\*\)\s*$",                # (*) al final
+]
+
+# Llista explícita i rangs Unicode segurs (sense Ø-ö).
+# Només cal A-Z, a-z i la llista de caràcters catalans/llatins més habituals.
+HYPHEN_LETTERS = r"A-Za-zÀÁÂÃÄÅÆÇÈÉÊËÌÍÎÏÑÒÓÔÕÖÙÚÛÜÝŸàáâãäåæçèéêëìíîïñòóôõöùúûüýÿç"
+
+def build_header_regex(header_patterns):
     # crea regex línia-a-línia (case-insensitive, multiline)
     parts = []
     for pat in header_patterns:
@@ -12,40 +29,157 @@ def remove_header_blocks(text, header_patterns, min_repetition_for_removal=3):
             parts.append(pat)
         else:
             parts.append(re.escape(pat))
-    combined = r"(?im)^(?:" + r"|".join(parts) + r")\s*$"
+    return r"(?im)^(?:" + r"|".join(parts) + r")\s*$"
+
+def remove_header_blocks(text, header_patterns, min_repetition_for_removal=3):
+    combined = build_header_regex(header_patterns)
     # eliminar totes les línies que coincideixin
     cleaned = re.sub(combined + r"\n?", "", text)
     # després, col·lapsar blocs de capçaleres restants (p. ex. varies línies buides)
     cleaned = re.sub(r"\n{3,}", "\n\n", cleaned)
     return cleaned, combined
 
-def remove_metadata_markers(text):
-    # patrons específics detectats en la teva anàlisi
-    patterns = [
-        r"\[source:\s*\d{1,3}\]",        # [source: 12]
-        r"\[font:\s*\d{1,3}\]",          # [font: 3]
-        r"\[fonte:\s*\d{1,3}\]",         # variants
-        r"\[\s*Nota:\s*.*?\]",           # [Nota: ...]
-        r"\s*\[\s*\d+\s*\]\s*$",         # [12] al final de línia
-        r"\s*\(\*\)\s*$",                # (*) al final
-    ]
-    removed_examples = []
-    for pat in patterns:
-        # captura contexts per auditoria
-        for m in re.finditer(r".{0,50}" + pat + r".{0,50}", text, flags=re.IGNORECASE):
-            removed_examples.append(m.group(0))
-        text = re.sub(pat, "", text, flags=re.IGNORECASE)
-    return text, removed_examples
+# els quatre primers patrons poden aparèixer a qualsevol lloc: una sola alternança els
+# elimina tots en una passada; els dos últims només poden coincidir al final del text
+INLINE_PATTERNS = [re.compile(p, re.IGNORECASE) for p in METADATA_PATTERNS[:4]]
+INLINE_MARKERS_RE = re.compile("|".join("(?:" + p + ")" for p in METADATA_PATTERNS[:4]), re.IGNORECASE)
+TRAILING_MARKERS = [
+    (re.compile(METADATA_PATTERNS[4], re.IGNORECASE), "["),
+    (re.compile(METADATA_PATTERNS[5], re.IGNORECASE), "("),
+]
+BRACKET_EVENTS_RE = re.compile(r"[\[\]\n]")
+# el que queda d'un marcador [12] tallat per un salt de línia després del '['
+TRAILING_TAIL_RE = re.compile(r"\s*\d*\s*\]\s*")
+
+def audit_context(text, start, end, width=50):
+    # equivalent a `.{0,50}` + marcador + `.{0,50}` sense sortir de la línia
+    left = max(start - width, text.rfind("\n", 0, start) + 1)
+    right = text.find("\n", end)
+    right = min(end + width, len(text) if right == -1 else right)
+    return text[left:right]
+
+def _remove_trailing_marker(text, pattern, opener):
+    # sense MULTILINE, `$` només casa al final del text: n'hi ha prou de provar
+    # a partir de l'últim obridor i dels espais que el precedeixen
+    bracket = text.rfind(opener)
+    if bracket == -1:
+        return text, None
+    start = len(text[:bracket].rstrip())
+    m = pattern.match(text, start)
+    if not m:
+        return text, None
+    return text[:start] + text[m.end():], (start, m.end())
+
+def _bracket_event(text, i, stack):
+    """
+    Actualitza `stack` (posicions dels '[' oberts) amb el claudàtor o salt de línia de la
+    posició i. Un marcador només pot travessar un salt de línia pels seus `\\s*`, és a dir,
+    si l'últim caràcter no blanc d'abans és '[', ':' o el ']' d'un marcador interior; si
+    no, cap '[' anterior pot formar ja un marcador i la pila es buida.
+    """
+    ch = text[i]
+    if ch == "[":
+        stack.append(i)
+    elif ch == "]":
+        if stack:
+            stack.pop()
+    elif stack:
+        j = i - 1
+        while j >= 0 and text[j] != "\n" and text[j].isspace():
+            j -= 1
+        # si s'arriba a un altre salt de línia, aquell ja ha decidit i no ha buidat la pila
+        if j >= 0 and text[j] not in "[:]\n":
+            stack.clear()
+
+def _track_brackets(text, start, end, stack):
+    for ev in BRACKET_EVENTS_RE.finditer(text, start, end):
+        _bracket_event(text, ev.start(), stack)
+
+def _window_end(text, start, min_end):
+    """Primer punt a partir de `min_end` on tots els '[' oberts des de `start` estan tancats o morts."""
+    stack = []
+    for ev in BRACKET_EVENTS_RE.finditer(text, start):
+        _bracket_event(text, ev.start(), stack)
+        if not stack and ev.end() >= min_end:
+            return ev.end()
+    return len(text)
+
+def _scrub_window(text, keep, before="", after=""):
+    # els patrons un darrere l'altre, com l'eliminació original: treure un marcador interior
+    # pot formar-ne un altre que només elimina un patró posterior
+    def drop(m):
+        keep(audit_context(before + m.string + after, len(before) + m.start(), len(before) + m.end()))
+        return ""
+    for pattern in INLINE_PATTERNS:
+        text = pattern.sub(drop, text)
+    return text
+
+def _scrub_markers(text, sample_size=100, seed=0, trailing=True):
+    # retorna (text, mostra, total de marcadors eliminats)
+    rng = random.Random(seed)
+    sample = []
+    seen = 0
+
+    def keep(context):
+        nonlocal seen
+        if seen < sample_size:
+            sample.append(context)
+        else:
+            j = rng.randrange(seen + 1)
+            if j < sample_size:
+                sample[j] = context
+        seen += 1
+
+    pieces = []
+    stack = []  # '[' oberts abans de la posició del recorregut
+    last = pos = 0
+    while (m := INLINE_MARKERS_RE.search(text, pos)) is not None:
+        _track_brackets(text, pos, m.start(), stack)
+        if not stack and "[" not in text[m.start() + 1:m.end()]:
+            keep(audit_context(text, m.start(), m.end()))
+            pieces.append(text[last:m.start()])
+            last = pos = m.end()
+            continue
+        # un '[' obert abans de la coincidència o un altre dins seu (marcadors niats): es
+        # resol només el tros entre el primer '[' obert i el punt on tornen a estar tots
+        # tancats (o morts), aplicant-hi els patrons en l'ordre original
+        start = stack[0] if stack else m.start()
+        end = _window_end(text, start, m.end())
+        pieces.append(text[last:start])
+        pieces.append(_scrub_window(text[start:end], keep, text[max(0, start - 50):start], text[end:end + 50]))
+        stack.clear()
+        last = pos = end
+    pieces.append(text[last:])
+    new_text = "".join(pieces)
+
+    if trailing:
+        for pattern, opener in TRAILING_MARKERS:
+            before = new_text
+            new_text, span = _remove_trailing_marker(new_text, pattern, opener)
+            if span:
+                keep(audit_context(before, *span))
+
+    return new_text, sample, seen
+
+def remove_metadata_markers(text, sample_size=100, seed=0):
+    """
+    Elimina els marcadors de metadades en una sola passada lineal.
+    Els contexts d'auditoria es retallen a partir dels offsets de cada coincidència
+    i se'n guarda una mostra acotada (reservoir sampling) de `sample_size` elements.
+    Si un marcador conté un altre marcador o la seva eliminació en pot formar un de nou,
+    els patrons s'apliquen en l'ordre original només al tros de text afectat, de manera
+    que el resultat és exactament el d'abans sense tornar a recórrer tot el text.
+    """
+    new_text, sample, _ = _scrub_markers(text, sample_size, seed)
+    return new_text, sample
 
 def fix_hyphenation_contextual(text):
     """
     Elimina hifenació (guions de separació) només si està entre lletres.
     S'eviten rangs Unicode problemàtics.
     """
-    # Llista explícita i rangs Unicode segurs (sense Ø-ö).
-    # Només cal A-Z, a-z i la llista de caràcters catalans/llatins més habituals.
-    letters = r"A-Za-zÀÁÂÃÄÅÆÇÈÉÊËÌÍÎÏÑÒÓÔÕÖÙÚÛÜÝŸàáâãäåæçèéêëìíîïñòóôõöùúûüýÿç"
-    
+    letters = HYPHEN_LETTERS
+
     # El teu codi original intentava fer això:
     # letters = r"A-Za-zÀ-ÖØ-öø-ÿÀÈÌÒÙàèìòùáéíóúàèçïäëöüâêîôû"
     # L'hem substituït per una llista més segura.
@@ -69,40 +203,160 @@ def collapse_blank_lines_preserve_entries(text):
     text = re.sub(r"^[ \t]+$", "", text, flags=re.MULTILINE)
     return text
 
+def _clean_chunk(args):
+    text, header_patterns, final = args
+    t1, header_regex = remove_header_blocks(text, header_patterns)
+    # els marcadors de final de text només poden coincidir a l'últim tros
+    t2, sample, seen = _scrub_markers(t1, trailing=final)
+    t3 = fix_hyphenation_contextual(t2)
+    counters = {
+        'hyphenation_before': len(re.findall(r"-\s*\n\s*", t2)),
+        'hyphenation_after': len(re.findall(r"-\s*\n\s*", t3)),
+    }
+    t4 = collapse_blank_lines_preserve_entries(t3)
+    return t4, header_regex, sample, seen, counters
+
+def _is_safe_boundary(text, sep_start, sep_end, header_re):
+    """
+    Un separador (un salt de línia o unes quantes línies buides) és segur si cap etapa de
+    neteja el pot travessar: les línies del voltant no són capçaleres ni poden quedar
+    buides, la línia anterior acaba en un caràcter no blanc que no és un guió (hifenació)
+    ni ':' i no té claudàtors (un marcador només travessa un salt de línia pels seus `\\s*`,
+    és a dir, just després de '[', de ':' o del ']' d'un marcador interior).
+    """
+    last = text[text.rfind("\n", 0, sep_start) + 1:sep_start]
+    nl = text.find("\n", sep_end)
+    first = text[sep_end:nl if nl != -1 else len(text)]
+    return bool(
+        last and not last[-1].isspace() and first.split("[", 1)[0].strip()
+        and not header_re.match(last) and not header_re.match(first)
+        and "[" not in last and "]" not in last
+        and not last.endswith("-") and not last.endswith(":")
+    )
+
+def _trailing_reaches_start(tail):
+    if TRAILING_TAIL_RE.fullmatch(tail):
+        return True
+    for pattern, opener in TRAILING_MARKERS:
+        tail, span = _remove_trailing_marker(tail, pattern, opener)
+        if span and span[0] == 0:
+            return True
+    return False
+
+def split_safe_chunks(text, header_patterns, chunk_chars):
+    """
+    Talla el text en trossos d'uns `chunk_chars` caràcters per separadors segurs. Retorna
+    (trossos, unions): unions[i] és el que va entre el tros i i el següent un cop netejats,
+    "\n" si el tall era un salt de línia i "\n\n" si eren línies buides (que la neteja
+    col·lapsa a una). Com que els fitxers extrets per create-dataset.py no tenen línies
+    buides, gairebé tots els talls són salts de línia entre dues línies de text.
+    """
+    header_re = re.compile(build_header_regex(header_patterns))
+    bounds = []  # (inici, final) de cada separador escollit
+    pos = chunk_chars
+    while pos < len(text):
+        sep_start = text.find("\n", pos)
+        if sep_start == -1:
+            break
+        while sep_start > 0 and text[sep_start - 1] == "\n":
+            sep_start -= 1
+        sep_end = sep_start
+        while sep_end < len(text) and text[sep_end] == "\n":
+            sep_end += 1
+        if _is_safe_boundary(text, sep_start, sep_end, header_re):
+            bounds.append((sep_start, sep_end))
+            pos = sep_end + chunk_chars
+        else:
+            pos = sep_end
+
+    # els marcadors finals ([12] i (*)) es treuen al final de tot i els seus `\\s*` poden
+    # travessar línies: si en el darrer tros, net, un d'ells en pot començar abans del
+    # principi (i menjar-se el separador), el tall es desfà
+    while bounds:
+        tail, _ = remove_header_blocks(text[bounds[-1][1]:], header_patterns)
+        if not _trailing_reaches_start(_scrub_markers(tail, 0, trailing=False)[0]):
+            break
+        bounds.pop()
+
+    chunks, start = [], 0
+    for sep_start, sep_end in bounds:
+        chunks.append(text[start:sep_start])
+        start = sep_end
+    chunks.append(text[start:])
+    return chunks, ["\n" if sep_end - sep_start == 1 else "\n\n" for sep_start, sep_end in bounds]
+
+def _merge_samples(parts, sample_size=100, seed=0):
+    # combina les mostres de cada tros com si fossin una sola mostra uniforme
+    total = sum(seen for _, seen in parts)
+    if total <= sample_size:
+        return [context for sample, _ in parts for context in sample]
+    rng = random.Random(seed)
+    pools = []
+    for sample, _ in parts:
+        pool = list(sample)
+        rng.shuffle(pool)
+        pools.append(pool)
+    remaining = [seen for _, seen in parts]
+    merged = []
+    for _ in range(sample_size):
+        r = rng.randrange(total)
+        i = 0
+        while r >= remaining[i]:
+            r -= remaining[i]
+            i += 1
+        merged.append(pools[i].pop())
+        remaining[i] -= 1
+        total -= 1
+    return merged
+
 # Exemple d'ús integrat:
-def enhanced_cleaning_pipeline(raw_text, header_patterns):
+def enhanced_cleaning_pipeline(raw_text, header_patterns, workers=1, chunk_chars=None):
+    """
+    Amb `workers > 1` el text es talla per salts de línia segurs (vegeu
+    `_is_safe_boundary`), cada tros es neteja en un procés diferent i es tornen a unir en
+    ordre; el resultat i els comptadors del log són els mateixos que en un sol procés.
+    """
     outlog = {}
-    t1, header_regex = remove_header_blocks(raw_text, header_patterns)
-    outlog['header_regex'] = header_regex
+    if workers > 1:
+        chunk_chars = chunk_chars or max(1 << 14, len(raw_text) // (workers * 4))
+        chunks, joins = split_safe_chunks(raw_text, header_patterns, chunk_chars)
+    else:
+        chunks, joins = [raw_text], []
+    tasks = [(chunk, header_patterns, i == len(chunks) - 1) for i, chunk in enumerate(chunks)]
 
-    t2, removed_meta_examples = remove_metadata_markers(t1)
-    outlog['removed_meta_examples'] = removed_meta_examples[:100]
+    if len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_clean_chunk, tasks))
+    else:
+        results = [_clean_chunk(tasks[0])]
 
-    t3 = fix_hyphenation_contextual(t2)
-    outlog['hyphenation_before'] = len(re.findall(r"-\s*\n\s*", t2))
-    outlog['hyphenation_after'] = len(re.findall(r"-\s*\n\s*", t3))
-
-    t4 = collapse_blank_lines_preserve_entries(t3)
+    t4 = results[0][0] + "".join(join + r[0] for join, r in zip(joins, results[1:]))
+    outlog['header_regex'] = results[0][1]
+    outlog['removed_meta_examples'] = _merge_samples([(r[2], r[3]) for r in results])
+    outlog['hyphenation_before'] = sum(r[4]['hyphenation_before'] for r in results)
+    outlog['hyphenation_after'] = sum(r[4]['hyphenation_after'] for r in results)
 
     # comprovacions finals ràpides
     outlog['chars_before'] = len(raw_text)
     outlog['chars_after'] = len(t4)
     return t4, outlog
 
-# Defineix el directori de sortida (necessitem la Path completa de la secció de prova)
-OUTPUT_DIR = Path("/Users/polpedrajas/Desktop/PythonProjects/nano-GPT/data/step1_output")
+if __name__ == "__main__":
+    # Defineix el directori de sortida (relatiu a aquest script, no al directori actual)
+    DATA_DIR = Path(__file__).resolve().parent
+    OUTPUT_DIR = DATA_DIR / "step1_output"
 
-# --- SOLUCIÓ CLAU: Crear el directori recursivament ---
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True) 
+    # --- SOLUCIÓ CLAU: Crear el directori recursivament ---
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True) 
 
-# Secció de prova amb les correccions
-raw = Path("/Users/polpedrajas/Desktop/PythonProjects/nano-GPT/data/dataset_catalan_medieval.txt").read_text(encoding="utf-8")
-header_patterns = ["Vocabulari_Lluis_Faraudo", "Vocabulari", r"^\s*els mots\s*$", "indd"]
+    # Secció de prova amb les correccions
+    raw = (DATA_DIR / "dataset_catalan_medieval.txt").read_text(encoding="utf-8")
+    header_patterns = ["Vocabulari_Lluis_Faraudo", "Vocabulari", r"^\s*els mots\s*$", "indd"]
 
-cleaned_text, log = enhanced_cleaning_pipeline(raw, header_patterns)
+    cleaned_text, log = enhanced_cleaning_pipeline(raw, header_patterns, workers=os.cpu_count() or 1)
 
-# Ara que el directori existeix, podem escriure sense problemes
-Path(OUTPUT_DIR / "clean_corpus_improved.txt").write_text(cleaned_text, encoding="utf-8")
-Path(OUTPUT_DIR / "clean_log_improved.json").write_text(json.dumps(log, ensure_ascii=False, indent=2), encoding="utf-8")
+    # Ara que el directori existeix, podem escriure sense problemes
+    Path(OUTPUT_DIR / "clean_corpus_improved.txt").write_text(cleaned_text, encoding="utf-8")
+    Path(OUTPUT_DIR / "clean_log_improved.json").write_text(json.dumps(log, ensure_ascii=False, indent=2), encoding="utf-8")
 
-print(f"Procés completat. Fitxers de sortida a: {OUTPUT_DIR}")
\ No newline at end of file
+    print(f"Procés completat. Fitxers de sortida a: {OUTPUT_DIR}")
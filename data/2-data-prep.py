@@ -4,13 +4,17 @@ import re, json
 from pathlib import Path
 from collections import Counter
 
+from block_cache import BlockCache, file_sha1, text_sha1
+
 # ---------- CONFIG ----------
-INPUT_FILE = Path("/Users/polpedrajas/Desktop/PythonProjects/nano-GPT/data/step1_output/clean_corpus_improved.txt")
-OUTPUT_DIR = Path("/Users/polpedrajas/Desktop/PythonProjects/nano-GPT/data/step2_output")
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+DATA_DIR = Path(__file__).resolve().parent
+INPUT_FILE = DATA_DIR / "step1_output" / "clean_corpus_improved.txt"
+OUTPUT_DIR = DATA_DIR / "step2_output"
 OUTPUT_FILE = OUTPUT_DIR / "structured_entries.jsonl"
 LOG_FILE = OUTPUT_DIR / "parsing_log.json"
 UNMATCHED_FILE = OUTPUT_DIR / "unmatched_examples.jsonl"
+# manifest hash de bloc -> resultat: només es tornen a parsejar els blocs nous o modificats
+MANIFEST_FILE = OUTPUT_DIR / "block_manifest.json"
 
 # Millor llista (ampliable) d'abreviatures de categories
 CATEGORIES = [
@@ -198,76 +202,283 @@ def parse_entry_block(block, line_start=0):
 
     return entry
 
-# ---------- Pipeline principal ----------
-text = INPUT_FILE.read_text(encoding='utf-8')
-# separar en blocs per 2 o més salts de línia (més robust)
-entry_blocks = re.split(r'\n{2,}', text)
-
-structured_data = []
-parsing_log = {
-    "total_blocks": len(entry_blocks),
-    "processed_entries": 0,
-    "section_headers": [],
-    "unmatched_entries_count": 0,
-    "unmatched_samples": [],
-    "warnings_counter": Counter()
-}
-
-line_cursor = 1
-for block in entry_blocks:
-    if not block.strip():
-        # contar salts per estimar el següent line_cursor
-        line_cursor += block.count('\n') + 1
-        continue
+# ---------- Motor compilat ----------
+# Mateixos resultats que parse_entry_block, però sense reconstruir ni repetir regex per bloc:
+# les categories es reconeixen amb un trie precompilat i les cites i la font es troben
+# amb un sol recorregut d'esquerra a dreta (lineal encara que hi hagi cometes desaparellades).
+QUOTE_OPEN_RE = re.compile(QUOTE_OPEN)
+QUOTE_CLOSE_RE = re.compile(QUOTE_CLOSE)
+NUMBER_PREFIX_RE = re.compile(r'^\s*\d+\.\s*')
+SEE_ALSO_RE = re.compile(r'\bV\.\s+[A-Z]\w.*')
+FONT_NAME_RE = re.compile(r'\b[A-ZÀ-Ú][a-zà-ú]{2,}')
+FONT_YEAR_RE = re.compile(r'\d{3,4}')
 
-    result = parse_entry_block(block, line_start=line_cursor)
+_WS = object()  # aresta de `\s*` dins el trie
 
-    # actualitzar line_cursor: el bloc té N línies
-    line_cursor += block.count('\n') + 1
+def _is_word(ch):
+    # mateixa definició que `\b` a les regex Unicode
+    return ch.isalnum() or ch == '_'
 
-    if not result:
-        continue
+class CategoryTrie:
+    """
+    Reconeix les abreviatures de CATEGORIES com ho fa `re.search(CATEGORIES_RE, s, re.I)`:
+    coincidència més a l'esquerra i, en una mateixa posició, la primera alternativa de la llista.
+    """
+    def __init__(self, categories):
+        self.root = {}
+        self.letters = set()
+        for priority, pat in enumerate(categories):
+            node = self.root
+            for token in self._tokens(pat):
+                if token is not _WS:
+                    token = token.lower()
+                    self.letters.add(token)
+                node = node.setdefault(token, {})
+            node.setdefault(None, priority)
+        self._fold = {}
+
+    @staticmethod
+    def _tokens(pat):
+        # les categories només fan servir lletres, `\.` i `\s*`
+        i = 0
+        while i < len(pat):
+            if pat.startswith("\\s*", i):
+                yield _WS
+                i += 3
+            elif pat.startswith("\\.", i):
+                yield "."
+                i += 2
+            else:
+                yield pat[i]
+                i += 1
+
+    def fold(self, ch):
+        # plegament de majúscules idèntic al de re.IGNORECASE (inclou 'ſ' -> 's', 'ı' -> 'i'...)
+        key = self._fold.get(ch)
+        if key is None:
+            key = ch
+            for letter in self.letters:
+                if re.fullmatch(re.escape(letter), ch, flags=re.IGNORECASE):
+                    key = letter
+                    break
+            self._fold[ch] = key
+        return key
+
+    def _match_at(self, s, i):
+        best = None  # (prioritat, final)
+        stack = [(self.root, i)]
+        n = len(s)
+        while stack:
+            node, pos = stack.pop()
+            priority = node.get(None)
+            if priority is not None and (best is None or priority < best[0]):
+                # `\b` final: el caràcter anterior és un punt, cal una lletra o dígit després
+                if pos < n and _is_word(s[pos]):
+                    best = (priority, pos)
+            if _WS in node:
+                ws = pos
+                while ws < n and s[ws].isspace():
+                    ws += 1
+                stack.append((node[_WS], ws))
+            if pos < n:
+                child = node.get(self.fold(s[pos]))
+                if child is not None:
+                    stack.append((child, pos + 1))
+        return best
+
+    def search(self, s):
+        """Retorna (inici, final) de la primera categoria o None."""
+        prev_word = False
+        for i, ch in enumerate(s):
+            word = _is_word(ch)
+            if word and not prev_word and self.fold(ch) in self.root:
+                best = self._match_at(s, i)
+                if best is not None:
+                    return i, best[1]
+            prev_word = word
+        return None
 
-    if isinstance(result, dict) and result.get("type") == "Section_Header":
-        parsing_log["section_headers"].append(result["content"])
-    elif isinstance(result, dict) and result.get("type") == "Unmatched_Entry":
-        parsing_log["unmatched_entries_count"] += 1
-        # guarda mostra per revisió
-        parsing_log["unmatched_samples"].append({"line_start": result.get("line_start"), "content": result.get("content")})
-    else:
-        # entrada normal
-        # si hi ha warnings, acumular
-        if result.get("warnings"):
-            for w in result["warnings"]:
-                parsing_log["warnings_counter"][w] += 1
-        structured_data.append(result)
-        parsing_log["processed_entries"] += 1
-
-# escriure JSONL de sortida amb seq per nano-GPT
-with OUTPUT_FILE.open('w', encoding='utf-8') as f_out:
-    for i, e in enumerate(structured_data):
-        seq_text = build_sequence_text(e)
-        out = {"id": i+1, "line_start": e.get("line_start"), "text": seq_text, "meta": {"Lema": e.get("Lema"), "Categoria": e.get("Categoria")}}
-        f_out.write(json.dumps(out, ensure_ascii=False) + '\n')
-
-# escriure unmatched exemples per revisió manual (limit)
-with UNMATCHED_FILE.open('w', encoding='utf-8') as f_um:
-    for item in parsing_log["unmatched_samples"][:500]:
-        f_um.write(json.dumps(item, ensure_ascii=False) + '\n')
-
-# escriure log resum
-parsing_log_summary = {
-    "total_blocks": parsing_log["total_blocks"],
-    "processed_entries": parsing_log["processed_entries"],
-    "section_headers_count": len(parsing_log["section_headers"]),
-    "unmatched_entries_count": parsing_log["unmatched_entries_count"],
-    "warnings": dict(parsing_log["warnings_counter"])
-}
-LOG_FILE.write_text(json.dumps(parsing_log_summary, ensure_ascii=False, indent=2), encoding='utf-8')
-
-print("Parseig complet.")
-print("Entrades processades:", parsing_log["processed_entries"])
-print("Entrades no coincidents (mostres al fitxer):", parsing_log["unmatched_entries_count"])
-print("Sortida JSONL:", OUTPUT_FILE)
-print("Unmatched exemples:", UNMATCHED_FILE)
-print("Log resum:", LOG_FILE)
\ No newline at end of file
+def scan_quotes(body):
+    """
+    Troba les cites com `re.finditer(r'(["“«\'])(.+?)(["”»\'])', body, re.DOTALL)` en un sol
+    recorregut: per a cada obertura, el tancament és el primer a partir de dues posicions després.
+    Retorna (exemples, text restant, inici de la primera cita o -1).
+    """
+    examples, pieces = [], []
+    first = -1
+    pos = 0
+    while True:
+        m_open = QUOTE_OPEN_RE.search(body, pos)
+        if not m_open:
+            break
+        start = m_open.start()
+        m_close = QUOTE_CLOSE_RE.search(body, start + 2)
+        if not m_close:
+            # cap obertura posterior tindrà tancament
+            break
+        end = m_close.start()
+        if first == -1:
+            first = start
+        examples.append(body[start + 1:end].strip())
+        pieces.append(body[pos:start])
+        pos = end + 1
+    pieces.append(body[pos:])
+    return examples, "".join(pieces).strip(), first
+
+class CompiledEntryParser:
+    def __init__(self, categories=CATEGORIES):
+        self.categories = CategoryTrie(categories)
+
+    def extract_lemma_line(self, lema_line):
+        raw = NUMBER_PREFIX_RE.sub('', lema_line.strip())
+        span = self.categories.search(raw)
+        if span is None:
+            return None
+        idx, end = span
+        before = raw[:idx].strip()
+        after = raw[idx:].strip()
+        categoria = raw[idx:end].strip()
+
+        variant = None
+        open_br = before.find('[')
+        close_br = before.find(']', open_br + 1) if open_br != -1 else -1
+        if close_br != -1:
+            variant = before[open_br + 1:close_br].strip()
+            before = (before[:open_br] + before[close_br + 1:]).strip()
+
+        lema = before.split(',')[0].split('/')[0].strip()
+        return {"Lema": lema or None, "Variant": variant, "Categoria": categoria, "raw_before": before, "raw_after": after}
+
+    def parse(self, block, line_start=0):
+        lines = [ln for ln in (l.rstrip() for l in block.splitlines()) if ln.strip()!='']
+        if not lines:
+            return None
+
+        entry = {
+            "Lema": None, "Variant": None, "Categoria": None,
+            "Definicio": None, "Exemple": [], "Font": None,
+            "raw_block": block.strip(), "line_start": line_start, "warnings": []
+        }
+
+        head = lines[0]
+        lemma_data = self.extract_lemma_line(head)
+        if not lemma_data:
+            # la segona passada de parse_entry_block fa servir la mateixa cerca: si no hi ha
+            # categoria a la capçalera, és capçalera de secció o entrada no reconeguda
+            if len(head) < 60 and head.endswith('.'):
+                return {"type":"Section_Header", "content": head, "line_start": line_start}
+            return {"type":"Unmatched_Entry", "content": block.strip(), "line_start": line_start}
+
+        entry["Lema"] = lemma_data["Lema"]
+        entry["Variant"] = lemma_data["Variant"]
+        entry["Categoria"] = lemma_data["Categoria"]
+
+        full_body = "\n".join(lines[1:]).strip()
+        if not full_body:
+            entry["Definicio"] = ""
+            return entry
+
+        exemples, remaining, first_quote = scan_quotes(full_body)
+        entry["Exemple"] = exemples
+
+        definicio, dash, font = remaining.partition('—')
+        if dash:
+            entry["Definicio"] = definicio.strip()
+            entry["Font"] = font.strip()
+        elif exemples:
+            entry["Definicio"] = full_body[:first_quote].strip()
+            lines_non = [ln.strip() for ln in remaining.splitlines() if ln.strip()]
+            if lines_non:
+                cand = None
+                for ln in reversed(lines_non):
+                    if FONT_NAME_RE.search(ln) or FONT_YEAR_RE.search(ln):
+                        cand = ln; break
+                entry["Font"] = cand or lines_non[-1]
+        else:
+            entry["Definicio"] = remaining
+
+        entry["Definicio"] = SEE_ALSO_RE.sub('', entry["Definicio"]).strip()
+        return entry
+
+if __name__ == "__main__":
+    # ---------- Pipeline principal ----------
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    parser = CompiledEntryParser()
+    cache = BlockCache(MANIFEST_FILE, version=file_sha1(__file__))
+    text = INPUT_FILE.read_text(encoding='utf-8')
+    # separar en blocs per 2 o més salts de línia (més robust)
+    entry_blocks = re.split(r'\n{2,}', text)
+
+    structured_data = []
+    parsing_log = {
+        "total_blocks": len(entry_blocks),
+        "processed_entries": 0,
+        "section_headers": [],
+        "unmatched_entries_count": 0,
+        "unmatched_samples": [],
+        "warnings_counter": Counter()
+    }
+
+    line_cursor = 1
+    for block in entry_blocks:
+        if not block.strip():
+            # contar salts per estimar el següent line_cursor
+            line_cursor += block.count('\n') + 1
+            continue
+
+        # el resultat només depèn del text del bloc; line_start es recalcula a cada execució
+        result = cache.get_or_parse(text_sha1(block), lambda: parser.parse(block))
+        if result:
+            result = dict(result, line_start=line_cursor)
+
+        # actualitzar line_cursor: el bloc té N línies
+        line_cursor += block.count('\n') + 1
+
+        if not result:
+            continue
+
+        if isinstance(result, dict) and result.get("type") == "Section_Header":
+            parsing_log["section_headers"].append(result["content"])
+        elif isinstance(result, dict) and result.get("type") == "Unmatched_Entry":
+            parsing_log["unmatched_entries_count"] += 1
+            # guarda mostra per revisió
+            parsing_log["unmatched_samples"].append({"line_start": result.get("line_start"), "content": result.get("content")})
+        else:
+            # entrada normal
+            # si hi ha warnings, acumular
+            if result.get("warnings"):
+                for w in result["warnings"]:
+                    parsing_log["warnings_counter"][w] += 1
+            structured_data.append(result)
+            parsing_log["processed_entries"] += 1
+
+    # escriure JSONL de sortida amb seq per nano-GPT
+    with OUTPUT_FILE.open('w', encoding='utf-8') as f_out:
+        for i, e in enumerate(structured_data):
+            seq_text = build_sequence_text(e)
+            out = {"id": i+1, "line_start": e.get("line_start"), "text": seq_text, "meta": {"Lema": e.get("Lema"), "Categoria": e.get("Categoria")}}
+            f_out.write(json.dumps(out, ensure_ascii=False) + '\n')
+
+    # escriure unmatched exemples per revisió manual (limit)
+    with UNMATCHED_FILE.open('w', encoding='utf-8') as f_um:
+        for item in parsing_log["unmatched_samples"][:500]:
+            f_um.write(json.dumps(item, ensure_ascii=False) + '\n')
+
+    # escriure log resum
+    parsing_log_summary = {
+        "total_blocks": parsing_log["total_blocks"],
+        "processed_entries": parsing_log["processed_entries"],
+        "section_headers_count": len(parsing_log["section_headers"]),
+        "unmatched_entries_count": parsing_log["unmatched_entries_count"],
+        "warnings": dict(parsing_log["warnings_counter"])
+    }
+    LOG_FILE.write_text(json.dumps(parsing_log_summary, ensure_ascii=False, indent=2), encoding='utf-8')
+    cache.save()
+
+    print("Parseig complet.")
+    print("Entrades processades:", parsing_log["processed_entries"])
+    print("Entrades no coincidents (mostres al fitxer):", parsing_log["unmatched_entries_count"])
+    print("Sortida JSONL:", OUTPUT_FILE)
+    print("Unmatched exemples:", UNMATCHED_FILE)
+    print("Log resum:", LOG_FILE)
+    print(f"Blocs reaprofitats: {cache.hits}, parsejats de nou: {cache.misses}")
@@ -0,0 +1,47 @@
+# bench_entry_parser.py
+# Compara parse_entry_block (regex per bloc) amb el motor compilat de 2-data-prep.py
+# sobre clean_corpus_improved.txt, i comprova que tots dos donen les mateixes entrades.
+import importlib
+import re
+import sys
+import time
+from pathlib import Path
+
+DATA_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(DATA_DIR))
+step2 = importlib.import_module("2-data-prep")
+
+INPUT_FILE = DATA_DIR / "step1_output" / "clean_corpus_improved.txt"
+HEAD_RE = re.compile(r"^[A-ZÀÈÉÍÒÓÚ][A-ZÀÈÉÍÒÓÚÏÜ\s'\-\(\)]+", re.MULTILINE)
+REPEATS = 5
+
+
+def best_time(fn, blocks):
+    best = float("inf")
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        results = [fn(b, line_start=i) for i, b in enumerate(blocks)]
+        best = min(best, time.perf_counter() - t0)
+    return best, results
+
+def scenarios(text):
+    # 1) els blocs tal com els talla 2-data-prep.py
+    yield "blocs \\n{2,}", re.split(r"\n{2,}", text)
+    # 2) un bloc per entrada (tallant a cada capçalera en majúscules)
+    starts = [m.start() for m in HEAD_RE.finditer(text)] + [len(text)]
+    yield "un bloc per lema", [text[a:b] for a, b in zip(starts, starts[1:])]
+    # 3) el cos sencer com una sola entrada amb cometes sense tancar (cas quadràtic)
+    body = text.translate({ord(c): None for c in "\"”»'"})
+    yield "cites desaparellades", ["ADZEBRÓ s.f\n" + body[: len(body) // 4]]
+
+
+if __name__ == "__main__":
+    text = INPUT_FILE.read_text(encoding="utf-8")
+    parser = step2.CompiledEntryParser()
+
+    print(f"{'Escenari':<22} {'blocs':>6} {'original':>10} {'compilat':>10} {'acceleració':>12}")
+    for name, blocks in scenarios(text):
+        t_old, old = best_time(step2.parse_entry_block, blocks)
+        t_new, new = best_time(parser.parse, blocks)
+        assert old == new, f"resultats diferents a l'escenari '{name}'"
+        print(f"{name:<22} {len(blocks):>6} {t_old * 1000:>8.1f}ms {t_new * 1000:>8.1f}ms {t_old / t_new:>11.1f}x")
@@ -0,0 +1,50 @@
+# block_cache.py
+# Manifest persistent hash de bloc -> resultat parsejat, per tornar a parsejar només
+# els blocs nous o modificats quan es corregeix el corpus a mà.
+import hashlib
+import json
+from pathlib import Path
+
+_MISSING = object()
+
+
+def text_sha1(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def file_sha1(path):
+    return hashlib.sha1(Path(path).read_bytes()).hexdigest()
+
+
+class BlockCache:
+    """
+    Els resultats es guarden en JSON sota el hash del bloc. `version` identifica el codi
+    del parser: si canvia, el manifest es descarta sencer. En desar només es conserven
+    les entrades consultades en aquesta execució, així el manifest no creix indefinidament.
+    """
+    def __init__(self, path, version):
+        self.path = Path(path)
+        self.version = version
+        self.entries = {}
+        self.used = {}
+        self.hits = 0
+        self.misses = 0
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("version") == version:
+                self.entries = data["entries"]
+
+    def get_or_parse(self, key, parse):
+        value = self.entries.get(key, _MISSING)
+        if value is _MISSING:
+            value = parse()
+            self.entries[key] = value
+            self.misses += 1
+        else:
+            self.hits += 1
+        self.used[key] = value
+        return value
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps({"version": self.version, "entries": self.used}, ensure_ascii=False),
+                             encoding="utf-8")
@@ -1,12 +1,142 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
 import pdfplumber
+from pdfminer.pdftypes import PDFObjRef, PDFStream, resolve1
+from pdfminer.psparser import PSKeyword, PSLiteral
 
-def extract_text_from_pdf(pdf_path):
-    all_text = []
+# Caché de páginas ya extraídas (direccionada por contenido)
+DATA_DIR = Path(__file__).resolve().parent
+CACHE_DIR = DATA_DIR / ".page_cache"
+DIGEST_VERSION = 2  # cambia cuando cambia lo que entra en la huella de cada página
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _hash_object(h, obj, memo):
+    # Serialización estable de un objeto PDF; los objetos indirectos se resumen una sola
+    # vez por documento (las fuentes y XObjects suelen compartirse entre páginas)
+    if isinstance(obj, PDFObjRef):
+        if obj.objid not in memo:
+            memo[obj.objid] = b"cycle"  # referencias circulares (/Parent, etc.)
+            sub = hashlib.sha256()
+            _hash_object(sub, obj.resolve(), memo)
+            memo[obj.objid] = sub.digest()
+        h.update(b"R" + memo[obj.objid])
+    elif isinstance(obj, dict):
+        h.update(b"d%d" % len(obj))
+        for key in sorted(obj):
+            h.update(str(key).encode("utf-8") + b"\0")
+            _hash_object(h, obj[key], memo)
+    elif isinstance(obj, (list, tuple)):
+        h.update(b"l%d" % len(obj))
+        for item in obj:
+            _hash_object(h, item, memo)
+    elif isinstance(obj, PDFStream):
+        _hash_object(h, obj.attrs, memo)
+        data = obj.get_rawdata()
+        h.update(b"s%d" % len(data) + data)
+    elif isinstance(obj, bytes):
+        h.update(b"b%d" % len(obj) + obj)
+    elif isinstance(obj, (PSLiteral, PSKeyword)):
+        h.update(b"n" + repr(obj.name).encode("utf-8"))
+    else:
+        h.update(b"v" + repr(obj).encode("utf-8"))
+
+def page_digests(pdf_path):
+    # Huella de cada página: sus streams de contenido, los recursos que usan (fuentes,
+    # XObjects...) y la geometría que recorta el texto. Mucho más barato que extraer el
+    # texto y permite detectar qué páginas han cambiado; dos páginas con el mismo
+    # contenido pero fuentes distintas no comparten entrada de caché.
+    digests = []
+    memo = {}
     with pdfplumber.open(pdf_path) as pdf:
         for page in pdf.pages:
-            text = page.extract_text()
-            if text:
-                all_text.append(text)
+            h = hashlib.sha256(f"pdfplumber {pdfplumber.__version__}".encode("utf-8"))
+            page_obj = page.page_obj
+            contents = resolve1(page_obj.attrs.get("Contents"))
+            if not isinstance(contents, list):
+                contents = [contents] if contents is not None else []
+            for stream in contents:
+                h.update(resolve1(stream).get_data())
+            for value in (page_obj.resources, page_obj.mediabox, page_obj.cropbox, page_obj.rotate):
+                _hash_object(h, value, memo)
+            digests.append(h.hexdigest())
+    return digests
+
+def _page_count(pdf_path):
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+def _extract_page_range(args):
+    # Cada worker abre el PDF por su cuenta (los objetos de pdfplumber no se pueden serializar)
+    pdf_path, page_numbers = args
+    texts = {}
+    with pdfplumber.open(pdf_path) as pdf:
+        for n in page_numbers:
+            texts[n] = pdf.pages[n].extract_text() or ""
+    return texts
+
+def _split_ranges(page_numbers, workers):
+    # Trozos contiguos para que cada worker recorra el documento en orden
+    size = max(1, -(-len(page_numbers) // workers))
+    return [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+
+def extract_pages(pdf_path, page_numbers, workers=1):
+    if not page_numbers:
+        return {}
+    if workers <= 1 or len(page_numbers) == 1:
+        return _extract_page_range((pdf_path, page_numbers))
+    texts = {}
+    ranges = _split_ranges(page_numbers, workers)
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        for part in pool.map(_extract_page_range, [(pdf_path, r) for r in ranges]):
+            texts.update(part)
+    return texts
+
+def extract_text_from_pdf(pdf_path, workers=1, cache_dir=None):
+    """
+    Extrae el texto del PDF página a página.
+
+    Con `workers > 1` las páginas se reparten en rangos entre procesos y se
+    reensamblan en orden. Con `cache_dir` cada página se guarda bajo el hash de
+    su contenido, y un índice por hash del PDF permite saltarse por completo
+    los PDFs sin cambios; si el PDF cambia solo se extraen las páginas nuevas
+    o modificadas.
+    """
+    if cache_dir is None:
+        texts = extract_pages(pdf_path, list(range(_page_count(pdf_path))), workers)
+        return "\n".join(texts[n] for n in sorted(texts) if texts[n])
+
+    cache_dir = Path(cache_dir)
+    pages_dir = cache_dir / "pages"
+    pages_dir.mkdir(parents=True, exist_ok=True)
+    index_file = cache_dir / f"{file_sha256(pdf_path)}.v{DIGEST_VERSION}.json"
+
+    if index_file.exists():
+        digests = json.loads(index_file.read_text(encoding="utf-8"))
+    else:
+        digests = page_digests(pdf_path)
+
+    missing = [n for n, d in enumerate(digests) if not (pages_dir / f"{d}.txt").exists()]
+    extracted = extract_pages(pdf_path, missing, workers)
+    for n, text in extracted.items():
+        (pages_dir / f"{digests[n]}.txt").write_text(text, encoding="utf-8")
+    index_file.write_text(json.dumps(digests), encoding="utf-8")
+
+    print(f"Páginas: {len(digests)} (extraídas: {len(missing)}, desde caché: {len(digests) - len(missing)})")
+    all_text = []
+    for d in digests:
+        text = (pages_dir / f"{d}.txt").read_text(encoding="utf-8")
+        if text:
+            all_text.append(text)
     return "\n".join(all_text)
 
 def clean_text(raw_text):
@@ -16,11 +146,11 @@ def clean_text(raw_text):
     return '\n'.join(cleaned_lines)
 
 if __name__ == "__main__":
-    pdf_path = "/Users/polpedrajas/Desktop/PythonProjects/nano-GPT/data/mots-catala-antic.pdf" 
-    raw_text = extract_text_from_pdf(pdf_path)
+    pdf_path = DATA_DIR / "mots-catala-antic.pdf"
+    raw_text = extract_text_from_pdf(pdf_path, workers=os.cpu_count() or 1, cache_dir=CACHE_DIR)
     cleaned_text = clean_text(raw_text)
-    
+
     # Guarda el texto limpio en un archivo txt para usar como dataset
-    with open("dataset_catalan_medieval.txt", "w", encoding="utf-8") as f:
+    with open(DATA_DIR / "dataset_catalan_medieval.txt", "w", encoding="utf-8") as f:
         f.write(cleaned_text)
     print("Texto extraído y limpio guardado en dataset_catalan_medieval.txt")
@@ -0,0 +1,193 @@
+# dedup.py
+# Deduplicació aproximada de les entrades finals amb MinHash + LSH.
+# Cada entrada es redueix a una signatura MinHash dels seus shingles de caràcters (en un
+# pool de processos); les signatures es parteixen en bandes i només es comparen les
+# entrades que coincideixen en alguna banda. Les parelles que superen el llindar de
+# Jaccard estimat s'agrupen en clústers: se'n conserva una entrada i la resta s'elimina
+# o s'hi fusiona (exemples que el representant no té).
+import argparse
+import json
+import os
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from entry_store import HAS_EX, EntryStore
+
+DATA_DIR = Path(__file__).resolve().parent
+STORE_DIR = DATA_DIR / "catalan_medieval_FINAL.store"
+FINAL_JSONL = DATA_DIR / "catalan_medieval_FINAL.jsonl"
+OUTPUT_TXT = DATA_DIR / "catalan_medieval_DEDUP.txt"
+OUTPUT_JSONL = DATA_DIR / "catalan_medieval_DEDUP.jsonl"
+REPORT_FILE = DATA_DIR / "dedup_report.json"
+
+SHINGLE = 5
+NUM_PERM = 128
+BANDS = 32          # 32 bandes x 4 files: parelles amb Jaccard ~0.4 ja tenen un 50% de ser candidates
+THRESHOLD = 0.8
+MERSENNE = (1 << 31) - 1
+SEED = 0
+
+TAG_RE = re.compile(r"<(?:LEMA|DEF|EX|END)>")
+EX_RE = re.compile(r"<EX>\s*(.*?)\s*<END>", re.DOTALL)
+
+
+def normalize(text):
+    # les etiquetes són comunes a totes les entrades i inflarien la similitud
+    return " ".join(TAG_RE.sub(" ", text).lower().split())
+
+def shingle_hashes(text, k=SHINGLE):
+    """Hash polinòmic de cada k-grama de bytes, vectoritzat (uint64 amb desbordament)."""
+    data = np.frombuffer(normalize(text).encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+    if len(data) < k:
+        data = np.concatenate([data, np.zeros(k - len(data), dtype=np.uint64)])
+    h = np.zeros(len(data) - k + 1, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for j in range(k):
+            h = h * np.uint64(257) + data[j:len(data) - k + 1 + j]
+    return np.unique(h % np.uint64(MERSENNE))
+
+def permutations(num_perm=NUM_PERM, seed=SEED):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MERSENNE, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, MERSENNE, size=num_perm, dtype=np.uint64)
+    return a, b
+
+def minhash(texts, num_perm=NUM_PERM, seed=SEED):
+    """Signatures (len(texts), num_perm) en uint32; a·x + b < 2^62 no desborda."""
+    a, b = permutations(num_perm, seed)
+    out = np.empty((len(texts), num_perm), dtype=np.uint32)
+    for i, text in enumerate(texts):
+        x = shingle_hashes(text)
+        out[i] = ((a[:, None] * x[None, :] + b[:, None]) % np.uint64(MERSENNE)).min(axis=1)
+    return out
+
+def signatures(texts, workers=None, chunk=2000, num_perm=NUM_PERM):
+    chunks = [texts[i:i + chunk] for i in range(0, len(texts), chunk)]
+    if workers == 1 or len(chunks) <= 1:
+        parts = [minhash(c, num_perm) for c in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(minhash, chunks, [num_perm] * len(chunks)))
+    return np.concatenate(parts) if parts else np.empty((0, num_perm), dtype=np.uint32)
+
+
+def candidate_pairs(sigs, bands=BANDS):
+    rows = sigs.shape[1] // bands
+    pairs = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        block = np.ascontiguousarray(sigs[:, band * rows:(band + 1) * rows])
+        for i, key in enumerate(block.view(f"V{block.itemsize * rows}").ravel().tolist()):
+            buckets[key].append(i)
+        for members in buckets.values():
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    pairs.add((members[x], members[y]))
+    return pairs
+
+def clusters(sigs, pairs, threshold=THRESHOLD):
+    """Union-find sobre les parelles amb Jaccard estimat >= threshold."""
+    parent = list(range(len(sigs)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    similarity = {}
+    for i, j in pairs:
+        sim = float((sigs[i] == sigs[j]).mean())
+        if sim >= threshold:
+            similarity[(i, j)] = sim
+            parent[find(j)] = find(i)
+    groups = defaultdict(list)
+    for i in range(len(sigs)):
+        groups[find(i)].append(i)
+    return [sorted(g) for g in groups.values() if len(g) > 1], similarity
+
+
+def merge_examples(representative, others):
+    """Afegeix a l'<EX> del representant els exemples dels duplicats que no hi són."""
+    extra = []
+    current = EX_RE.search(representative)
+    seen = current.group(1) if current else ""
+    for text in others:
+        m = EX_RE.search(text)
+        if m and m.group(1) not in seen and m.group(1) not in extra:
+            extra.append(m.group(1))
+    if not extra:
+        return representative
+    if current:
+        return representative[:current.end(1)] + " " + " ".join(extra) + representative[current.end(1):]
+    return representative.replace("<END>", "<EX> " + " ".join(extra) + " <END>")
+
+
+def load_store(store_dir=STORE_DIR, final_jsonl=FINAL_JSONL):
+    # l'entrada declarada de l'etapa és el JSONL: el magatzem només es fa servir si en és
+    # còpia exacta (mateix nombre d'entrades i hash); si no hi és o ha quedat antic (p. ex.
+    # FINAL restaurat des dels artefactes) es refà del JSONL
+    store = EntryStore.open_if_current(store_dir, final_jsonl)
+    if store is not None:
+        return store
+    with open(final_jsonl, encoding="utf-8") as f:
+        return EntryStore.from_texts(json.loads(line)["text"] for line in f)
+
+
+def deduplicate(store, merge=False, threshold=THRESHOLD, workers=None):
+    """
+    Retorna (textos finals, informe). Dins de cada clúster es conserva l'entrada amb
+    exemple i més llarga (a igualtat, la primera).
+    """
+    texts = list(store.texts())
+    sigs = signatures(texts, workers)
+    pairs = candidate_pairs(sigs)
+    groups, similarity = clusters(sigs, pairs, threshold)
+
+    has_example = store.has(HAS_EX)
+    lengths = np.asarray(store.char_lengths)
+    dropped, replaced, report = set(), {}, []
+    for group in groups:
+        keep = max(group, key=lambda i: (has_example[i], lengths[i], -i))
+        others = [i for i in group if i != keep]
+        dropped.update(others)
+        if merge:
+            replaced[keep] = merge_examples(texts[keep], [texts[i] for i in others])
+        report.append({
+            "keep": keep + 1,
+            "lema": store.lemma(keep),
+            "duplicates": [{"id": i + 1, "lema": store.lemma(i),
+                            "similarity": similarity.get((min(i, keep), max(i, keep)))} for i in others],
+            "merged": merge and replaced[keep] != texts[keep],
+        })
+    kept = [i for i in range(len(texts)) if i not in dropped]
+    summary = {"entries": len(texts), "candidate_pairs": len(pairs), "clusters": len(groups),
+               "removed": len(dropped), "final_entries": len(kept), "threshold": threshold,
+               "num_perm": sigs.shape[1], "bands": BANDS, "shingle": SHINGLE, "merge": merge}
+    return [replaced.get(i, texts[i]) for i in kept], {"summary": summary, "clusters": report}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Elimina o fusiona entrades gairebé duplicades.")
+    parser.add_argument("--store", default=STORE_DIR, help="magatzem generat per limpieza.py")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--merge", action="store_true", help="fusiona els exemples dels duplicats")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    final_texts, report = deduplicate(load_store(args.store), args.merge, args.threshold, args.workers)
+    final = EntryStore.from_texts(final_texts)
+    final.export_txt(OUTPUT_TXT)
+    final.export_jsonl(OUTPUT_JSONL)
+    REPORT_FILE.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    s = report["summary"]
+    print(f"✓ Entrades: {s['entries']}, parelles candidates: {s['candidate_pairs']}, clústers: {s['clusters']}")
+    print(f"✓ Eliminades: {s['removed']}, finals: {s['final_entries']}")
+    for c in report["clusters"][:5]:
+        print(f"  {c['lema']} <- {', '.join(str(d['lema']) for d in c['duplicates'])}")
+    print(f"✓ Dataset: {OUTPUT_TXT}\n✓ JSONL: {OUTPUT_JSONL}\n✓ Informe: {REPORT_FILE}")
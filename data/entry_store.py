@@ -0,0 +1,174 @@
+# entry_store.py
+# Magatzem columnar d'entrades: tot el text en un sol buffer UTF-8 contigu i, per a cada
+# entrada, offset, longitud, flags i id de lema en arrays de NumPy. Es desa en un directori
+# i es torna a obrir amb memmap, de manera que filtres, estadístiques i descarts per
+# longitud són operacions vectoritzades sense tornar a llegir ni escanejar el text.
+import hashlib
+import json
+import re
+from pathlib import Path
+
+import numpy as np
+
+# flags (bits) de cada entrada
+HAS_LEMA = 1
+HAS_DEF = 2
+HAS_EX = 4
+HAS_END = 8
+
+LEMA_RE = re.compile(r'<LEMA>\s*([^<\n]+?)(?:\s*<DEF>|<END>)')  # el lema de les metadades del JSONL
+COLUMNS = ("offsets", "byte_lengths", "char_lengths", "flags", "lemma_ids")
+SOURCE_FILE = 'source.json'  # de quin fitxer exportat és còpia el magatzem
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def entry_flags(text):
+    return ((HAS_LEMA if '<LEMA>' in text else 0) | (HAS_DEF if '<DEF>' in text else 0)
+            | (HAS_EX if '<EX>' in text else 0) | (HAS_END if '<END>' in text else 0))
+
+
+class EntryStore:
+    """
+    `buffer` és un array uint8 (normalment un memmap) i les columnes són arrays
+    paral·lels indexats per entrada. `lemmas` és la taula de lemes únics; `lemma_ids`
+    hi apunta, amb -1 quan l'entrada no té lema. `take` i `filter` retornen un altre
+    EntryStore que comparteix el buffer.
+    """
+    def __init__(self, buffer, offsets, byte_lengths, char_lengths, flags, lemma_ids, lemmas):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.byte_lengths = byte_lengths
+        self.char_lengths = char_lengths
+        self.flags = flags
+        self.lemma_ids = lemma_ids
+        self.lemmas = lemmas
+
+    @classmethod
+    def from_texts(cls, texts, lemma_re=LEMA_RE):
+        """Construeix el magatzem en memòria: és l'única passada en Python per entrada."""
+        chunks, offsets, byte_lengths, char_lengths, flags, lemma_ids = [], [], [], [], [], []
+        table = {}
+        pos = 0
+        for text in texts:
+            data = text.encode('utf-8')
+            chunks.append(data)
+            offsets.append(pos)
+            byte_lengths.append(len(data))
+            char_lengths.append(len(text))
+            flags.append(entry_flags(text))
+            m = lemma_re.search(text)
+            lemma_ids.append(table.setdefault(m.group(1).strip(), len(table)) if m else -1)
+            pos += len(data)
+        return cls(np.frombuffer(b''.join(chunks), dtype=np.uint8),
+                   np.array(offsets, dtype=np.int64), np.array(byte_lengths, dtype=np.int32),
+                   np.array(char_lengths, dtype=np.int32), np.array(flags, dtype=np.uint8),
+                   np.array(lemma_ids, dtype=np.int32), list(table))
+
+    def save(self, path):
+        """Desa el magatzem compactat (només el text de les entrades presents)."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        offsets = np.zeros(len(self), dtype=np.int64)
+        np.cumsum(self.byte_lengths[:-1], out=offsets[1:])
+        with open(path / 'text.bin', 'wb') as f:
+            for o, n in zip(self.offsets.tolist(), self.byte_lengths.tolist()):
+                f.write(self.buffer[o:o + n].tobytes())
+        np.save(path / 'offsets.npy', offsets)
+        for name in COLUMNS[1:]:
+            np.save(path / f'{name}.npy', getattr(self, name))
+        (path / 'lemmas.json').write_text(json.dumps(self.lemmas, ensure_ascii=False), encoding='utf-8')
+
+    @classmethod
+    def open(cls, path):
+        path = Path(path)
+        text = path / 'text.bin'
+        buffer = np.memmap(text, dtype=np.uint8, mode='r') if text.stat().st_size else np.zeros(0, np.uint8)
+        columns = [np.load(path / f'{name}.npy', mmap_mode='r') for name in COLUMNS]
+        lemmas = json.loads((path / 'lemmas.json').read_text(encoding='utf-8'))
+        return cls(buffer, *columns, lemmas)
+
+    # ---------- Correspondència amb el fitxer exportat ----------
+    def mark_source(self, path, source):
+        """Anota a `path` el nombre d'entrades i el hash de `source` (p. ex. el JSONL exportat)."""
+        stamp = {'source': Path(source).name, 'entries': len(self), 'sha256': file_sha256(source)}
+        (Path(path) / SOURCE_FILE).write_text(json.dumps(stamp), encoding='utf-8')
+
+    @classmethod
+    def open_if_current(cls, path, source):
+        """El magatzem de `path` si encara correspon a `source` (mateixes entrades i hash); si no, None."""
+        try:
+            stamp = json.loads((Path(path) / SOURCE_FILE).read_text(encoding='utf-8'))
+            store = cls.open(path)
+        except (OSError, ValueError):
+            return None
+        if stamp.get('entries') != len(store) or stamp.get('sha256') != file_sha256(source):
+            return None
+        return store
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def text(self, i):
+        o = int(self.offsets[i])
+        return self.buffer[o:o + int(self.byte_lengths[i])].tobytes().decode('utf-8')
+
+    def texts(self):
+        for i in range(len(self)):
+            yield self.text(i)
+
+    def lemma(self, i):
+        lemma_id = int(self.lemma_ids[i])
+        return self.lemmas[lemma_id] if lemma_id >= 0 else None
+
+    def lemma_column(self, fn, dtype):
+        """Aplica `fn` un cop per lema únic i ho reparteix a totes les entrades (-1 -> 0)."""
+        table = np.array([fn(l) for l in self.lemmas] + [0], dtype=dtype)
+        return table[self.lemma_ids]
+
+    def has(self, flag):
+        return (self.flags & flag) != 0
+
+    def take(self, index):
+        return EntryStore(self.buffer, *(np.asarray(getattr(self, name))[index] for name in COLUMNS),
+                          self.lemmas)
+
+    def filter(self, mask):
+        return self.take(np.flatnonzero(mask))
+
+    def stats(self):
+        n = len(self)
+        total = int(self.char_lengths.sum())
+        with_examples = int(self.has(HAS_EX).sum())
+        return {
+            'entries': n,
+            'chars': total,
+            'avg_chars': total / n if n else 0.0,
+            'entries_with_examples': with_examples,
+            'example_coverage': with_examples / n * 100 if n else 0.0,
+        }
+
+    # ---------- Exportació als formats de sempre ----------
+    def export_txt(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n\n'.join(self.texts()))
+
+    def export_jsonl(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            has_example = self.has(HAS_EX).tolist()
+            lengths = self.char_lengths.tolist()
+            for i, text in enumerate(self.texts()):
+                lemma = self.lemma(i) or "UNKNOWN"
+                json.dump({
+                    'id': i + 1,
+                    'lema': lemma[:50],
+                    'has_example': has_example[i],
+                    'length': lengths[i],
+                    'text': text
+                }, f, ensure_ascii=False)
+                f.write('\n')
@@ -0,0 +1,194 @@
+# ingest.py
+# Ingesta per lots: un directori de diccionaris (PDF o TXT) -> shards de mida acotada amb
+# el format <LEMA> ... <DEF> ... <EX> ... <END>. Cada font es processa en un worker del
+# pool amb la cadena en streaming de stream_pipeline.py, i el manifest guarda el progrés
+# de cada font perquè una execució interrompuda continuï on s'havia quedat.
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import stream_pipeline
+from parse_vocabulari import PROFILES
+
+DATA_DIR = Path(__file__).resolve().parent
+SOURCES_DIR = DATA_DIR / "dictionaries"
+OUTPUT_DIR = DATA_DIR / "shards"
+MANIFEST_NAME = "manifest.json"
+PROGRESS_NAME = "progress.json"
+SOURCE_SUFFIXES = {".pdf", ".txt"}
+MAX_SHARD_BYTES = 8 << 20
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def write_json_atomic(path, data):
+    # es reemplaça el fitxer sencer, així una interrupció mai deixa un manifest a mitges
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+def find_sources(sources_dir):
+    return sorted(p for p in Path(sources_dir).iterdir()
+                  if p.is_file() and p.suffix.lower() in SOURCE_SUFFIXES)
+
+
+class ShardWriter:
+    """
+    Escriu les seqüències en shards TXT + JSONL numerats; en passar de `max_bytes`
+    (mesurat sobre el TXT en UTF-8) tanca el shard i avisa `on_shard` amb el total
+    d'entrades escrites fins aleshores. Un shard tancat ja no es torna a escriure.
+    """
+    def __init__(self, shard_dir, source_name, max_bytes=MAX_SHARD_BYTES, start_shard=0,
+                 start_count=0, on_shard=None):
+        self.shard_dir = Path(shard_dir)
+        self.source_name = source_name
+        self.max_bytes = max_bytes
+        self.shard = start_shard
+        self.count = start_count
+        self.on_shard = on_shard
+        self._txt = self._jsonl = None
+        self._size = 0
+
+    def _open(self):
+        stem = self.shard_dir / f"shard-{self.shard:05d}"
+        self._txt = open(stem.with_suffix(".txt"), "w", encoding="utf-8")
+        self._jsonl = open(stem.with_suffix(".jsonl"), "w", encoding="utf-8")
+        self._size = 0
+
+    def _close(self):
+        self._txt.close()
+        self._jsonl.close()
+        self._txt = self._jsonl = None
+        self.shard += 1
+        if self.on_shard is not None:
+            self.on_shard(self.shard, self.count)
+
+    def write(self, record):
+        if self._txt is None:
+            self._open()
+        data = record if not self._size else "\n\n" + record
+        self._txt.write(data)
+        self._size += len(data.encode("utf-8"))
+        self.count += 1
+        json.dump({"id": self.count, "source": self.source_name, "text": record}, self._jsonl, ensure_ascii=False)
+        self._jsonl.write("\n")
+        if self._size >= self.max_bytes:
+            self._close()
+
+    def close(self):
+        if self._txt is not None:
+            self._close()
+
+
+def ingest_source(source, shard_dir, profile_name="v4", header_patterns=None, max_bytes=MAX_SHARD_BYTES):
+    """
+    Processa una font sencera (s'executa dins d'un worker). Si el directori de shards
+    té un progress.json de la mateixa font, se salten les entrades dels shards ja
+    tancats i es continua pel següent.
+    """
+    source, shard_dir = Path(source), Path(shard_dir)
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    digest = file_sha256(source)
+    progress_path = shard_dir / PROGRESS_NAME
+    progress = {"sha256": digest, "shards": 0, "entries": 0}
+    if progress_path.exists():
+        saved = json.loads(progress_path.read_text(encoding="utf-8"))
+        if saved.get("sha256") == digest:
+            progress = saved
+
+    def on_shard(shards, entries):
+        write_json_atomic(progress_path, {"sha256": digest, "shards": shards, "entries": entries})
+
+    profile = PROFILES[profile_name]
+    lines = stream_pipeline.iter_source_lines(source)
+    lines = stream_pipeline.clean_lines(lines, header_patterns or stream_pipeline.HEADER_PATTERNS)
+    records = stream_pipeline.iter_records(lines, profile)
+
+    writer = ShardWriter(shard_dir, source.name, max_bytes, progress["shards"], progress["entries"], on_shard)
+    for i, record in enumerate(records):
+        if i < progress["entries"]:
+            continue
+        writer.write(record)
+    writer.close()
+    # shards sobrants d'una execució anterior amb una altra mida de shard
+    for stale in shard_dir.glob("shard-*"):
+        if int(stale.stem.split("-")[1]) >= writer.shard:
+            stale.unlink()
+    return {"sha256": digest, "entries": writer.count, "shards": writer.shard,
+            "resumed_from": progress["entries"]}
+
+
+def shard_dir_for(output_dir, source):
+    # "vocabulari.pdf" -> "vocabulari_pdf", perquè un PDF i el seu TXT no comparteixin shards
+    return Path(output_dir) / source.name.replace(".", "_")
+
+
+def run_ingest(sources_dir=SOURCES_DIR, output_dir=OUTPUT_DIR, workers=None, profile_name="v4",
+               header_patterns=None, max_bytes=MAX_SHARD_BYTES):
+    """
+    Ingesta totes les fonts de `sources_dir`. Les que ja consten com a acabades al manifest
+    amb el mateix hash se salten; la resta s'envien al pool. El manifest es desa cada cop
+    que acaba una font. Retorna la llista (font, estat, info).
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else {}
+    settings = {"profile": profile_name, "header_patterns": header_patterns, "max_bytes": max_bytes}
+    if manifest.get("settings") != settings:
+        # amb uns altres paràmetres els shards existents ja no són vàlids
+        manifest = {"settings": settings, "sources": {}}
+        for progress in output_dir.glob(f"*/{PROGRESS_NAME}"):
+            progress.unlink()
+    done = manifest["sources"]
+
+    report, pending = [], []
+    for source in find_sources(sources_dir):
+        entry = done.get(source.name)
+        if entry and entry["status"] == "done" and entry["sha256"] == file_sha256(source):
+            report.append((source.name, "skipped", entry))
+        else:
+            pending.append(source)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(ingest_source, src, shard_dir_for(output_dir, src), profile_name,
+                               header_patterns, max_bytes): src for src in pending}
+        for fut in as_completed(futures):
+            src = futures[fut]
+            try:
+                info = fut.result()
+                done[src.name] = dict(info, status="done", shard_dir=str(shard_dir_for(output_dir, src)))
+                status = "resumed" if info["resumed_from"] else "ran"
+            except Exception as e:
+                info = {"error": str(e)}
+                done[src.name] = dict(info, status="failed")
+                status = "failed"
+            write_json_atomic(manifest_path, manifest)
+            report.append((src.name, status, info))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingesta un directori de diccionaris en shards.")
+    parser.add_argument("sources", nargs="?", default=SOURCES_DIR, help="directori amb PDFs o TXT")
+    parser.add_argument("--output", default=OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--profile", default="v4", choices=sorted(PROFILES))
+    parser.add_argument("--header-pattern", action="append", dest="header_patterns",
+                        help="capçaleres de pàgina a eliminar (per defecte, les del Vocabulari)")
+    parser.add_argument("--max-shard-mb", type=float, default=MAX_SHARD_BYTES / (1 << 20))
+    args = parser.parse_args()
+
+    report = run_ingest(args.sources, args.output, args.workers, args.profile,
+                        args.header_patterns, int(args.max_shard_mb * (1 << 20)))
+    print(f"{'Font':<32} {'Estat':<8} {'Entrades':>9} {'Shards':>7}")
+    for name, status, info in report:
+        print(f"{name:<32} {status:<8} {info.get('entries', '-'):>9} {info.get('shards', '-'):>7}")
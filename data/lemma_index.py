@@ -0,0 +1,207 @@
+# lemma_index.py
+# Índex ordenat i mapat a memòria dels lemes del dataset final.
+# Cada entrada de catalan_medieval_FINAL.txt aporta el seu lema i les variants gràfiques
+# que apareixen entre claudàtors dins la definició (p. ex. ",[HAERIPILL]" a AERIPILL).
+# Les claus es guarden ordenades dues vegades, tal qual i sense accents, de manera que la
+# cerca exacta, per prefix o insensible als accents és una cerca binària O(log n) sobre
+# arrays de NumPy oberts amb memmap. La reconstrucció és incremental: les entrades que no
+# han canviat reaprofiten les claus del manifest (block_cache.py).
+import argparse
+import json
+import re
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+
+from block_cache import BlockCache, file_sha1, text_sha1
+from entry_store import LEMA_RE
+
+DATA_DIR = Path(__file__).resolve().parent
+DATASET = DATA_DIR / "catalan_medieval_FINAL.txt"
+INDEX_DIR = DATA_DIR / "catalan_medieval_FINAL.index"
+
+LEMMA, VARIANT = 0, 1
+KINDS = ("lema", "variant")
+TABLES = ("exact", "folded")
+SEPARATOR = b"\n\n"
+
+DEF_RE = re.compile(r"<DEF>(.*?)(?:<EX>|<END>|$)", re.DOTALL)
+VARIANT_RE = re.compile(r"\[([A-ZÀÈÉÍÏÒÓÚÜÇĿŀ·'’\- ,]+)\]")
+
+
+def normalize(form):
+    return " ".join(unicodedata.normalize("NFC", form).upper().split())
+
+def fold(form):
+    """Forma sense accents ni diacrítics: "ADZEBRÓ" -> "ADZEBRO"."""
+    decomposed = unicodedata.normalize("NFD", normalize(form))
+    return unicodedata.normalize("NFC", "".join(c for c in decomposed if not unicodedata.combining(c)))
+
+def entry_keys(text):
+    """[(tipus, forma normalitzada)] d'una entrada: el lema i les variants de la definició."""
+    keys = []
+    m = LEMA_RE.search(text)
+    if m:
+        keys.append((LEMMA, normalize(m.group(1))))
+    d = DEF_RE.search(text)
+    if d:
+        for group in VARIANT_RE.findall(d.group(1)):
+            for form in group.split(","):
+                form = normalize(form)
+                if form and (VARIANT, form) not in keys:
+                    keys.append((VARIANT, form))
+    return keys
+
+def iter_entries(data):
+    """(offset en bytes, longitud, text) de cada entrada del dataset separat per línies en blanc."""
+    pos = 0
+    while pos <= len(data):
+        end = data.find(SEPARATOR, pos)
+        if end < 0:
+            end = len(data)
+        if end > pos:
+            yield pos, end - pos, data[pos:end].decode("utf-8")
+        pos = end + len(SEPARATOR)
+
+
+def write_table(index_dir, name, keys, offsets, lengths, kinds):
+    encoded = [k.encode("utf-8") for k in keys]
+    order = np.argsort(np.array(encoded, dtype=bytes), kind="stable") if encoded else np.zeros(0, np.int64)
+    sorted_keys = [encoded[i] for i in order.tolist()]
+    key_offsets = np.zeros(len(sorted_keys) + 1, dtype=np.int64)
+    np.cumsum([len(k) for k in sorted_keys], out=key_offsets[1:])
+    (index_dir / f"{name}_keys.bin").write_bytes(b"".join(sorted_keys))
+    np.save(index_dir / f"{name}_key_offsets.npy", key_offsets)
+    np.save(index_dir / f"{name}_offsets.npy", np.asarray(offsets, dtype=np.int64)[order])
+    np.save(index_dir / f"{name}_lengths.npy", np.asarray(lengths, dtype=np.int32)[order])
+    np.save(index_dir / f"{name}_kinds.npy", np.asarray(kinds, dtype=np.uint8)[order])
+
+def build_index(dataset=DATASET, index_dir=INDEX_DIR, force=False):
+    """
+    (Re)construeix l'índex si el dataset ha canviat. Retorna un diccionari amb
+    'rebuilt', 'entries', 'keys' i 'reparsed' (entrades que no eren al manifest).
+    """
+    dataset, index_dir = Path(dataset), Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    meta_path = index_dir / "meta.json"
+    version = file_sha1(__file__)
+    source_sha = file_sha1(dataset)
+    if meta_path.exists() and not force:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        # la ruta també ha de coincidir: índexs antics la guardaven relativa al directori actual
+        if (meta["source_sha1"] == source_sha and meta["version"] == version
+                and meta["source"] == str(dataset.resolve())):
+            return dict(meta, rebuilt=False, reparsed=0)
+
+    cache = BlockCache(index_dir / "entry_manifest.json", version)
+    data = dataset.read_bytes()
+    forms, offsets, lengths, kinds = [], [], [], []
+    entries = 0
+    for offset, length, text in iter_entries(data):
+        entries += 1
+        for kind, form in cache.get_or_parse(text_sha1(text), lambda: entry_keys(text)):
+            forms.append(form)
+            offsets.append(offset)
+            lengths.append(length)
+            kinds.append(kind)
+    cache.save()
+
+    write_table(index_dir, "exact", forms, offsets, lengths, kinds)
+    write_table(index_dir, "folded", [fold(f) for f in forms], offsets, lengths, kinds)
+    meta = {"source": str(dataset.resolve()), "source_sha1": source_sha, "version": version,
+            "entries": entries, "keys": len(forms)}
+    meta_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    return dict(meta, rebuilt=True, reparsed=cache.misses)
+
+
+class SortedKeys:
+    """Una taula de claus ordenades (bytes UTF-8) amb les seves columnes, tot amb memmap."""
+    def __init__(self, index_dir, name):
+        blob = index_dir / f"{name}_keys.bin"
+        self.blob = np.memmap(blob, dtype=np.uint8, mode="r") if blob.stat().st_size else np.zeros(0, np.uint8)
+        self.key_offsets = np.load(index_dir / f"{name}_key_offsets.npy", mmap_mode="r")
+        self.offsets = np.load(index_dir / f"{name}_offsets.npy", mmap_mode="r")
+        self.lengths = np.load(index_dir / f"{name}_lengths.npy", mmap_mode="r")
+        self.kinds = np.load(index_dir / f"{name}_kinds.npy", mmap_mode="r")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def key(self, i):
+        return self.blob[int(self.key_offsets[i]):int(self.key_offsets[i + 1])].tobytes()
+
+    def bisect_left(self, target):
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def range(self, target, prefix=False):
+        start = self.bisect_left(target)
+        # en UTF-8 cap caràcter comença per \xff: és una cota superior de tots els prefixos
+        end = self.bisect_left(target + b"\xff") if prefix else self.bisect_left(target + b"\x00")
+        return start, end
+
+
+class LemmaIndex:
+    """
+    Cerques sobre l'índex construït per build_index. Cada resultat és un diccionari amb
+    la clau, el tipus ('lema' o 'variant') i l'offset i la longitud en bytes de l'entrada
+    dins del dataset; `text(hit)` en llegeix el text del dataset mapat a memòria.
+    """
+    def __init__(self, index_dir=INDEX_DIR):
+        index_dir = Path(index_dir)
+        self.meta = json.loads((index_dir / "meta.json").read_text(encoding="utf-8"))
+        self.tables = {name: SortedKeys(index_dir, name) for name in TABLES}
+        dataset = Path(self.meta["source"])
+        self.dataset = np.memmap(dataset, dtype=np.uint8, mode="r") if dataset.stat().st_size else np.zeros(0, np.uint8)
+
+    def _search(self, form, prefix, accents):
+        table = self.tables["exact" if accents else "folded"]
+        target = (normalize(form) if accents else fold(form)).encode("utf-8")
+        start, end = table.range(target, prefix)
+        return [{"key": table.key(i).decode("utf-8"), "kind": KINDS[int(table.kinds[i])],
+                 "offset": int(table.offsets[i]), "length": int(table.lengths[i])} for i in range(start, end)]
+
+    def exact(self, form):
+        return self._search(form, prefix=False, accents=True)
+
+    def prefix(self, form, accents=True):
+        return self._search(form, prefix=True, accents=accents)
+
+    def lookup(self, form):
+        """Cerca insensible als accents: "adzebro" troba ADZEBRÓ."""
+        return self._search(form, prefix=False, accents=False)
+
+    def text(self, hit):
+        return self.dataset[hit["offset"]:hit["offset"] + hit["length"]].tobytes().decode("utf-8")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cerca lemes i variants al dataset final.")
+    parser.add_argument("forms", nargs="*", help="formes a cercar")
+    parser.add_argument("--dataset", default=DATASET)
+    parser.add_argument("--index", default=INDEX_DIR)
+    parser.add_argument("--prefix", action="store_true", help="cerca per prefix")
+    parser.add_argument("--ignore-accents", action="store_true")
+    parser.add_argument("--rebuild", action="store_true", help="reconstrueix encara que el dataset no hagi canviat")
+    args = parser.parse_args()
+
+    info = build_index(args.dataset, args.index, force=args.rebuild)
+    state = f"reconstruït ({info['reparsed']} entrades parsejades de nou)" if info["rebuilt"] else "al dia"
+    print(f"✓ Índex {state}: {info['entries']} entrades, {info['keys']} claus")
+
+    index = LemmaIndex(args.index)
+    for form in args.forms:
+        if args.prefix:
+            hits = index.prefix(form, accents=not args.ignore_accents)
+        else:
+            hits = index.lookup(form) if args.ignore_accents else index.exact(form)
+        print(f"\n{form}: {len(hits)} resultats")
+        for hit in hits:
+            print(f"  [{hit['kind']}] {hit['key']} @ {hit['offset']}: {index.text(hit)[:100]}")
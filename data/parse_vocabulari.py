@@ -0,0 +1,209 @@
+# parse_vocabulari.py
+# Parser único para las variantes v2, v3 y v4 del dataset (antes 3-, 4- y 5-data-prep.py).
+# Cada variante es un perfil con nombre; varios perfiles comparten una sola lectura del
+# corpus y cada entrada se escribe al TXT y al JSONL en la misma pasada.
+import json
+import re
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+from block_cache import BlockCache, file_sha1, text_sha1
+
+DATA_DIR = Path(__file__).resolve().parent
+CLEAN_CORPUS = DATA_DIR / 'step1_output' / 'clean_corpus_improved.txt'
+
+LEMA_LAZY = r'^([A-ZÀÈÉÍÒÓÚ][A-ZÀÈÉÍÒÓÚÏÜ\s\'\-\(\)]+?)'   # v2: "ADZEBRÓ"
+LEMA_GREEDY = r'^([A-ZÀÈÉÍÒÓÚ][A-ZÀÈÉÍÒÓÚÏÜ\s\'\-\(\)]+)'  # v3/v4: también "ARC ANGLÈS"
+VARIANTE = r'\s*(?:\[([^\]]+)\])?'
+CATEGORIA = r'\s*(\[?(?:s|v|adj|adv|prep|interj|conj|loc|fr|num|art|un)\.?[^\]]*\]?)?'
+
+# Captura los distintos tipos de comillas: "", «», “”.
+EXAMPLE_PATTERN = re.compile(r'["«“](.*?)["»”]', re.DOTALL)
+
+
+@dataclass(frozen=True)
+class Profile:
+    name: str
+    greedy_lema: bool       # v3 quitó el '?' del lema
+    preprocess: bool        # v4 normaliza "LEMA[s." y quita <DEF>/<EX> incrustados
+    strip_see_also: bool    # v2/v3 eliminan referencias "V." al final de la definición
+    min_example_len: int
+    max_def: int
+    max_ex: int
+    join_open_bracket: bool  # v3/v4 también hacen .replace(' [', '[')
+    output_txt: str
+    output_jsonl: str
+
+    @property
+    def entry_pattern(self):
+        return _entry_pattern(self.greedy_lema)
+
+
+@lru_cache(maxsize=None)
+def _entry_pattern(greedy_lema):
+    return re.compile((LEMA_GREEDY if greedy_lema else LEMA_LAZY) + VARIANTE + CATEGORIA, re.MULTILINE)
+
+
+PROFILES = {
+    'v2': Profile('v2', greedy_lema=False, preprocess=False, strip_see_also=True,
+                  min_example_len=15, max_def=250, max_ex=400, join_open_bracket=False,
+                  output_txt='catalan_medieval_dataset_v2.txt',
+                  output_jsonl='catalan_medieval_structured_v2.jsonl'),
+    'v3': Profile('v3', greedy_lema=True, preprocess=False, strip_see_also=True,
+                  min_example_len=15, max_def=300, max_ex=400, join_open_bracket=True,
+                  output_txt='catalan_medieval_dataset_v3.txt',
+                  output_jsonl='catalan_medieval_structured_v3.jsonl'),
+    'v4': Profile('v4', greedy_lema=True, preprocess=True, strip_see_also=False,
+                  min_example_len=10, max_def=350, max_ex=450, join_open_bracket=True,
+                  output_txt='catalan_medieval_dataset_v4.txt',
+                  output_jsonl='catalan_medieval_structured_v4.jsonl'),
+}
+
+
+def preprocess(content):
+    # 1. Añade un espacio entre una palabra y un corchete si no lo hay: "ALAFIA[s." -> "ALAFIA [s."
+    content = re.sub(r'([a-zA-ZÀ-Ú])(\[)', r'\1 \2', content)
+    # 2. Elimina etiquetas <DEF> o <EX> que puedan estar incrustadas en el texto.
+    content = content.replace('<DEF>', '').replace('</DEF>', '')
+    content = content.replace('<EX>', '').replace('</EX>', '')
+    return content
+
+
+def build_record(lema, variante, categoria, body, profile):
+    """Construye la secuencia <LEMA> ... <END> de una entrada, o None si queda vacía."""
+    ejemplos = EXAMPLE_PATTERN.findall(body)
+    ejemplos_clean = [' '.join(ej.split()) for ej in ejemplos if len(ej.strip()) > profile.min_example_len]
+
+    # La definición es el texto que queda ANTES del primer ejemplo.
+    first_example_match = EXAMPLE_PATTERN.search(body)
+    definicion_raw = body[:first_example_match.start()] if first_example_match else body
+
+    definicion_clean = re.sub(r'^\d+\.\s*(DA:)?\s*', '', definicion_raw.strip())
+    if profile.strip_see_also:
+        definicion_clean = re.sub(r'\s*V\.\s+[\w\s,.-]+$', '', definicion_clean)
+    definicion_clean = ' '.join(definicion_clean.split())
+
+    if not definicion_clean and not ejemplos_clean:
+        return None
+
+    cat_str = f"[{categoria}]" if categoria else ""
+    var_str = f" [{variante}]" if variante else ""
+    seq_parts = [f"<LEMA> {lema}{var_str} {cat_str}".strip()]
+    if definicion_clean:
+        seq_parts.append(f"<DEF> {definicion_clean[:profile.max_def]}")
+    if ejemplos_clean:
+        ejemplos_text = " ".join(ejemplos_clean[:2])[:profile.max_ex]
+        seq_parts.append(f"<EX> {ejemplos_text}")
+    seq_parts.append("<END>")
+
+    final_seq = re.sub(r'\s+', ' ', " ".join(seq_parts)).replace(' ]', ']')
+    if profile.join_open_bracket:
+        final_seq = final_seq.replace(' [', '[')
+    return final_seq
+
+
+def match_fields(match):
+    lema, variante, categoria = match.groups()
+    return lema.strip(), variante.strip() if variante else None, categoria.strip() if categoria else None
+
+
+def iter_records(content, profile, stats=None, cache=None):
+    """
+    Genera las secuencias de un perfil; el cuerpo de cada entrada llega hasta la siguiente.
+    Con `cache` (BlockCache) solo se reconstruyen las entradas nuevas o modificadas.
+    """
+    matches = profile.entry_pattern.finditer(content)
+    current = next(matches, None)
+    while current is not None:
+        following = next(matches, None)
+        end_body = following.start() if following else len(content)
+        if stats is not None:
+            stats['detected'] += 1
+        fields = match_fields(current)
+        body = content[current.end():end_body].strip()
+        if cache is None:
+            record = build_record(*fields, body, profile)
+        else:
+            key = text_sha1(json.dumps([profile.name, *fields, body], ensure_ascii=False))
+            record = cache.get_or_parse(key, lambda: build_record(*fields, body, profile))
+        if record:
+            yield record
+        current = following
+
+
+class RecordWriter:
+    """Escribe cada secuencia a la vez en el TXT (separado por líneas en blanco) y en el JSONL."""
+    def __init__(self, output_txt, output_jsonl, preview=3):
+        self.output_txt = output_txt
+        self.output_jsonl = output_jsonl
+        self.count = 0
+        self.preview = []
+        self._preview_size = preview
+
+    def __enter__(self):
+        self._txt = open(self.output_txt, 'w', encoding='utf-8')
+        self._jsonl = open(self.output_jsonl, 'w', encoding='utf-8')
+        return self
+
+    def write(self, record):
+        if self.count:
+            self._txt.write('\n\n')
+        self._txt.write(record)
+        self.count += 1
+        json.dump({'id': self.count, 'text': record}, self._jsonl, ensure_ascii=False)
+        self._jsonl.write('\n')
+        if len(self.preview) < self._preview_size:
+            self.preview.append(record)
+
+    def __exit__(self, *exc):
+        self._txt.close()
+        self._jsonl.close()
+
+
+def run_profiles(input_path, profiles, output_dir='.', manifest_dir=None):
+    """
+    Aplica varios perfiles sobre una sola lectura del corpus.
+    Con `manifest_dir`, cada perfil guarda un manifiesto hash de entrada -> secuencia y en
+    las siguientes ejecuciones solo reconstruye las entradas que han cambiado.
+    Devuelve, por perfil, las entradas detectadas, las escritas y las primeras secuencias.
+    """
+    with open(input_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    contents = {False: content}
+    if any(p.preprocess for p in profiles):
+        contents[True] = preprocess(content)
+
+    output_dir = Path(output_dir)
+    version = file_sha1(__file__)
+    results = {}
+    for profile in profiles:
+        stats = {'detected': 0}
+        cache = None
+        if manifest_dir is not None:
+            cache = BlockCache(Path(manifest_dir) / f'parse_manifest_{profile.name}.json', version)
+        with RecordWriter(output_dir / profile.output_txt, output_dir / profile.output_jsonl) as writer:
+            for record in iter_records(contents[profile.preprocess], profile, stats, cache):
+                writer.write(record)
+        if cache is not None:
+            cache.save()
+        results[profile.name] = {
+            'detected': stats['detected'],
+            'written': writer.count,
+            'reparsed': cache.misses if cache is not None else stats['detected'],
+            'preview': writer.preview,
+            'output_txt': writer.output_txt,
+            'output_jsonl': writer.output_jsonl,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    input_file_path = CLEAN_CORPUS
+    names = sys.argv[1:] or list(PROFILES)
+
+    results = run_profiles(input_file_path, [PROFILES[n] for n in names], DATA_DIR, manifest_dir=DATA_DIR)
+    for name, res in results.items():
+        print(f"✓ {name}: {res['written']} entradas ({res['detected']} detectadas, {res['reparsed']} reconstruidas)"
+              f" -> {res['output_txt']}, {res['output_jsonl']}")
@@ -0,0 +1,220 @@
+# run_pipeline.py
+# Executor incremental de la cadena de preparació de dades.
+# Cada etapa declara el codi, les entrades, els paràmetres i les sortides; se'n calcula
+# un hash i només s'executa si ha canviat alguna cosa. Les sortides es guarden en un
+# magatzem direccionat per contingut, de manera que tornar a una combinació ja vista
+# (p. ex. desfer un canvi a limpieza.py) les recupera sense tornar a executar res.
+import argparse
+import hashlib
+import json
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+
+DATA_DIR = Path(__file__).resolve().parent
+STATE_FILE = DATA_DIR / ".pipeline_state.json"
+ARTIFACTS_DIR = DATA_DIR / ".artifacts"
+
+
+@dataclass
+class Stage:
+    name: str
+    code: list          # fitxers de codi; el primer és l'script que s'executa
+    inputs: list
+    outputs: list
+    params: dict = field(default_factory=dict)
+    run: object = None  # funció opcional run(**params); si no, s'executa l'script
+
+    def execute(self):
+        before = {rel: mtime_ns(DATA_DIR / rel) for rel in self.outputs}
+        if self.run is not None:
+            self.run(**self.params)
+        else:
+            # els scripts resolen les rutes a partir del seu directori (Path(__file__).parent)
+            subprocess.run([sys.executable, self.code[0]], cwd=DATA_DIR, check=True,
+                           stdout=subprocess.DEVNULL)
+        # una sortida que no s'ha tornat a escriure és d'una execució anterior: no es pot
+        # desar com a resultat d'aquesta
+        stale = [rel for rel in self.outputs if mtime_ns(DATA_DIR / rel) in (None, before[rel])]
+        if stale:
+            raise RuntimeError(f"L'etapa '{self.name}' no ha escrit {', '.join(stale)}")
+
+
+def mtime_ns(path):
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def _run_stream(source, output_txt, output_jsonl):
+    if str(DATA_DIR) not in sys.path:
+        sys.path.insert(0, str(DATA_DIR))
+    import stream_pipeline
+    stream_pipeline.run_stream_pipeline(DATA_DIR / source, DATA_DIR / output_txt, DATA_DIR / output_jsonl)
+
+
+STAGES = [
+    Stage("extract", ["create-dataset.py"],
+          inputs=["mots-catala-antic.pdf"],
+          outputs=["dataset_catalan_medieval.txt"]),
+    Stage("clean", ["1-data-prep.py"],
+          inputs=["dataset_catalan_medieval.txt"],
+          outputs=["step1_output/clean_corpus_improved.txt", "step1_output/clean_log_improved.json"]),
+    Stage("structured", ["2-data-prep.py", "block_cache.py"],
+          inputs=["step1_output/clean_corpus_improved.txt"],
+          outputs=["step2_output/structured_entries.jsonl", "step2_output/parsing_log.json",
+                   "step2_output/unmatched_examples.jsonl"]),
+    Stage("parse_v2", ["3-data-prep.py", "parse_vocabulari.py", "block_cache.py"],
+          inputs=["step1_output/clean_corpus_improved.txt"],
+          outputs=["catalan_medieval_dataset_v2.txt", "catalan_medieval_structured_v2.jsonl"]),
+    Stage("parse_v3", ["4-data-prep.py", "parse_vocabulari.py", "block_cache.py"],
+          inputs=["step1_output/clean_corpus_improved.txt"],
+          outputs=["catalan_medieval_dataset_v3.txt", "catalan_medieval_structured_v3.jsonl"]),
+    Stage("parse_v4", ["5-data-prep.py", "parse_vocabulari.py", "block_cache.py"],
+          inputs=["step1_output/clean_corpus_improved.txt"],
+          outputs=["catalan_medieval_dataset_v4.txt", "catalan_medieval_structured_v4.jsonl"]),
+    Stage("final", ["limpieza.py", "entry_store.py"],
+          inputs=["catalan_medieval_dataset_v4.txt"],
+          outputs=["catalan_medieval_FINAL.txt", "catalan_medieval_FINAL.jsonl", "cleaning_light_log.json"]),
+    Stage("dedup", ["dedup.py", "entry_store.py"],
+          inputs=["catalan_medieval_FINAL.jsonl"],
+          outputs=["catalan_medieval_DEDUP.txt", "catalan_medieval_DEDUP.jsonl", "dedup_report.json"]),
+    Stage("stream", ["stream_pipeline.py", "1-data-prep.py", "parse_vocabulari.py", "block_cache.py"],
+          inputs=["mots-catala-antic.pdf"],
+          outputs=["catalan_medieval_dataset_stream.txt", "catalan_medieval_structured_stream.jsonl"],
+          params={"source": "mots-catala-antic.pdf",
+                  "output_txt": "catalan_medieval_dataset_stream.txt",
+                  "output_jsonl": "catalan_medieval_structured_stream.jsonl"},
+          run=_run_stream),
+]
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def stage_key(stage):
+    """Hash del codi, les entrades i els paràmetres d'una etapa."""
+    h = hashlib.sha256()
+    for group in (stage.code, stage.inputs):
+        for rel in group:
+            h.update(rel.encode("utf-8"))
+            h.update(file_sha256(DATA_DIR / rel).encode("ascii"))
+    h.update(json.dumps(stage.params, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+def outputs_match(recorded):
+    for rel, digest in recorded.items():
+        path = DATA_DIR / rel
+        if not path.exists() or file_sha256(path) != digest:
+            return False
+    return True
+
+def restore_outputs(recorded):
+    """Recupera les sortides des del magatzem d'artefactes; False si en falta algun."""
+    if not all((ARTIFACTS_DIR / digest).exists() for digest in recorded.values()):
+        return False
+    for rel, digest in recorded.items():
+        path = DATA_DIR / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(ARTIFACTS_DIR / digest, path)
+    return True
+
+def store_outputs(stage):
+    ARTIFACTS_DIR.mkdir(exist_ok=True)
+    recorded = {}
+    for rel in stage.outputs:
+        path = DATA_DIR / rel
+        if not path.exists():
+            raise FileNotFoundError(f"L'etapa '{stage.name}' no ha generat {rel}")
+        digest = file_sha256(path)
+        if not (ARTIFACTS_DIR / digest).exists():
+            shutil.copyfile(path, ARTIFACTS_DIR / digest)
+        recorded[rel] = digest
+    return recorded
+
+def run_stage(stage, state, force=False):
+    """Retorna (estat, segons): 'skipped', 'restored' o 'ran'."""
+    t0 = time.perf_counter()
+    key = stage_key(stage)
+    recorded = state.get(stage.name, {}).get(key)
+    if recorded is not None and not force:
+        if outputs_match(recorded):
+            return "skipped", time.perf_counter() - t0
+        if restore_outputs(recorded):
+            return "restored", time.perf_counter() - t0
+    stage.execute()
+    state.setdefault(stage.name, {})[key] = store_outputs(stage)
+    return "ran", time.perf_counter() - t0
+
+def select_stages(stages, targets):
+    """Etapes necessàries per produir els objectius (amb totes les seves dependències)."""
+    if not targets:
+        return list(stages)
+    producer = {out: s for s in stages for out in s.outputs}
+    by_name = {s.name: s for s in stages}
+    needed = set()
+    pending = [by_name[t] for t in targets]
+    while pending:
+        s = pending.pop()
+        if s.name in needed:
+            continue
+        needed.add(s.name)
+        pending.extend(producer[i] for i in s.inputs if i in producer)
+    return [s for s in stages if s.name in needed]
+
+def run_pipeline(stages=STAGES, targets=None, force=(), workers=4):
+    stages = select_stages(stages, targets)
+    state = json.loads(STATE_FILE.read_text(encoding="utf-8")) if STATE_FILE.exists() else {}
+
+    producer = {out: s.name for s in stages for out in s.outputs}
+    deps = {s.name: {producer[i] for i in s.inputs if i in producer} for s in stages}
+    remaining = {s.name: s for s in stages}
+    done, failed, report = set(), set(), []
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        while remaining or running:
+            # etapes amb totes les dependències acabades; les branques independents van en paral·lel
+            for name in [n for n in remaining if deps[n] <= done]:
+                stage = remaining.pop(name)
+                running[pool.submit(run_stage, stage, state, name in force)] = name
+            for name in [n for n in remaining if deps[n] & failed]:
+                remaining.pop(name)
+                failed.add(name)
+                report.append((name, "blocked", 0.0))
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                name = running.pop(fut)
+                try:
+                    status, seconds = fut.result()
+                    done.add(name)
+                except Exception as e:
+                    status, seconds = f"failed ({e})", 0.0
+                    failed.add(name)
+                report.append((name, status, seconds))
+
+    STATE_FILE.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa les etapes de preparació de dades que han canviat.")
+    parser.add_argument("targets", nargs="*", help="etapes a produir (per defecte, totes)")
+    parser.add_argument("--force", nargs="*", default=[], help="etapes a executar encara que no hagin canviat")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    report = run_pipeline(targets=args.targets, force=set(args.force), workers=args.workers)
+    print(f"{'Etapa':<12} {'Estat':<10} {'Temps':>8}")
+    for name, status, seconds in report:
+        print(f"{name:<12} {status:<10} {seconds:>7.2f}s")
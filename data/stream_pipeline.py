@@ -0,0 +1,177 @@
+# stream_pipeline.py
+# Pipeline en streaming: del PDF (o d'un .txt ja extret) fins al dataset d'entrenament.
+# Cada etapa és un generador de línies o de blocs, de manera que a memòria només hi ha
+# una pàgina i l'entrada que s'està parsejant, mai el corpus sencer.
+import importlib
+import re
+import sys
+from pathlib import Path
+
+DATA_DIR = Path(__file__).resolve().parent
+if str(DATA_DIR) not in sys.path:
+    sys.path.insert(0, str(DATA_DIR))
+
+# els scripts numerats no es poden importar amb `import`, però sí amb importlib
+prep = importlib.import_module("1-data-prep")
+from parse_vocabulari import PROFILES, RecordWriter, build_record, match_fields, preprocess
+
+HEADER_PATTERNS = ["Vocabulari_Lluis_Faraudo", "Vocabulari", r"^\s*els mots\s*$", "indd"]
+
+# el parseig d'entrades fa servir el perfil v4 de parse_vocabulari.py
+PROFILE = PROFILES['v4']
+ENTRY_PATTERN = PROFILE.entry_pattern
+
+
+# ---------- Fonts ----------
+def iter_pdf_pages(pdf_path):
+    import pdfplumber
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            text = page.extract_text()
+            # alliberem la caché de la pàgina: pdfplumber la guarda fins que es tanca el PDF
+            page.close()
+            if text:
+                yield text
+
+def iter_page_lines(pages):
+    # equivalent a clean_text() de create-dataset.py, pàgina a pàgina
+    for page in pages:
+        for line in page.split('\n'):
+            line = line.strip()
+            if line:
+                yield line
+
+def iter_source_lines(source):
+    source = Path(source)
+    if source.suffix.lower() == ".pdf":
+        return iter_page_lines(iter_pdf_pages(source))
+    return iter_text_lines(source)
+
+def iter_text_lines(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield line.rstrip('\n')
+
+
+# ---------- Neteja (equivalents en línia de 1-data-prep.py) ----------
+def drop_header_lines(lines, header_patterns):
+    regex = re.compile(prep.build_header_regex(header_patterns))
+    after_header = False
+    for line in lines:
+        if regex.match(line):
+            after_header = True
+            continue
+        # el `\s*$` de la regex original també s'emporta les línies buides següents
+        if after_header and not line.strip():
+            continue
+        after_header = False
+        yield line
+
+def strip_metadata_markers(lines):
+    # els patrons amb `$` s'apliquen a cada final de línia, tal com indiquen els comentaris
+    patterns = [re.compile(p, re.IGNORECASE) for p in prep.METADATA_PATTERNS]
+    for line in lines:
+        for pat in patterns:
+            line = pat.sub("", line)
+        yield line
+
+def join_hyphenation(lines):
+    letters = prep.HYPHEN_LETTERS
+    ends_hyphen = re.compile(r"[" + letters + r"]-\s*$", re.IGNORECASE)
+    starts_letter = re.compile(r"\s*[" + letters + r"]", re.IGNORECASE)
+    pending = None
+    held = []  # línies buides entre el guió i la continuació
+    for line in lines:
+        if pending is not None and ends_hyphen.search(pending):
+            if not line.strip():
+                held.append(line)
+                continue
+            if starts_letter.match(line):
+                pending = pending.rstrip()[:-1] + line.lstrip()
+                held = []
+                continue
+        if pending is not None:
+            yield pending
+            yield from held
+            held = []
+        pending = line
+    if pending is not None:
+        yield pending
+        yield from held
+
+def collapse_blank_lines(lines):
+    prev_empty = False
+    for line in lines:
+        if line == "" and prev_empty:
+            continue
+        prev_empty = line == ""
+        yield line.rstrip()
+
+def clean_lines(lines, header_patterns=HEADER_PATTERNS):
+    lines = drop_header_lines(lines, header_patterns)
+    lines = strip_metadata_markers(lines)
+    lines = join_hyphenation(lines)
+    return collapse_blank_lines(lines)
+
+
+# ---------- Parseig d'entrades (perfil v4) ----------
+def preprocess_lines(lines):
+    for line in lines:
+        yield preprocess(line)
+
+def iter_entry_blocks(lines, profile=PROFILE):
+    """
+    Agrupa les línies en blocs d'entrada: un bloc comença a cada línia que
+    encaixa amb el patró de lema. El text anterior al primer lema es descarta.
+    A diferència de la versió sobre el text sencer, el patró de capçalera
+    només s'aplica a la primera línia del bloc (vegeu parse_entry), de manera
+    que la categoria ja no pot engolir el cos ni les entrades següents.
+    """
+    block = []
+    for line in lines:
+        if profile.entry_pattern.match(line):
+            if block:
+                yield "\n".join(block)
+            block = [line]
+        elif block:
+            block.append(line)
+    if block:
+        yield "\n".join(block)
+
+def parse_entry(block, profile=PROFILE):
+    head, _, rest = block.partition('\n')
+    match = profile.entry_pattern.match(head)
+    body = (head[match.end():] + '\n' + rest).strip()
+    return build_record(*match_fields(match), body, profile)
+
+def iter_records(lines, profile=PROFILE):
+    if profile.preprocess:
+        lines = preprocess_lines(lines)
+    for block in iter_entry_blocks(lines, profile):
+        record = parse_entry(block, profile)
+        if record:
+            yield record
+
+
+# ---------- Escriptura ----------
+def write_records(records, output_txt, output_jsonl):
+    # TXT i JSONL s'escriuen en la mateixa passada, entrada a entrada
+    with RecordWriter(output_txt, output_jsonl) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.count
+
+def run_stream_pipeline(source, output_txt, output_jsonl, header_patterns=HEADER_PATTERNS):
+    lines = iter_source_lines(source)
+    return write_records(iter_records(clean_lines(lines, header_patterns)), output_txt, output_jsonl)
+
+
+if __name__ == "__main__":
+    SOURCE = DATA_DIR / "mots-catala-antic.pdf"
+    OUTPUT_TXT = DATA_DIR / "catalan_medieval_dataset_stream.txt"
+    OUTPUT_JSONL = DATA_DIR / "catalan_medieval_structured_stream.jsonl"
+
+    total = run_stream_pipeline(SOURCE, OUTPUT_TXT, OUTPUT_JSONL)
+    print(f"✓ Entrades escrites en streaming: {total}")
+    print(f"✓ Dataset: {OUTPUT_TXT}")
+    print(f"✓ JSONL: {OUTPUT_JSONL}")
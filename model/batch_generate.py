@@ -0,0 +1,183 @@
+# batch_generate.py
+# Generación de entradas de diccionario a partir de una lista de lemas, por lotes.
+# Todos los prompts empiezan igual (un preámbulo opcional de entradas de ejemplo y la
+# etiqueta <LEMA>), así que ese prefijo se pasa por el modelo una sola vez y su KVCache
+# se copia en cada lote. Lo que cambia por lema (" ADZEBRÓ <DEF>") se rellena por la
+# izquierda hasta la longitud del más largo del lote; las posiciones de relleno quedan
+# fuera de la atención y no cuentan en las posiciones de cada fila. Cada secuencia se
+# detiene al generar <END> y sale del lote, que sigue solo con las que faltan.
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+from grammar import RecordGrammar
+from model import KVCache, sample_logits
+from packing import FINAL_JSONL
+from tokens import CharTokenizer
+from train import load_model
+
+END_TAG = '<END>'
+
+
+def lemma_suffix(lemma):
+    # el prefijo acaba en la etiqueta: con BPE las etiquetas son tokens atómicos y el
+    # corte entre prefijo y sufijo no cambia la tokenización
+    return f' {lemma} <DEF>'
+
+def load_preamble(path=FINAL_JSONL, n_shots=0):
+    """Las n_shots primeras entradas de catalan_medieval_FINAL.jsonl, una por línea."""
+    if not n_shots:
+        return ''
+    with open(path, 'r', encoding='utf-8') as f:
+        texts = [json.loads(line)['text'] for line, _ in zip(f, range(n_shots))]
+    return '\n\n'.join(texts) + '\n\n'
+
+
+def left_pad(cache, seqs):
+    """
+    Prepara `cache` para seguir con secuencias de distinta longitud: las rellena por la
+    izquierda hasta la más larga, justo después de lo que ya hay en la caché, y marca el
+    relleno como no válido. Devuelve los ids (B, S) que hay que pasar por el modelo.
+    """
+    device = cache.k.device
+    S, start = max(len(s) for s in seqs), cache.length
+    cache.pad = torch.tensor([S - len(s) for s in seqs], device=device)
+    slots = torch.arange(cache.k.size(3), device=device)
+    cache.valid = ~((slots >= start) & (slots < start + cache.pad[:, None]))
+    x = torch.zeros((len(seqs), S), dtype=torch.long, device=device)
+    for b, s in enumerate(seqs):
+        x[b, S - len(s):] = torch.tensor(s, dtype=torch.long)
+    return x
+
+@torch.no_grad()
+def prefill(model, ids, device='cpu'):
+    """KVCache de una fila con `ids` ya procesados."""
+    cache = KVCache(model.config, 1, device, model.lm_head.weight.dtype)
+    model(torch.tensor([ids], dtype=torch.long, device=device), cache=cache)
+    return cache
+
+@torch.no_grad()
+def generate_batch(model, prefix_cache, suffixes, end_ids, max_new_tokens, temperature=1.0, top_k=None,
+                   grammar=None, states=None):
+    """
+    Genera a continuación de prefijo + cada sufijo. Devuelve, por sufijo, la lista de ids
+    generados (acabada en end_ids si la secuencia ha llegado a <END>). Con `grammar`
+    (grammar.RecordGrammar) y el estado inicial de cada fila, solo se muestrean tokens que
+    mantienen el registro bien formado y cada fila termina al cerrar su <END>.
+    """
+    device, B = prefix_cache.k.device, len(suffixes)
+    cache = KVCache.from_prefix(prefix_cache, B)
+    logits, _ = model(left_pad(cache, suffixes), cache=cache)
+
+    out = [[] for _ in range(B)]
+    rows = list(range(B))  # fila original de cada fila viva del lote
+    n_end = len(end_ids)
+    steps = min(max_new_tokens, model.config.block_size - cache.length + 1)
+    for step in range(steps):
+        last = logits[:, -1, :]
+        if grammar is not None:
+            last = grammar.mask(last, states, steps - step - 1)
+        nxt = sample_logits(last, temperature, top_k)
+        if grammar is not None:
+            states = grammar.advance(states, nxt[:, 0])
+            finished = (states == grammar.done).tolist()
+        keep = []
+        for i, (r, t) in enumerate(zip(rows, nxt[:, 0].tolist())):
+            out[r].append(t)
+            if not (finished[i] if grammar is not None else out[r][-n_end:] == end_ids):
+                keep.append(i)
+        if not keep or step == steps - 1:
+            break
+        if len(keep) < len(rows):
+            # las terminadas salen del lote: las siguientes pasadas son más estrechas
+            index = torch.tensor(keep, device=device)
+            cache.keep(index)
+            nxt = nxt[index]
+            rows = [rows[i] for i in keep]
+            if grammar is not None:
+                states = states[index]
+        logits, _ = model(nxt, cache=cache)
+    return out
+
+def generate_entries(model, tokenizer, lemmas, preamble='', tag='<LEMA>', batch_size=32,
+                     max_new_tokens=256, temperature=1.0, top_k=None, device='cpu', grammar=None):
+    """
+    Una entrada "<LEMA> X <DEF> ... <END>" por lema, en el mismo orden. Los lemas se
+    agrupan por longitud del sufijo para que los lotes lleven poco relleno. Con `grammar`,
+    la decodificación queda restringida al formato del registro.
+    """
+    prefix_cache = prefill(model, tokenizer.encode(preamble + tag), device)
+    suffixes = [tokenizer.encode(lemma_suffix(lemma)) for lemma in lemmas]
+    end_ids = tokenizer.encode(END_TAG)
+    order = sorted(range(len(lemmas)), key=lambda i: len(suffixes[i]))
+    entries = [None] * len(lemmas)
+    for i in range(0, len(order), batch_size):
+        chunk = order[i:i + batch_size]
+        states = None
+        if grammar is not None:
+            states = torch.tensor([grammar.state_of(tag + lemma_suffix(lemmas[j])) for j in chunk], device=device)
+        generated = generate_batch(model, prefix_cache, [suffixes[j] for j in chunk], end_ids,
+                                   max_new_tokens, temperature, top_k, grammar, states)
+        for j, ids in zip(chunk, generated):
+            entries[j] = tag + lemma_suffix(lemmas[j]) + tokenizer.decode(ids)
+    return entries
+
+def generate_sequential(model, tokenizer, lemmas, preamble='', tag='<LEMA>', max_new_tokens=256,
+                        temperature=1.0, top_k=None, device='cpu'):
+    """La forma de antes: un GPT.generate por lema, cortando después en <END>."""
+    entries = []
+    for lemma in lemmas:
+        prompt = tokenizer.encode(preamble + tag + lemma_suffix(lemma))
+        idx = torch.tensor([prompt], dtype=torch.long, device=device)
+        steps = min(max_new_tokens, model.config.block_size - len(prompt) + 1)
+        text = tokenizer.decode(model.generate(idx, steps, temperature, top_k)[0, len(prompt):].tolist())
+        if END_TAG in text:
+            text = text[:text.index(END_TAG) + len(END_TAG)]
+        entries.append(tag + lemma_suffix(lemma) + text)
+    return entries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera entradas para una lista de lemas.")
+    parser.add_argument('lemmas', nargs='*', help="lemas; si no hay, se leen de stdin (uno por línea)")
+    parser.add_argument('--ckpt', default=str(Path(__file__).resolve().parent / 'out' / 'ckpt.pt'))
+    parser.add_argument('--data_dir', default=None, help="donde está meta.pkl (por defecto, el del checkpoint)")
+    parser.add_argument('--tag', default='<LEMA>')
+    parser.add_argument('--shots', type=int, default=0, help="entradas de FINAL.jsonl como preámbulo común")
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--max_new_tokens', type=int, default=256)
+    parser.add_argument('--temperature', type=float, default=0.8)
+    parser.add_argument('--top_k', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=1337)
+    parser.add_argument('--constrained', action='store_true', help="restringe la salida al formato del registro")
+    parser.add_argument('--compare', action='store_true', help="mide también la generación lema a lema")
+    args = parser.parse_args()
+
+    lemmas = args.lemmas or [line.strip() for line in sys.stdin if line.strip()]
+    model, train_cfg = load_model(args.ckpt)
+    tokenizer = CharTokenizer.load(Path(args.data_dir or train_cfg['data_dir']) / 'meta.pkl')
+    preamble = load_preamble(n_shots=args.shots)
+    grammar = RecordGrammar(tokenizer, args.tag) if args.constrained else None
+    kwargs = dict(preamble=preamble, tag=args.tag, max_new_tokens=args.max_new_tokens,
+                  temperature=args.temperature, top_k=args.top_k)
+
+    torch.manual_seed(args.seed)
+    t0 = time.perf_counter()
+    entries = generate_entries(model, tokenizer, lemmas, batch_size=args.batch_size, grammar=grammar, **kwargs)
+    batched_s = time.perf_counter() - t0
+    for entry in entries:
+        print(entry)
+    ended = sum(e.endswith(END_TAG) for e in entries)
+    print(f"\n✓ {len(lemmas)} lemas en {batched_s:.2f}s por lotes ({len(lemmas) / batched_s:.1f} lemas/s), "
+          f"{ended} acabadas en {END_TAG}", file=sys.stderr)
+    if args.compare:
+        torch.manual_seed(args.seed)
+        t0 = time.perf_counter()
+        generate_sequential(model, tokenizer, lemmas, **kwargs)
+        sequential_s = time.perf_counter() - t0
+        print(f"  lema a lema: {sequential_s:.2f}s ({len(lemmas) / sequential_s:.1f} lemas/s), "
+              f"{sequential_s / batched_s:.1f}x más lento", file=sys.stderr)
@@ -0,0 +1,43 @@
+# bench_generate.py
+# Latencia de generación en CPU con y sin KVCache: tokens/s de GPT.generate para varios
+# block_size, y comprobación de que los dos caminos dan los mismos tokens con la misma
+# semilla. Con un checkpoint (python bench_generate.py out/ckpt.pt) usa ese modelo.
+import sys
+import time
+
+import torch
+
+from model import GPT, GPTConfig
+from train import load_checkpoint
+
+
+def timed_generate(model, idx, new_tokens, use_cache, seed=0):
+    torch.manual_seed(seed)
+    t0 = time.perf_counter()
+    out = model.generate(idx, new_tokens, temperature=1.0, top_k=40, use_cache=use_cache)
+    return out, new_tokens * idx.size(0) / (time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        ckpt = load_checkpoint(sys.argv[1], 'cpu')
+        configs = [GPTConfig(**ckpt['model_args'])]
+    else:
+        ckpt = None
+        configs = [GPTConfig(block_size=b, vocab_size=128, n_layer=4, n_head=4, n_embd=128) for b in (256, 512, 1024)]
+
+    print(f"{'block_size':>10} {'batch':>5} {'sin caché':>12} {'con caché':>12} {'mejora':>7}  iguales")
+    for config in configs:
+        torch.manual_seed(0)
+        model = GPT(config)
+        if ckpt is not None:
+            model.load_state_dict(ckpt['model'])
+        model.eval()
+        for batch in (1, 8):
+            idx = torch.randint(0, config.vocab_size, (batch, 8))
+            new_tokens = config.block_size - 8
+            model.generate(idx, 4)  # calentamiento
+            plain, plain_tok_s = timed_generate(model, idx, new_tokens, use_cache=False)
+            cached, cached_tok_s = timed_generate(model, idx, new_tokens, use_cache=True)
+            print(f"{config.block_size:>10} {batch:>5} {plain_tok_s:>10,.0f}/s {cached_tok_s:>10,.0f}/s "
+                  f"{cached_tok_s / plain_tok_s:>6.1f}x  {'sí' if torch.equal(plain, cached) else 'NO'}")
@@ -0,0 +1,50 @@
+# bench_grammar.py
+# Entradas válidas por segundo de CPU con y sin decodificación restringida: genera una
+# entrada para cada lema de catalan_medieval_FINAL.jsonl por lotes (batch_generate.py) y
+# cuenta cuántas son registros completos según grammar.RecordGrammar.
+#   python bench_grammar.py [ckpt] [etiqueta de cabecera] [número de lemas]
+import json
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+from batch_generate import generate_entries
+from grammar import RecordGrammar
+from packing import FINAL_JSONL
+from tokens import CharTokenizer
+from train import load_model
+
+
+def run(model, tokenizer, lemmas, tag, grammar, constrained, seed=1337):
+    torch.manual_seed(seed)
+    t0 = time.process_time()
+    entries = generate_entries(model, tokenizer, lemmas, tag=tag, batch_size=32, max_new_tokens=256,
+                               temperature=0.8, grammar=grammar if constrained else None)
+    cpu_s = time.process_time() - t0
+    valid = sum(grammar.accepts(e) for e in entries)
+    return valid, cpu_s
+
+
+if __name__ == "__main__":
+    ckpt = sys.argv[1] if len(sys.argv) > 1 else str(Path(__file__).resolve().parent / 'out' / 'ckpt.pt')
+    tag = sys.argv[2] if len(sys.argv) > 2 else '<LEMA>'
+    n = int(sys.argv[3]) if len(sys.argv) > 3 else 256
+    model, train_cfg = load_model(ckpt)
+    tokenizer = CharTokenizer.load(Path(train_cfg['data_dir']) / 'meta.pkl')
+    with open(FINAL_JSONL, 'r', encoding='utf-8') as f:
+        lemmas = [json.loads(line)['lema'] for line in f if line.strip()][:n]
+    t0 = time.perf_counter()
+    grammar = RecordGrammar(tokenizer, tag)
+    print(f"Gramática: {len(grammar.states)} estados × {tokenizer.vocab_size} tokens "
+          f"({(time.perf_counter() - t0) * 1000:.1f} ms)")
+
+    results = {}
+    for constrained in (False, True):
+        valid, cpu_s = run(model, tokenizer, lemmas, tag, grammar, constrained)
+        results[constrained] = valid / cpu_s
+        print(f"{'restringida' if constrained else 'libre':>11}: {valid}/{len(lemmas)} válidas en {cpu_s:.2f}s de CPU, "
+              f"{valid / cpu_s:.2f} válidas/s")
+    if results[False]:
+        print(f"✓ {results[True] / results[False]:.1f}x entradas válidas por segundo de CPU")
@@ -0,0 +1,59 @@
+# bench_memory.py
+# Memoria pico y tiempo de un paso forward+backward con y sin checkpointing de
+# activaciones y atención por trozos, para varios block_size. Cada medida se hace en un
+# proceso nuevo, porque la RSS que el allocator ya ha reservado no vuelve a bajar.
+import json
+import subprocess
+import sys
+import time
+
+import torch
+
+from memory import PeakMemory, fmt_bytes
+from model import GPT, GPTConfig
+
+VARIANTES = {
+    'base': {},
+    'checkpoint': {'checkpoint_activations': True},
+    'chunks': {'attn_chunk': 256},
+    'checkpoint+chunks': {'checkpoint_activations': True, 'attn_chunk': 256},
+}
+
+
+def measure(block_size, batch_size, variant, packed=False):
+    torch.manual_seed(0)
+    cfg = GPTConfig(block_size=block_size, vocab_size=128, n_layer=4, n_head=4, n_embd=128,
+                    **VARIANTES[variant])
+    model = GPT(cfg)
+    x = torch.randint(0, cfg.vocab_size, (batch_size, block_size))
+    # con packed, la máscara por entradas fuerza el camino con máscara explícita
+    docs = (torch.arange(block_size) // 300).expand(batch_size, -1) if packed else None
+    # un paso de calentamiento: la primera llamada carga kernels y reserva buffers que no son del paso
+    _, loss = model(x, x, docs)
+    loss.backward()
+    model.zero_grad(set_to_none=True)
+    del loss
+    with PeakMemory() as mem:
+        t0 = time.perf_counter()
+        _, loss = model(x, x, docs)
+        loss.backward()
+        seconds = time.perf_counter() - t0
+    return {'peak': mem.peak, 'delta': mem.delta, 'seconds': seconds}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--one':
+        block_size, batch_size, variant, packed = sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5]
+        print(json.dumps(measure(int(block_size), int(batch_size), variant, packed == '1')))
+        sys.exit()
+
+    batch_size = 4
+    for packed in ('0', '1'):
+        print(f"\n{'con máscara por entradas' if packed == '1' else 'causal'} (batch {batch_size})")
+        print(f"{'block_size':>10} {'variante':<18} {'memoria':>10} {'tiempo':>9}")
+        for block_size in (512, 1024, 2048):
+            for variant in VARIANTES:
+                out = subprocess.run([sys.executable, __file__, '--one', str(block_size), str(batch_size),
+                                      variant, packed], capture_output=True, text=True, check=True)
+                r = json.loads(out.stdout)
+                print(f"{block_size:>10} {variant:<18} {fmt_bytes(r['delta']):>10} {r['seconds']:>8.2f}s")
@@ -0,0 +1,96 @@
+# bench_paged.py
+# Cuántas generaciones caben a la vez en un presupuesto fijo de memoria para la KV-cache,
+# y a qué velocidad: KVCache contigua (block_size posiciones por secuencia, lotes fijos que
+# esperan a la más larga) contra PagePool + Scheduler (páginas compartidas y batching
+# continuo). Las longitudes de las peticiones son las de las entradas reales de
+# catalan_medieval_FINAL.jsonl; los tokens son aleatorios, porque aquí solo cuenta cuánto
+# ocupa y cuánto tarda cada generación.
+import json
+import sys
+import time
+
+import torch
+
+from batch_generate import left_pad
+from memory import fmt_bytes
+from model import GPT, GPTConfig, KVCache, sample_logits
+from packing import FINAL_JSONL
+from paged import PagePool, Scheduler, Sequence, contiguous_bytes
+
+
+def workload(config, n_requests, seed=0):
+    """(prompt, max_new_tokens) con la longitud de "<LEMA> X <DEF>" y de la entrada completa."""
+    with open(FINAL_JSONL, 'r', encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    g = torch.Generator().manual_seed(seed)
+    requests = []
+    for i in range(n_requests):
+        e = entries[i % len(entries)]
+        n_prompt = len(f"<LEMA> {e['lema']} <DEF>")
+        n_total = min(len(e['text']), config.block_size)
+        prompt = torch.randint(0, config.vocab_size, (n_prompt,), generator=g).tolist()
+        requests.append((prompt, max(1, n_total - n_prompt)))
+    return requests
+
+@torch.no_grad()
+def run_contiguous(model, requests, budget):
+    """Lotes fijos de tantas secuencias como KVCache contiguas caben en el presupuesto."""
+    per_seq = contiguous_bytes(model.config)
+    batch = budget // per_seq
+    tokens = 0
+    for i in range(0, len(requests), batch):
+        chunk = requests[i:i + batch]
+        cache = KVCache(model.config, len(chunk))
+        logits, _ = model(left_pad(cache, [p for p, _ in chunk]), cache=cache)
+        remaining = [n for _, n in chunk]
+        rows = list(range(len(chunk)))
+        while True:
+            nxt = sample_logits(logits[:, -1, :])
+            tokens += len(rows)
+            keep = [i for i, r in enumerate(rows) if remaining[r] > 1]
+            for r in rows:
+                remaining[r] -= 1
+            if not keep or cache.length >= model.config.block_size:
+                break
+            if len(keep) < len(rows):
+                index = torch.tensor(keep)
+                cache.keep(index)
+                nxt = nxt[index]
+                rows = [rows[i] for i in keep]
+            logits, _ = model(nxt, cache=cache)
+    return {'concurrent': batch, 'kv_bytes': batch * per_seq, 'tokens': tokens}
+
+def run_paged(model, requests, budget, page_size):
+    pool = PagePool.for_budget(model.config, budget, page_size)
+    scheduler = Scheduler(model, pool, max_batch=len(requests))
+    for i, (prompt, n) in enumerate(requests):
+        scheduler.add(Sequence(i, prompt, n))
+    scheduler.run()
+    s = scheduler.stats
+    return {'concurrent': s['peak_running'], 'mean': s['rows'] / max(1, s['steps']), 'kv_bytes': pool.k.nbytes + pool.v.nbytes, 'tokens': s['tokens'],
+            'preemptions': s['preemptions'], 'peak_pages': s['peak_pages'], 'pages': pool.n_pages}
+
+
+if __name__ == "__main__":
+    budget_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 64
+    n_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+    budget = int(budget_mb * (1 << 20))
+    torch.manual_seed(0)
+    config = GPTConfig(block_size=1024, vocab_size=128, n_layer=4, n_head=4, n_embd=128)
+    model = GPT(config).eval()
+    requests = workload(config, n_requests)
+    mean_len = sum(len(p) + n for p, n in requests) / len(requests)
+    print(f"Presupuesto de KV {fmt_bytes(budget)}, {n_requests} peticiones de {mean_len:.0f} tokens de media "
+          f"(block_size {config.block_size}); KVCache contigua: {fmt_bytes(contiguous_bytes(config))} por secuencia")
+
+    t0 = time.perf_counter()
+    r = run_contiguous(model, requests, budget)
+    dt = time.perf_counter() - t0
+    print(f"contigua:  {r['concurrent']:>4} a la vez, {fmt_bytes(r['kv_bytes'])}, {dt:6.2f}s, {r['tokens'] / dt:,.0f} tokens/s")
+    for page_size in (16, 64):
+        t0 = time.perf_counter()
+        r = run_paged(model, requests, budget, page_size)
+        dt = time.perf_counter() - t0
+        print(f"paginada ({page_size:>2}): {r['concurrent']:>4} a la vez como máximo ({r['mean']:.0f} de media), "
+              f"{fmt_bytes(r['kv_bytes'])} ({r['pages']} páginas, pico {r['peak_pages']}), {dt:6.2f}s, "
+              f"{r['tokens'] / dt:,.0f} tokens/s, {r['preemptions']} expulsiones")
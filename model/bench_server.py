@@ -0,0 +1,90 @@
+# bench_server.py
+# Prueba de carga de server.py, toda en localhost: arranca el servidor en el mismo proceso
+# en un puerto libre y lanza N clientes concurrentes con prompts distintos, primero sin
+# micro-lotes (max_batch 1) y después con ellos. Al final repite los mismos prompts para
+# ver los aciertos de la caché. Con un checkpoint (python bench_server.py out/ckpt.pt) usa
+# ese modelo; si no, uno pequeño sin entrenar con el vocabulario de meta.pkl.
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+from model import GPT, GPTConfig
+from server import InferenceServer
+from tokens import OUT_DIR, CharTokenizer
+from train import load_model
+
+
+async def request(port, payload):
+    """POST /generate en streaming; devuelve (texto, segundos hasta el primer token, segundos totales)."""
+    t0 = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps({**payload, 'stream': True}).encode('utf-8')
+    writer.write(f"POST /generate HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+    await writer.drain()
+    status = await reader.readline()
+    assert status.startswith(b'HTTP/1.1 200'), status
+    while await reader.readline() not in (b'\r\n', b''):
+        pass
+    first, text = None, None
+    while (size := int((await reader.readline()).strip(), 16)):
+        line = json.loads(await reader.readexactly(size))
+        await reader.readexactly(2)
+        if first is None:
+            first = time.perf_counter() - t0
+        if line.get('done'):
+            text = line['text']
+    writer.close()
+    return text, first, time.perf_counter() - t0
+
+async def get_metrics(port):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return json.loads(response.split(b'\r\n\r\n', 1)[1])
+
+async def run(model, tokenizer, prompts, max_batch, window_ms, max_new_tokens):
+    server = InferenceServer(model, tokenizer, max_batch=max_batch, window_ms=window_ms)
+    tcp = await server.start('127.0.0.1', 0)
+    port = tcp.sockets[0].getsockname()[1]
+    params = [{'prompt': p, 'max_new_tokens': max_new_tokens, 'temperature': 0.8, 'seed': i}
+              for i, p in enumerate(prompts)]
+    try:
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(request(port, p) for p in params))
+        elapsed = time.perf_counter() - t0
+        t1 = time.perf_counter()
+        await asyncio.gather(*(request(port, p) for p in params))  # todo desde la caché
+        cached_elapsed = time.perf_counter() - t1
+        metrics = await get_metrics(port)
+    finally:
+        tcp.close()
+    first = sorted(r[1] for r in results)
+    total = sorted(r[2] for r in results)
+    print(f"max_batch {max_batch:>2}, ventana {window_ms:>4} ms: {elapsed:6.2f}s para {len(prompts)} peticiones, "
+          f"{metrics['tokens'] / elapsed:,.0f} tokens/s, primer token p50 {first[len(first) // 2]:.2f}s, "
+          f"total p50 {total[len(total) // 2]:.2f}s / max {total[-1]:.2f}s")
+    print(f"   lote medio {metrics['mean_batch_size']:.1f} {metrics['batch_sizes']}, "
+          f"repetición desde la caché: {cached_elapsed * 1000:.0f} ms, caché {metrics['cache']}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        model, train_cfg = load_model(sys.argv[1])
+        tokenizer = CharTokenizer.load(Path(train_cfg['data_dir']) / 'meta.pkl')
+    else:
+        tokenizer = CharTokenizer.load(OUT_DIR / 'meta.pkl')
+        torch.manual_seed(0)
+        model = GPT(GPTConfig(block_size=256, vocab_size=tokenizer.vocab_size)).eval()
+    lemmas = ['ABAT', 'CASA', 'CAVALL', 'SENYOR', 'MERCADER', 'PORTAL', 'FORN', 'VILA',
+              'ALBERCH', 'BARCA', 'CORT', 'DRAP', 'ESCUDER', 'FERRER', 'GALEA', 'HOSTAL']
+    prompts = [f"<MOT> {lemma} <DEF>" for lemma in lemmas] * 2
+    prompts = [p + ' ' * (i // len(lemmas)) for i, p in enumerate(prompts)]  # 32 prompts distintos
+    for max_batch, window_ms in ((1, 0), (16, 10)):
+        asyncio.run(run(model, tokenizer, prompts, max_batch, window_ms, max_new_tokens=64))
@@ -0,0 +1,263 @@
+# bpe.py
+# Tokenizador BPE a nivel de byte para el dataset de catalán medieval.
+# Las etiquetas estructurales (<LEMA>, <MOT>, <DEF>, <EX>, <END>, <ENTRY>) son ids
+# especiales reservados: nunca se parten ni se fusionan con el texto de alrededor.
+import json
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from tokens import token_dtype
+
+SPECIAL_TOKENS = ['<LEMA>', '<MOT>', '<DEF>', '<EX>', '<END>', '<ENTRY>']
+SPECIAL_RE = re.compile('(' + '|'.join(re.escape(t) for t in SPECIAL_TOKENS) + ')')
+# pre-tokenización estilo GPT-2: las fusiones nunca cruzan de una palabra a otra
+WORD_RE = re.compile(r"\s?\w+|\s?[^\w\s]+|\s+(?!\S)|\s+")
+OUT_DIR = Path(__file__).resolve().parent
+VOCAB_SIZE = 2048
+CACHE_SIZE = 1 << 16
+
+
+def split_specials(text):
+    """Alterna trozos de texto normal y etiquetas: ['', '<LEMA>', ' ADZEBRÓ ', '<DEF>', ...]."""
+    return SPECIAL_RE.split(text)
+
+def count_words(text):
+    """Frecuencia de cada pre-token (en bytes) de un trozo de texto, sin las etiquetas."""
+    counts = Counter()
+    for i, part in enumerate(split_specials(text)):
+        if i % 2 == 0 and part:
+            counts.update(w.encode('utf-8') for w in WORD_RE.findall(part))
+    return counts
+
+def count_pairs(items):
+    """Parejas adyacentes ponderadas por la frecuencia de cada palabra."""
+    pairs = Counter()
+    for word, freq in items:
+        for pair in zip(word, word[1:]):
+            pairs[pair] += freq
+    return pairs
+
+def _merge_word(word, pair, new_id):
+    out, i = [], 0
+    while i < len(word):
+        if i + 1 < len(word) and word[i] == pair[0] and word[i + 1] == pair[1]:
+            out.append(new_id)
+            i += 2
+        else:
+            out.append(word[i])
+            i += 1
+    return tuple(out)
+
+
+class BPETokenizer:
+    """
+    Ids 0-255: bytes; a continuación, las etiquetas especiales; y después una id por
+    fusión, en el orden en que se aprendieron. `encode` guarda en caché la codificación
+    de cada pre-token, así que el texto repetitivo del diccionario se codifica casi gratis.
+    """
+    def __init__(self, merges=(), special_tokens=SPECIAL_TOKENS):
+        self.special_tokens = list(special_tokens)
+        self.special_ids = {t: 256 + i for i, t in enumerate(self.special_tokens)}
+        self.merges = [tuple(m) for m in merges]
+        first = 256 + len(self.special_tokens)
+        self.ranks = {pair: first + i for i, pair in enumerate(self.merges)}
+        self.vocab = {i: bytes([i]) for i in range(256)}
+        for t, i in self.special_ids.items():
+            self.vocab[i] = t.encode('utf-8')
+        for pair, i in self.ranks.items():
+            self.vocab[i] = self.vocab[pair[0]] + self.vocab[pair[1]]
+        self.vocab_size = len(self.vocab)
+        self.dtype = token_dtype(self.vocab_size)
+        self._cache = {}
+
+    # ---------- Entrenamiento ----------
+    @classmethod
+    def train(cls, texts, vocab_size=VOCAB_SIZE, workers=None, verbose=False):
+        """
+        `texts` es un iterable de trozos de texto. El conteo de palabras y el conteo inicial
+        de parejas se reparten entre procesos; después cada fusión solo actualiza las
+        parejas de las palabras que la contienen, en vez de volver a contar todo.
+        """
+        n_merges = vocab_size - 256 - len(SPECIAL_TOKENS)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            words = Counter()
+            for counts in pool.map(count_words, texts, chunksize=64):
+                words.update(counts)
+            items = [(tuple(w), f) for w, f in words.items()]
+            n_shards = workers or os.cpu_count() or 1
+            shards = [items[i::n_shards] for i in range(n_shards)]
+            pairs = Counter()
+            for counts in pool.map(count_pairs, shards):
+                pairs.update(counts)
+
+        word_list = [w for w, _ in items]
+        freqs = [f for _, f in items]
+        where = defaultdict(set)  # pareja -> índices de las palabras que la contienen
+        for idx, word in enumerate(word_list):
+            for pair in zip(word, word[1:]):
+                where[pair].add(idx)
+
+        merges = []
+        next_id = 256 + len(SPECIAL_TOKENS)
+        for step in range(n_merges):
+            if not pairs:
+                break
+            # a igual frecuencia, la pareja menor: el resultado no depende del orden de los procesos
+            pair = max(pairs, key=lambda p: (pairs[p], -p[0], -p[1]))
+            if pairs[pair] < 2:
+                break
+            merges.append(pair)
+            for idx in list(where.pop(pair, ())):
+                old, freq = word_list[idx], freqs[idx]
+                new = _merge_word(old, pair, next_id)
+                for p in zip(old, old[1:]):
+                    pairs[p] -= freq
+                    if pairs[p] <= 0:
+                        del pairs[p]
+                for p in zip(new, new[1:]):
+                    pairs[p] += freq
+                    where[p].add(idx)
+                word_list[idx] = new
+            pairs.pop(pair, None)
+            next_id += 1
+            if verbose and (step + 1) % 200 == 0:
+                print(f"  {step + 1}/{n_merges} fusiones")
+        return cls(merges)
+
+    # ---------- Codificación ----------
+    def _encode_word(self, word):
+        ids = self._cache.get(word)
+        if ids is not None:
+            return ids
+        ids = list(word.encode('utf-8'))
+        while len(ids) > 1:
+            # la pareja con el rango más bajo (la primera fusión aprendida)
+            best = min(zip(ids, ids[1:]), key=lambda p: self.ranks.get(p, float('inf')))
+            if best not in self.ranks:
+                break
+            ids = list(_merge_word(ids, best, self.ranks[best]))
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[word] = ids
+        return ids
+
+    def encode(self, text):
+        out = []
+        for i, part in enumerate(split_specials(text)):
+            if i % 2:
+                out.append(self.special_ids[part])
+            elif part:
+                for word in WORD_RE.findall(part):
+                    out.extend(self._encode_word(word))
+        return out
+
+    def decode(self, ids):
+        return b''.join(self.vocab[int(i)] for i in ids).decode('utf-8', errors='replace')
+
+    def _pool(self, workers):
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(self.merges, self.special_tokens))
+
+    def encode_batch(self, texts, workers=None):
+        """Codifica una lista de textos; con `workers` se reparte entre procesos."""
+        if not workers or workers == 1:
+            return [self.encode(t) for t in texts]
+        with self._pool(workers) as pool:
+            return list(pool.map(_encode_in_worker, texts, chunksize=64))
+
+    def iter_jsonl(self, paths, field='text', batch_size=256, workers=None):
+        """
+        Recorre uno o varios JSONL en streaming y va dando los ids de cada registro,
+        codificados por lotes de `batch_size` (en un mismo pool durante todo el recorrido
+        si hay `workers`): nunca carga el fichero entero.
+        """
+        if isinstance(paths, (str, Path)):
+            paths = [paths]
+        pool = self._pool(workers) if workers and workers > 1 else None
+
+        def flush(batch):
+            if pool is None:
+                return [self.encode(t) for t in batch]
+            return pool.map(_encode_in_worker, batch, chunksize=16)
+
+        try:
+            batch = []
+            for path in paths:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            batch.append(json.loads(line)[field])
+                        if len(batch) >= batch_size:
+                            yield from flush(batch)
+                            batch = []
+            if batch:
+                yield from flush(batch)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    # ---------- Persistencia ----------
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'special_tokens': self.special_tokens, 'merges': self.merges}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['merges'], data['special_tokens'])
+
+
+_worker_tok = None
+
+def _init_worker(merges, special_tokens):
+    global _worker_tok
+    _worker_tok = BPETokenizer(merges, special_tokens)
+
+def _encode_in_worker(text):
+    return _worker_tok.encode(text)
+
+
+def prepare_bpe(jsonl_paths, out_dir=OUT_DIR, vocab_size=VOCAB_SIZE, val_fraction=0.1, workers=None):
+    """
+    Entrena el BPE sobre los JSONL y escribe bpe_train.bin / bpe_val.bin (mismo formato que
+    tokens.py, un registro tras otro) y bpe.json. Los últimos registros van a validación.
+    """
+    out_dir = Path(out_dir)
+    texts = []
+    for p in jsonl_paths:
+        with open(p, encoding='utf-8') as f:
+            texts.extend(json.loads(l)['text'] for l in f if l.strip())
+    tok = BPETokenizer.train(texts, vocab_size, workers)
+    tok.save(out_dir / 'bpe.json')
+    n_train = int(len(texts) * (1 - val_fraction))
+    counts = {'train': 0, 'val': 0}
+    sep = '\n\n'
+    with open(out_dir / 'bpe_train.bin', 'wb') as train, open(out_dir / 'bpe_val.bin', 'wb') as val:
+        for i, ids in enumerate(tok.iter_jsonl(jsonl_paths, workers=workers)):
+            split, f = ('train', train) if i < n_train else ('val', val)
+            arr = np.array(ids + tok.encode(sep), dtype=tok.dtype)
+            f.write(arr.tobytes())
+            counts[split] += len(arr)
+    return tok, counts, texts
+
+
+if __name__ == "__main__":
+    jsonl_paths = sys.argv[1:] or [OUT_DIR.parent / 'data' / 'catalan_medieval_FINAL.jsonl']
+    tok, counts, texts = prepare_bpe(jsonl_paths)
+    chars = sum(len(t) for t in texts)
+    tokens_total = counts['train'] + counts['val']
+    print(f"Tamaño del vocabulario: {tok.vocab_size} ({len(tok.merges)} fusiones, dtype {np.dtype(tok.dtype).name})")
+    print(f"bpe_train.bin: {counts['train']:,} tokens, bpe_val.bin: {counts['val']:,} tokens")
+    print(f"Caracteres por token: {chars / tokens_total:.2f}")
+    print(f"Tokens por entrada: {tokens_total / len(texts):.1f} (con caracteres: {chars / len(texts):.1f})")
+    ejemplo = texts[0]
+    ids = tok.encode(ejemplo)
+    print(f"\n{ejemplo[:120]}\n-> {ids[:40]}")
+    print(' | '.join(tok.decode([i]) for i in ids[:40]))
@@ -0,0 +1,138 @@
+# grammar.py
+# Decodificación restringida al formato de registro que producen parse_vocabulari.py
+# (5-data-prep.py) y limpieza.py:
+#
+#   <LEMA> lema <DEF> definición [<EX> ejemplo] <END>
+#
+# La gramática es un autómata sobre caracteres: cada campo tiene texto no vacío sin '<'
+# ni saltos de línea, las etiquetas van precedidas de un espacio y seguidas de otro, <DEF>
+# es obligatoria, <EX> opcional y nada puede ir después de <END>. Al construirla se pasa
+# el texto de cada token del vocabulario por el autómata desde cada estado alcanzable, así
+# que sirve igual para el tokenizador de caracteres (donde "<DEF>" son cinco tokens) que
+# para BPE (donde es uno). Quedan dos tablas (estados × vocabulario): el estado siguiente
+# de cada token y un sesgo de 0 / -inf con la máscara de tokens permitidos. En cada paso
+# basta con sumar bias[estados] a los logits y leer table[estados, tokens].
+# Para que una entrada no se quede a medias por llegar al límite de tokens, también se
+# guarda la distancia mínima de cada estado a <END> y, para los últimos pasos, máscaras
+# que solo dejan los tokens desde los que aún se llega a cerrar el registro a tiempo.
+import torch
+
+from tokens import CharTokenizer
+
+NEXT_TAGS = {'LEMA': ('DEF',), 'DEF': ('EX', 'END'), 'EX': ('END',)}
+START = ('start', '')
+DONE = ('done',)
+
+
+def token_strings(tokenizer):
+    """Texto de cada id. Con BPE, los bytes sueltos se leen como latin-1: las etiquetas son ASCII."""
+    if isinstance(tokenizer, CharTokenizer):
+        return [tokenizer.itos[i] for i in range(tokenizer.vocab_size)]
+    return [tokenizer.vocab[i].decode('latin-1') for i in range(tokenizer.vocab_size)]
+
+
+class RecordGrammar:
+    def __init__(self, tokenizer, head='<LEMA>'):
+        self.head = head
+        states, index, rows = [START], {START: 0}, []
+        strings = token_strings(tokenizer)
+        # recorrido en anchura: solo se guardan los estados alcanzables con tokens reales
+        while len(rows) < len(states):
+            row = []
+            for s in strings:
+                nxt = self.walk(states[len(rows)], s)
+                if nxt is not None and nxt not in index:
+                    index[nxt] = len(states)
+                    states.append(nxt)
+                row.append(-1 if nxt is None else index[nxt])
+            rows.append(row)
+        self.states = states
+        self.index = index
+        self.table = torch.tensor(rows, dtype=torch.long)
+        self.bias = torch.zeros(self.table.shape).masked_fill(self.table < 0, float('-inf'))
+        self.done = index.get(DONE, -1)
+
+        # dist[s]: tokens mínimos desde s hasta <END> (relajación hasta que no cambia)
+        inf = len(states) + 1
+        self.dist = torch.full((len(states),), inf, dtype=torch.long)
+        if self.done >= 0:
+            self.dist[self.done] = 0
+        reachable = self.table >= 0
+        while True:
+            via = torch.where(reachable, self.dist[self.table.clamp(min=0)], inf).min(dim=1).values + 1
+            new = torch.minimum(self.dist, via)
+            if torch.equal(new, self.dist):
+                break
+            self.dist = new
+        # close_bias[d]: solo los tokens tras los que se puede terminar en d tokens más
+        self.max_close = int(self.dist[self.dist < inf].max())
+        after = self.dist[self.table.clamp(min=0)]
+        self.close_bias = torch.stack([self.bias.masked_fill(after > d, float('-inf'))
+                                       for d in range(self.max_close + 1)])
+
+    # ---------- Autómata sobre caracteres ----------
+    def step(self, state, ch):
+        """Estado tras leer `ch`, o None si el carácter no está permitido."""
+        kind = state[0]
+        if kind == 'start':
+            prefix = state[1] + ch
+            if prefix == self.head:
+                return ('after', 'LEMA')
+            return ('start', prefix) if self.head.startswith(prefix) else None
+        if kind == 'after':
+            return ('field', state[1], 'empty') if ch == ' ' else None
+        if kind == 'field':
+            _, field, mode = state
+            if ch == '\n':
+                return None
+            if ch == '<':
+                # una etiqueta solo puede empezar tras un espacio y con el campo ya escrito
+                return ('tag', field, '<') if mode == 'space' else None
+            if ch == ' ':
+                return ('field', field, 'empty' if mode == 'empty' else 'space')
+            return ('field', field, 'text')
+        if kind == 'tag':
+            _, field, prefix = state
+            prefix += ch
+            for tag in NEXT_TAGS[field]:
+                full = f'<{tag}>'
+                if prefix == full:
+                    return DONE if tag == 'END' else ('after', tag)
+                if full.startswith(prefix):
+                    return ('tag', field, prefix)
+            return None
+        return None  # después de <END> no va nada
+
+    def walk(self, state, text):
+        for ch in text:
+            state = self.step(state, ch)
+            if state is None:
+                return None
+        return state
+
+    # ---------- Uso ----------
+    def state_of(self, text):
+        """Id del estado tras leer `text` desde el inicio del registro (ValueError si no encaja)."""
+        state = self.walk(START, text)
+        if state is None or state not in self.index:
+            raise ValueError(f"el texto no encaja con la gramática del registro: {text[:60]!r}")
+        return self.index[state]
+
+    def accepts(self, text):
+        """¿Es `text` un registro completo y bien formado?"""
+        return self.walk(START, text) == DONE
+
+    def mask(self, logits, states, remaining=None):
+        """
+        Logits (B, vocab) con -inf en los tokens que no permite el estado de cada fila. Con
+        `remaining` (tokens que quedan después de este), cerca del final solo se permiten
+        los que todavía dejan cerrar el registro con <END>.
+        """
+        if remaining is None or remaining >= self.max_close:
+            return logits + self.bias[states]
+        # si alguna fila ya no llega, se le deja el camino más corto aunque se pase
+        d = max(remaining, int(self.dist[states].max()) - 1)
+        return logits + self.close_bias[min(d, self.max_close)][states]
+
+    def advance(self, states, tokens):
+        return self.table[states, tokens]
@@ -0,0 +1,159 @@
+# loader.py
+# Cargador de batches con prefetch sobre los tokens mapeados en memoria (train.bin / val.bin).
+# Un hilo en segundo plano sortea los offsets, recoge las ventanas del memmap y rellena
+# tensores preasignados; el bucle de entrenamiento solo recoge batches ya montados de una
+# cola acotada. Si la cola está vacía cuando se pide un batch, se cuenta como espera.
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+import torch
+
+from tokens import OUT_DIR, load_tokens
+
+
+class BatchLoader:
+    """
+    Itera batches (x, y) de forma (batch_size, block_size) en int64.
+
+    Los tensores salen de un anillo de `prefetch + 2` buffers preasignados y se reutilizan:
+    el batch devuelto es válido hasta la siguiente llamada a `next()`. Los offsets los
+    genera un único hilo con `np.random.default_rng(seed)`, así que la secuencia de batches
+    es la misma en cada ejecución con la misma semilla, sea cual sea el ritmo del consumo.
+    """
+    def __init__(self, data, batch_size, block_size, seed=1337, prefetch=4, device='cpu'):
+        self.data = data
+        self.batch_size = batch_size
+        self.block_size = block_size
+        self.seed = seed
+        self.device = torch.device(device)
+        self._buffers = [torch.empty((batch_size, block_size + 1), dtype=torch.long)
+                         for _ in range(prefetch + 2)]
+        self._free = queue.Queue()
+        for i in range(len(self._buffers)):
+            self._free.put(i)
+        self._ready = queue.Queue(maxsize=prefetch)
+        self._held = None
+        self._stop = threading.Event()
+        self._error = None
+        self.steps = 0
+        self.starved = 0
+        self.wait_time = 0.0
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_split(cls, split, batch_size, block_size, out_dir=OUT_DIR, **kwargs):
+        return cls(load_tokens(split, out_dir), batch_size, block_size, **kwargs)
+
+    def _produce(self):
+        rng = np.random.default_rng(self.seed)
+        window = np.arange(self.block_size + 1)
+        high = len(self.data) - self.block_size - 1
+        try:
+            while not self._stop.is_set():
+                try:
+                    slot = self._free.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                offsets = rng.integers(0, high + 1, size=self.batch_size)
+                # una sola recogida vectorizada del memmap, copiada (con cast a int64) al buffer
+                np.copyto(self._buffers[slot].numpy(), self.data[offsets[:, None] + window])
+                while not self._stop.is_set():
+                    try:
+                        self._ready.put(slot, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+        except Exception as e:  # se relanza en el hilo principal
+            self._error = e
+            # el aviso espera sitio en la cola como un lote más; con la cola llena, un put
+            # bloqueante dejaría colgado close()
+            while not self._stop.is_set():
+                try:
+                    self._ready.put(None, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def next(self):
+        if self._held is not None:
+            self._free.put(self._held)
+            self._held = None
+        try:
+            slot = self._ready.get_nowait()
+        except queue.Empty:
+            t0 = time.perf_counter()
+            slot = self._ready.get()
+            self.wait_time += time.perf_counter() - t0
+            self.starved += 1
+        if slot is None:
+            raise self._error
+        self._held = slot
+        self.steps += 1
+        buf = self._buffers[slot]
+        x, y = buf[:, :-1], buf[:, 1:]
+        if self.device.type != 'cpu':
+            x, y = x.to(self.device, non_blocking=True), y.to(self.device, non_blocking=True)
+        return x, y
+
+    __next__ = next
+
+    def __iter__(self):
+        return self
+
+    def stats(self):
+        """Pasos servidos, cuántos tuvieron que esperar a la cola y el tiempo total esperado."""
+        return {'steps': self.steps, 'starved': self.starved,
+                'starved_pct': 100 * self.starved / self.steps if self.steps else 0.0,
+                'wait_s': self.wait_time}
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def get_batch(data, batch_size, block_size, generator=None):
+    """El get_batch de siempre (offsets aleatorios + torch.stack), para comparar."""
+    ix = torch.randint(len(data) - block_size, (batch_size,), generator=generator)
+    x = torch.stack([torch.from_numpy(data[i:i + block_size].astype(np.int64)) for i in ix.tolist()])
+    y = torch.stack([torch.from_numpy(data[i + 1:i + 1 + block_size].astype(np.int64)) for i in ix.tolist()])
+    return x, y
+
+
+if __name__ == "__main__":
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else OUT_DIR
+    data = load_tokens('train', out_dir)
+    batch_size, block_size, steps = 64, 256, 200
+
+    t0 = time.perf_counter()
+    for _ in range(steps):
+        get_batch(data, batch_size, block_size)
+    t_naive = time.perf_counter() - t0
+
+    with BatchLoader(data, batch_size, block_size) as loader:
+        t0 = time.perf_counter()
+        for _ in range(steps):
+            x, y = loader.next()
+        t_loader = time.perf_counter() - t0
+        stats = loader.stats()
+
+    print(f"get_batch:   {t_naive / steps * 1000:.3f} ms/batch")
+    print(f"BatchLoader: {t_loader / steps * 1000:.3f} ms/batch "
+          f"(esperas: {stats['starved']}/{stats['steps']}, {stats['wait_s'] * 1000:.1f} ms en total)")
+
+    # con un paso de modelo simulado (2 ms) el prefetch debería tapar casi todas las esperas
+    with BatchLoader(data, batch_size, block_size) as loader:
+        for _ in range(steps):
+            x, y = loader.next()
+            time.sleep(0.002)
+        stats = loader.stats()
+    print(f"Con 2 ms por paso: esperas {stats['starved']}/{stats['steps']} ({stats['starved_pct']:.1f}%)")
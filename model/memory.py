@@ -0,0 +1,70 @@
+# memory.py
+# Medida de memoria para el entrenamiento en CPU: RSS actual del proceso y un medidor de
+# pico que la muestrea en un hilo mientras se ejecuta un bloque de código.
+import os
+import resource
+import sys
+import threading
+
+import torch
+
+
+def current_rss():
+    """RSS actual en bytes (psutil si está instalado; si no, /proc en Linux)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return max_rss()
+
+def max_rss():
+    """Pico de RSS de toda la vida del proceso (ru_maxrss está en KB en Linux y en bytes en macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class PeakMemory:
+    """
+    with PeakMemory() as mem: ... -> mem.peak es el pico de RSS (bytes) dentro del bloque y
+    mem.delta lo que ha crecido sobre la RSS del inicio. En CUDA usa el contador del allocator.
+    """
+    def __init__(self, device='cpu', interval=0.001):
+        self.device = torch.device(device)
+        self.interval = interval
+        self.peak = self.start = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        if self.device.type == 'cuda':
+            torch.cuda.reset_peak_memory_stats(self.device)
+            self.start = torch.cuda.memory_allocated(self.device)
+        else:
+            self.start = self.peak = current_rss()
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.device.type == 'cuda':
+            self.peak = torch.cuda.max_memory_allocated(self.device)
+        else:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self.peak, current_rss())
+
+    @property
+    def delta(self):
+        return self.peak - self.start
+
+
+def fmt_bytes(n):
+    return f"{n / (1 << 20):,.1f} MB"
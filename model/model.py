@@ -0,0 +1,336 @@
+# model.py
+# El GPT de nano-GPT (siguiendo a Karpathy): embeddings de token y posición, bloques
+# de atención causal + MLP y una cabeza lineal con pesos compartidos con el embedding.
+# Con `doc_ids` la atención es causal por bloques: cada token solo ve los tokens
+# anteriores de su misma entrada, y las posiciones se reinician en cada entrada
+# (véase packing.py). Para contextos largos con poca RAM hay dos opciones por ejecución:
+# checkpointing de activaciones por bloque y atención por trozos de queries/keys.
+# Para generar, KVCache guarda las keys/values de cada capa y cada paso procesa solo el
+# token nuevo.
+import math
+from dataclasses import dataclass
+
+import torch
+import torch.nn as nn
+from torch.nn import functional as F
+from torch.utils.checkpoint import checkpoint
+
+HAS_SDPA = hasattr(F, 'scaled_dot_product_attention')
+
+
+@dataclass
+class GPTConfig:
+    block_size: int = 256
+    vocab_size: int = 128
+    n_layer: int = 4
+    n_head: int = 4
+    n_embd: int = 128
+    dropout: float = 0.0
+    bias: bool = False
+    checkpoint_activations: bool = False  # recalcula cada bloque en el backward
+    attn_chunk: int = 0                   # >0: atención por trozos de attn_chunk queries
+
+
+def doc_causal_mask(doc_ids):
+    """
+    Máscara booleana (B, 1, T, T) para scaled_dot_product_attention: True donde la
+    posición t puede atender a s, es decir s <= t y las dos son de la misma entrada.
+    El relleno (doc -1) solo se ve a sí mismo, para que ninguna fila quede vacía.
+    """
+    T = doc_ids.size(1)
+    causal = torch.ones(T, T, dtype=torch.bool, device=doc_ids.device).tril()
+    same = doc_ids[:, :, None] == doc_ids[:, None, :]
+    eye = torch.eye(T, dtype=torch.bool, device=doc_ids.device)
+    return ((same & causal) | eye).unsqueeze(1)
+
+
+def doc_positions(doc_ids):
+    """Posición de cada token dentro de su entrada: las posiciones empiezan en 0 en cada entrada."""
+    T = doc_ids.size(1)
+    arange = torch.arange(T, device=doc_ids.device).expand_as(doc_ids)
+    starts = torch.ones_like(doc_ids, dtype=torch.bool)
+    starts[:, 1:] = doc_ids[:, 1:] != doc_ids[:, :-1]
+    return arange - torch.where(starts, arange, torch.zeros_like(arange)).cummax(dim=1).values
+
+
+def _attend_chunk(q, k, v, mask, dropout_p):
+    """Atención de un trozo de queries contra sus keys; `mask` es booleana (True = se ve)."""
+    if HAS_SDPA:
+        return F.scaled_dot_product_attention(q, k, v, attn_mask=mask, dropout_p=dropout_p)
+    att = (q @ k.transpose(-2, -1)) / math.sqrt(q.size(-1))
+    att = F.softmax(att.masked_fill(~mask, float('-inf')), dim=-1)
+    return F.dropout(att, dropout_p) @ v
+
+def _attend_key_chunks(q, k, v, mask, chunk):
+    """
+    Sin SDPA (o como referencia): recorre las keys por trozos con softmax online, de modo
+    que nunca existe la matriz completa de puntuaciones de las queries del trozo.
+    """
+    scale = 1.0 / math.sqrt(q.size(-1))
+    m = torch.full(q.shape[:-1] + (1,), float('-inf'), dtype=q.dtype, device=q.device)
+    denom = torch.zeros_like(m)
+    acc = torch.zeros_like(q)
+    for j0 in range(0, k.size(-2), chunk):
+        j1 = min(j0 + chunk, k.size(-2))
+        s = (q @ k[..., j0:j1, :].transpose(-2, -1)) * scale
+        s = s.masked_fill(~mask[..., j0:j1], float('-inf'))
+        m_new = torch.maximum(m, s.amax(dim=-1, keepdim=True))
+        p = torch.exp(s - m_new)
+        correction = torch.exp(m - m_new)
+        denom = denom * correction + p.sum(dim=-1, keepdim=True)
+        acc = acc * correction + p @ v[..., j0:j1, :]
+        m = m_new
+    return acc / denom
+
+def chunked_attention(q, k, v, chunk, attn_mask=None, dropout_p=0.0):
+    """
+    Atención causal por trozos de `chunk` queries: cada trozo solo mira las keys hasta su
+    última posición, y en entrenamiento se recalcula en el backward (checkpoint), así que
+    la memoria de puntuaciones es O(chunk·T) en vez de O(T²). Usa scaled_dot_product_attention
+    si está disponible; si no, también trocea las keys con softmax online.
+    """
+    T = q.size(-2)
+    outs = []
+    for i0 in range(0, T, chunk):
+        i1 = min(i0 + chunk, T)
+        rows = torch.arange(i0, i1, device=q.device)[:, None]
+        mask = rows >= torch.arange(i1, device=q.device)[None, :]
+        if attn_mask is not None:
+            mask = mask & attn_mask[..., i0:i1, :i1]
+        args = (q[..., i0:i1, :], k[..., :i1, :], v[..., :i1, :], mask)
+        if HAS_SDPA:
+            fn = lambda q_, k_, v_, m_: _attend_chunk(q_, k_, v_, m_, dropout_p)
+        else:
+            fn = lambda q_, k_, v_, m_: _attend_key_chunks(q_, k_, v_, m_, chunk)
+        if torch.is_grad_enabled() and q.requires_grad:
+            outs.append(checkpoint(fn, *args, use_reentrant=False))
+        else:
+            outs.append(fn(*args))
+    return torch.cat(outs, dim=-2)
+
+
+def cached_causal_mask(past, T, device):
+    """Máscara (T, past + T) para T tokens nuevos detrás de `past` posiciones ya en caché."""
+    return torch.arange(past, past + T, device=device)[:, None] >= torch.arange(past + T, device=device)[None, :]
+
+
+class KVCache:
+    """
+    Keys y values de todas las capas para generar de forma incremental, reservadas de una
+    vez con forma (n_layer, B, n_head, block_size, head_size). `length` es el número de
+    posiciones ya ocupadas; GPT.forward lo avanza (advance) después de pasar por todas las
+    capas. paged.PagedKVCache implementa la misma interfaz sobre páginas compartidas.
+    Para lotes de prompts de distinta longitud, `pad` (B,) cuenta las posiciones de relleno
+    de cada fila y `valid` (B, block_size) las marca a False para que nadie las atienda.
+    """
+    def __init__(self, config, batch_size, device=None, dtype=torch.float32):
+        shape = (config.n_layer, batch_size, config.n_head, config.block_size, config.n_embd // config.n_head)
+        self.config = config
+        self.k = torch.zeros(shape, device=device, dtype=dtype)
+        self.v = torch.zeros_like(self.k)
+        self.length = 0
+        self.pad = None
+        self.valid = None
+
+    @classmethod
+    def from_prefix(cls, prefix, batch_size):
+        """Caché de batch_size filas que empiezan todas con el contenido de `prefix` (de una fila)."""
+        cache = cls(prefix.config, batch_size, prefix.k.device, prefix.k.dtype)
+        cache.k[:, :, :, :prefix.length] = prefix.k[:, :1, :, :prefix.length]
+        cache.v[:, :, :, :prefix.length] = prefix.v[:, :1, :, :prefix.length]
+        cache.length = prefix.length
+        return cache
+
+    def update(self, layer, k, v):
+        """Escribe las keys/values de T posiciones nuevas y devuelve las de las length + T."""
+        end = self.length + k.size(2)
+        self.k[layer, :, :, self.length:end] = k
+        self.v[layer, :, :, self.length:end] = v
+        return self.k[layer, :, :, :end], self.v[layer, :, :, :end]
+
+    def positions(self, T, device):
+        """Posiciones de los T tokens nuevos, descontando el relleno de cada fila."""
+        pos = torch.arange(self.length, self.length + T, dtype=torch.long, device=device)
+        if self.pad is None:
+            return pos
+        return (pos - self.pad[:, None]).clamp(min=0)
+
+    def attn_mask(self, T, device):
+        """None si basta con la atención causal de SDPA; si no, la máscara de los T tokens nuevos."""
+        if self.valid is None and (self.length == 0 or T == 1):
+            return None
+        end = self.length + T
+        mask = cached_causal_mask(self.length, T, device)
+        if self.valid is not None:
+            # cada posición se ve al menos a sí misma, para que ninguna fila de relleno quede vacía
+            eye = torch.arange(self.length, end, device=device)[:, None] == torch.arange(end, device=device)[None, :]
+            mask = ((mask & self.valid[:, None, :end]) | eye).unsqueeze(1)
+        return mask
+
+    def advance(self, T):
+        self.length += T
+
+    def keep(self, rows):
+        """Se queda solo con las filas `rows`, por ejemplo al sacar del lote las secuencias terminadas."""
+        self.k, self.v = self.k[:, rows], self.v[:, rows]
+        if self.pad is not None:
+            self.pad, self.valid = self.pad[rows], self.valid[rows]
+
+
+class CausalSelfAttention(nn.Module):
+    def __init__(self, config):
+        super().__init__()
+        assert config.n_embd % config.n_head == 0
+        self.c_attn = nn.Linear(config.n_embd, 3 * config.n_embd, bias=config.bias)
+        self.c_proj = nn.Linear(config.n_embd, config.n_embd, bias=config.bias)
+        self.resid_dropout = nn.Dropout(config.dropout)
+        self.n_head = config.n_head
+        self.dropout = config.dropout
+        self.attn_chunk = config.attn_chunk
+
+    def forward(self, x, attn_mask=None, cache=None, layer=0):
+        B, T, C = x.size()
+        q, k, v = self.c_attn(x).split(C, dim=2)
+        q = q.view(B, T, self.n_head, C // self.n_head).transpose(1, 2)
+        k = k.view(B, T, self.n_head, C // self.n_head).transpose(1, 2)
+        v = v.view(B, T, self.n_head, C // self.n_head).transpose(1, 2)
+        dropout = self.dropout if self.training else 0.0
+        if cache is not None:
+            # las keys/values nuevas se escriben en la caché y se atiende a todo lo anterior
+            k, v = cache.update(layer, k, v)
+            y = F.scaled_dot_product_attention(q, k, v, attn_mask=attn_mask,
+                                               is_causal=attn_mask is None and T > 1)
+        elif self.attn_chunk and T > self.attn_chunk:
+            y = chunked_attention(q, k, v, self.attn_chunk, attn_mask, dropout)
+        elif attn_mask is None:
+            y = F.scaled_dot_product_attention(q, k, v, dropout_p=dropout, is_causal=True)
+        else:
+            y = F.scaled_dot_product_attention(q, k, v, attn_mask=attn_mask, dropout_p=dropout)
+        y = y.transpose(1, 2).contiguous().view(B, T, C)
+        return self.resid_dropout(self.c_proj(y))
+
+
+class MLP(nn.Module):
+    def __init__(self, config):
+        super().__init__()
+        self.c_fc = nn.Linear(config.n_embd, 4 * config.n_embd, bias=config.bias)
+        self.gelu = nn.GELU()
+        self.c_proj = nn.Linear(4 * config.n_embd, config.n_embd, bias=config.bias)
+        self.dropout = nn.Dropout(config.dropout)
+
+    def forward(self, x):
+        return self.dropout(self.c_proj(self.gelu(self.c_fc(x))))
+
+
+class Block(nn.Module):
+    def __init__(self, config):
+        super().__init__()
+        self.ln_1 = nn.LayerNorm(config.n_embd, bias=config.bias)
+        self.attn = CausalSelfAttention(config)
+        self.ln_2 = nn.LayerNorm(config.n_embd, bias=config.bias)
+        self.mlp = MLP(config)
+
+    def forward(self, x, attn_mask=None, cache=None, layer=0):
+        x = x + self.attn(self.ln_1(x), attn_mask, cache, layer)
+        x = x + self.mlp(self.ln_2(x))
+        return x
+
+
+class GPT(nn.Module):
+    def __init__(self, config):
+        super().__init__()
+        self.config = config
+        self.transformer = nn.ModuleDict(dict(
+            wte=nn.Embedding(config.vocab_size, config.n_embd),
+            wpe=nn.Embedding(config.block_size, config.n_embd),
+            drop=nn.Dropout(config.dropout),
+            h=nn.ModuleList([Block(config) for _ in range(config.n_layer)]),
+            ln_f=nn.LayerNorm(config.n_embd, bias=config.bias),
+        ))
+        self.lm_head = nn.Linear(config.n_embd, config.vocab_size, bias=False)
+        self.transformer.wte.weight = self.lm_head.weight  # weight tying
+        self.apply(self._init_weights)
+        for name, p in self.named_parameters():
+            if name.endswith('c_proj.weight'):
+                torch.nn.init.normal_(p, mean=0.0, std=0.02 / math.sqrt(2 * config.n_layer))
+
+    def _init_weights(self, module):
+        if isinstance(module, nn.Linear):
+            torch.nn.init.normal_(module.weight, mean=0.0, std=0.02)
+            if module.bias is not None:
+                torch.nn.init.zeros_(module.bias)
+        elif isinstance(module, nn.Embedding):
+            torch.nn.init.normal_(module.weight, mean=0.0, std=0.02)
+
+    def num_params(self):
+        return sum(p.numel() for p in self.parameters()) - self.transformer.wpe.weight.numel()
+
+    def forward(self, idx, targets=None, doc_ids=None, cache=None):
+        """
+        idx: (B, T). targets: (B, T) con -1 en las posiciones que no cuentan para la loss.
+        doc_ids: (B, T) opcional, la entrada de cada token (-1 = relleno).
+        cache: KVCache opcional; idx son entonces los tokens que siguen a los ya cacheados.
+        """
+        B, T = idx.size()
+        past = cache.length if cache is not None else 0
+        assert past + T <= self.config.block_size, f"secuencia de {past + T} > block_size {self.config.block_size}"
+        if cache is not None:
+            pos = cache.positions(T, idx.device)
+            attn_mask = cache.attn_mask(T, idx.device)
+        elif doc_ids is None:
+            pos = torch.arange(T, dtype=torch.long, device=idx.device)
+            attn_mask = None
+        else:
+            # cada entrada empaquetada se ve igual que si empezara la secuencia
+            pos = doc_positions(doc_ids)
+            attn_mask = doc_causal_mask(doc_ids)
+        x = self.transformer.drop(self.transformer.wte(idx) + self.transformer.wpe(pos))
+        for layer, block in enumerate(self.transformer.h):
+            if self.config.checkpoint_activations and self.training and torch.is_grad_enabled():
+                # solo se guarda la entrada del bloque; sus activaciones se recalculan en el backward
+                x = checkpoint(block, x, attn_mask, use_reentrant=False)
+            else:
+                x = block(x, attn_mask, cache, layer)
+        if cache is not None:
+            cache.advance(T)
+        x = self.transformer.ln_f(x)
+        if targets is None:
+            return self.lm_head(x[:, [-1], :]), None
+        logits = self.lm_head(x)
+        loss = F.cross_entropy(logits.view(-1, logits.size(-1)), targets.reshape(-1), ignore_index=-1)
+        return logits, loss
+
+    @torch.no_grad()
+    def generate(self, idx, max_new_tokens, temperature=1.0, top_k=None, use_cache=True):
+        """
+        Añade max_new_tokens tokens muestreados a idx (B, T). Con use_cache cada paso solo
+        procesa el último token contra la KVCache; sin caché, cada paso repite el forward
+        sobre todo el contexto. Los dos caminos dan los mismos tokens con la misma semilla.
+        Cuando el contexto llega a block_size, la ventana se desplaza y las posiciones de los
+        tokens cambian: entonces la caché se rellena de nuevo con la ventana recortada.
+        """
+        block_size = self.config.block_size
+        cache = None
+        if use_cache:
+            cache = KVCache(self.config, idx.size(0), idx.device, self.lm_head.weight.dtype)
+        for _ in range(max_new_tokens):
+            if cache is None:
+                logits, _ = self(idx[:, -block_size:])
+            elif cache.length == 0 or idx.size(1) > block_size:
+                cache.length = 0
+                logits, _ = self(idx[:, -block_size:], cache=cache)
+            else:
+                logits, _ = self(idx[:, -1:], cache=cache)
+            idx = torch.cat((idx, sample_logits(logits[:, -1, :], temperature, top_k)), dim=1)
+        return idx
+
+
+def sample_logits(logits, temperature=1.0, top_k=None, generator=None):
+    """Un token por fila a partir de logits (B, vocab); temperature 0 es greedy."""
+    if temperature == 0:
+        return logits.argmax(dim=-1, keepdim=True)
+    logits = logits / temperature
+    if top_k is not None:
+        v, _ = torch.topk(logits, min(top_k, logits.size(-1)))
+        logits[logits < v[:, [-1]]] = -float('inf')
+    return torch.multinomial(F.softmax(logits, dim=-1), num_samples=1, generator=generator)
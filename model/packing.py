@@ -0,0 +1,145 @@
+# packing.py
+# Empaquetado de entradas completas en secuencias de longitud fija.
+# En vez de cortar ventanas aleatorias de block_size sobre el texto concatenado (que parten
+# entradas por la mitad y dejan que la atención mezcle lemas distintos), cada entrada de
+# catalan_medieval_FINAL.jsonl se coloca entera en una secuencia con best-fit decreasing.
+# Por cada secuencia se guarda a qué entrada pertenece cada token, y el modelo lo usa para
+# aplicar una máscara causal por bloques (model.doc_causal_mask).
+import bisect
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from tokens import OUT_DIR, CharTokenizer
+
+FINAL_JSONL = OUT_DIR.parent / 'data' / 'catalan_medieval_FINAL.jsonl'
+PAD_ID = 0
+
+
+def split_long(ids, seq_len):
+    """Las entradas más largas que una secuencia se parten en trozos de seq_len."""
+    return [ids[i:i + seq_len] for i in range(0, len(ids), seq_len)]
+
+def best_fit_decreasing(lengths, capacity):
+    """
+    Asigna cada pieza (por longitud) a una secuencia: de la más larga a la más corta,
+    cada una va a la secuencia con menos hueco libre en la que quepa. Devuelve la lista
+    de secuencias como listas de índices de pieza.
+    """
+    bins = []
+    free = []  # (hueco libre, índice de secuencia), ordenado
+    for i in sorted(range(len(lengths)), key=lambda i: -lengths[i]):
+        pos = bisect.bisect_left(free, (lengths[i], -1))
+        if pos < len(free):
+            room, b = free.pop(pos)
+        else:
+            room, b = capacity, len(bins)
+            bins.append([])
+        bins[b].append(i)
+        room -= lengths[i]
+        if room > 0:
+            bisect.insort(free, (room, b))
+    return bins
+
+def pack(entries, seq_len, pad_id=PAD_ID):
+    """
+    entries: lista de listas de ids. Devuelve (tokens, docs, segments):
+      tokens (N, seq_len): ids empaquetados, con pad_id al final de cada secuencia.
+      docs (N, seq_len) int32: índice de la pieza dentro de su secuencia, -1 en el relleno.
+      segments: por secuencia, [(entrada, offset en la entrada, inicio, longitud), ...].
+    """
+    pieces = []  # (entrada, offset, ids)
+    for e, ids in enumerate(entries):
+        for k, chunk in enumerate(split_long(ids, seq_len)):
+            pieces.append((e, k * seq_len, chunk))
+    bins = best_fit_decreasing([len(p[2]) for p in pieces], seq_len)
+
+    tokens = np.full((len(bins), seq_len), pad_id, dtype=np.int64)
+    docs = np.full((len(bins), seq_len), -1, dtype=np.int32)
+    segments = []
+    for s, members in enumerate(bins):
+        pos, seg = 0, []
+        for d, i in enumerate(sorted(members)):  # orden original dentro de la secuencia
+            e, offset, chunk = pieces[i]
+            tokens[s, pos:pos + len(chunk)] = chunk
+            docs[s, pos:pos + len(chunk)] = d
+            seg.append((e, offset, pos, len(chunk)))
+            pos += len(chunk)
+        segments.append(seg)
+    return tokens, docs, segments
+
+def targets_from(tokens, docs):
+    """
+    x, y y doc_ids para el modelo a partir de secuencias de block_size + 1 tokens:
+    el objetivo de cada posición es el siguiente token solo si es de la misma entrada;
+    si no (fin de entrada o relleno) es -1 y no cuenta en la loss.
+    """
+    x, y = tokens[:, :-1], tokens[:, 1:].clone()
+    doc_x, doc_y = docs[:, :-1], docs[:, 1:]
+    y[(doc_x != doc_y) | (doc_y < 0)] = -1
+    return x, y, doc_x
+
+
+def save_packed(out_dir, split, tokens, docs, segments, dtype):
+    # un split vacío (p. ej. val con pocas entradas) no tiene máximo: initial=0 lo guarda igual
+    out_dir = Path(out_dir)
+    np.save(out_dir / f'packed_{split}_tokens.npy', tokens.astype(dtype))
+    np.save(out_dir / f'packed_{split}_docs.npy', docs.astype(np.int16 if docs.max(initial=0) < 1 << 15 else np.int32))
+    with open(out_dir / f'packed_{split}_segments.json', 'w', encoding='utf-8') as f:
+        json.dump(segments, f)
+
+def prepare_packed(jsonl_path, tokenizer, block_size, out_dir=OUT_DIR, val_fraction=0.1):
+    """Empaqueta train (primer 90% de entradas) y val por separado. Devuelve estadísticas."""
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        entries = [tokenizer.encode(json.loads(line)['text']) for line in f if line.strip()]
+    n_train = int(len(entries) * (1 - val_fraction))
+    stats = {}
+    for split, part in (('train', entries[:n_train]), ('val', entries[n_train:])):
+        tokens, docs, segments = pack(part, block_size + 1)
+        save_packed(out_dir, split, tokens, docs, segments, tokenizer.dtype)
+        used = int((docs >= 0).sum())
+        stats[split] = {'entries': len(part), 'sequences': len(tokens), 'tokens': used,
+                        'fill': used / tokens.size if tokens.size else 0.0}
+    return stats
+
+
+class PackedBatches:
+    """Batches (x, y, doc_ids) de secuencias empaquetadas, sorteadas con una semilla fija."""
+    def __init__(self, split, batch_size, out_dir=OUT_DIR, seed=1337, shard=(0, 1)):
+        self.tokens = np.load(Path(out_dir) / f'packed_{split}_tokens.npy', mmap_mode='r')
+        self.docs = np.load(Path(out_dir) / f'packed_{split}_docs.npy', mmap_mode='r')
+        # shard=(rank, world_size): cada proceso ve un trozo disjunto de las secuencias
+        rank, world_size = shard
+        n = len(self.tokens) // world_size
+        self.tokens = self.tokens[rank * n:(rank + 1) * n]
+        self.docs = self.docs[rank * n:(rank + 1) * n]
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+
+    def next(self):
+        ix = np.sort(self.rng.integers(0, len(self.tokens), size=self.batch_size))
+        tokens = torch.from_numpy(self.tokens[ix].astype(np.int64))
+        docs = torch.from_numpy(self.docs[ix].astype(np.int64))
+        return targets_from(tokens, docs)
+
+
+if __name__ == "__main__":
+    jsonl_path = sys.argv[1] if len(sys.argv) > 1 else FINAL_JSONL
+    block_size = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    tok = CharTokenizer.load(OUT_DIR / 'meta.pkl')
+
+    stats = prepare_packed(jsonl_path, tok, block_size)
+    for split, s in stats.items():
+        print(f"{split}: {s['entries']} entradas -> {s['sequences']} secuencias de {block_size + 1} tokens, "
+              f"ocupación {s['fill'] * 100:.1f}%")
+
+    # ventanas ingenuas: cuántas cruzan al menos un límite de entrada
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        lengths = [len(tok.encode(json.loads(line)['text'])) + 2 for line in f if line.strip()]
+    bounds = np.cumsum(lengths)
+    starts = np.random.default_rng(0).integers(0, bounds[-1] - block_size, size=10000)
+    crossing = np.searchsorted(bounds, starts, side='right') != np.searchsorted(bounds, starts + block_size, side='right')
+    print(f"Ventanas aleatorias de {block_size} que mezclan entradas: {crossing.mean() * 100:.1f}%")
@@ -0,0 +1,214 @@
+# paged.py
+# KV-cache paginada y batching continuo para generar en CPU con muchas secuencias a la vez.
+# En vez de reservar block_size posiciones de keys/values por secuencia (KVCache), todas
+# las secuencias comparten una reserva de páginas de page_size posiciones y cada una tiene
+# su tabla de páginas, que crece a medida que genera; al terminar, sus páginas vuelven a la
+# reserva. Con entradas de longitud muy variable (limpieza.py admite hasta 2500 caracteres,
+# pero la mediana es de unos 270) caben muchas más generaciones en la misma memoria.
+# El planificador admite secuencias nuevas en cuanto hay sitio, sin esperar a que termine
+# el lote, y si en mitad de la generación se acaban las páginas expulsa la última admitida
+# y la recalcula más tarde desde su texto.
+import math
+from collections import deque
+
+import torch
+
+from model import sample_logits
+
+
+def page_bytes(config, page_size, dtype=torch.float32):
+    """Bytes de keys + values de una página en todas las capas."""
+    return 2 * config.n_layer * config.n_embd * page_size * torch.finfo(dtype).bits // 8
+
+def contiguous_bytes(config, dtype=torch.float32):
+    """Bytes de la KVCache contigua de una secuencia (block_size posiciones)."""
+    return page_bytes(config, config.block_size, dtype)
+
+
+class PagePool:
+    """
+    Páginas de keys/values compartidas: (n_layer, n_pages, page_size, n_head, head_size).
+    Con la posición antes que la cabeza, las páginas de una fila juntas ya son su secuencia.
+    """
+    def __init__(self, config, n_pages, page_size=16, dtype=torch.float32):
+        shape = (config.n_layer, n_pages, page_size, config.n_head, config.n_embd // config.n_head)
+        self.k = torch.zeros(shape, dtype=dtype)
+        self.v = torch.zeros_like(self.k)
+        self.n_pages = n_pages
+        self.page_size = page_size
+        self._free = list(range(n_pages - 1, -1, -1))
+
+    @classmethod
+    def for_budget(cls, config, budget_bytes, page_size=16, dtype=torch.float32):
+        return cls(config, budget_bytes // page_bytes(config, page_size, dtype), page_size, dtype)
+
+    @property
+    def n_free(self):
+        return len(self._free)
+
+    def pages_for(self, n_tokens):
+        return math.ceil(n_tokens / self.page_size)
+
+    def alloc(self):
+        return self._free.pop()
+
+    def release(self, pages):
+        self._free.extend(reversed(pages))
+        pages.clear()
+
+
+class Sequence:
+    """Una generación: prompt, tokens generados, páginas asignadas y posiciones ya en caché."""
+    def __init__(self, rid, prompt, max_new_tokens):
+        self.rid = rid
+        self.prompt = list(prompt)
+        self.max_new_tokens = max_new_tokens
+        self.out = []
+        self.pages = []
+        self.length = 0
+
+    @property
+    def tokens(self):
+        return self.prompt + self.out
+
+
+class PagedKVCache:
+    """
+    Vista de un paso del modelo sobre las secuencias `seqs`, cada una con T tokens nuevos
+    detrás de sus `length` posiciones en caché (cada fila con la suya). Misma interfaz que
+    KVCache para GPT.forward: reserva las páginas que falten, escribe las keys/values
+    nuevas en su página y desplazamiento, y para atender junta las páginas de cada fila en
+    un tensor (B, n_head, L, head_size), enmascarando lo que queda más allá de cada fila.
+    """
+    def __init__(self, pool, seqs, T):
+        self.pool, self.seqs = pool, seqs
+        P = pool.page_size
+        for s in seqs:
+            while len(s.pages) * P < s.length + T:
+                s.pages.append(pool.alloc())
+        lengths = torch.tensor([s.length for s in seqs])
+        self.length = int(lengths.max())
+        qpos = lengths[:, None] + torch.arange(T)                                   # (B, T)
+        pages = torch.tensor([[s.pages[p // P] for p in range(s.length, s.length + T)] for s in seqs])
+        self._write = (pages.reshape(-1), (qpos % P).reshape(-1))
+        n_keys = self.length + T
+        max_pages = pool.pages_for(n_keys)
+        self._table = torch.tensor([s.pages + [0] * (max_pages - len(s.pages)) for s in seqs]).view(-1)
+        self._n_keys = n_keys
+        self._pos = qpos
+        self._mask = (torch.arange(n_keys)[None, None, :] <= qpos[:, :, None]).unsqueeze(1)
+
+    def positions(self, T, device):
+        return self._pos.to(device)
+
+    def attn_mask(self, T, device):
+        return self._mask.to(device)
+
+    def update(self, layer, k, v):
+        B, H, T, hs = k.shape
+        pk, pv = self.pool.k[layer], self.pool.v[layer]
+        pk[self._write] = k.transpose(1, 2).reshape(B * T, H, hs)
+        pv[self._write] = v.transpose(1, 2).reshape(B * T, H, hs)
+        # una sola copia: (B·páginas, page_size, H, hs) -> vista (B, H, páginas·page_size, hs)
+        keys = pk.index_select(0, self._table).view(B, -1, H, hs)[:, :self._n_keys].transpose(1, 2)
+        values = pv.index_select(0, self._table).view(B, -1, H, hs)[:, :self._n_keys].transpose(1, 2)
+        return keys, values
+
+    def advance(self, T):
+        for s in self.seqs:
+            s.length += T
+
+
+class Scheduler:
+    """
+    Batching continuo sobre una PagePool. Cada step() admite secuencias de la cola (por
+    orden de llegada) mientras haya páginas para su prompt y sitio en el lote, las procesa
+    una a una (prefill) y luego avanza un token todas las que están en marcha en un solo
+    forward. Una secuencia termina al generar end_ids, al llegar a su max_new_tokens o al
+    llenar block_size, y libera sus páginas en ese momento.
+    """
+    def __init__(self, model, pool, max_batch=64, end_ids=None, temperature=1.0, top_k=None):
+        self.model = model
+        self.pool = pool
+        self.max_batch = max_batch
+        self.end_ids = list(end_ids or [])
+        self.temperature = temperature
+        self.top_k = top_k
+        self.waiting = deque()
+        self.running = []
+        self.finished = []
+        self.stats = {'steps': 0, 'rows': 0, 'tokens': 0, 'preemptions': 0, 'peak_running': 0, 'peak_pages': 0}
+
+    def add(self, seq):
+        self.waiting.append(seq)
+
+    def _done(self, seq):
+        n = len(self.end_ids)
+        return ((n and seq.out[-n:] == self.end_ids) or len(seq.out) >= seq.max_new_tokens
+                or len(seq.prompt) + len(seq.out) >= self.model.config.block_size)
+
+    def _finish(self, seq):
+        self.pool.release(seq.pages)
+        self.finished.append(seq)
+
+    def _admit(self):
+        while self.waiting and len(self.running) < self.max_batch:
+            seq = self.waiting[0]
+            # se deja una página libre por secuencia en marcha para que puedan crecer sin expulsiones
+            if self.pool.pages_for(len(seq.tokens) + 1) + len(self.running) > self.pool.n_free:
+                break
+            self.waiting.popleft()
+            # prefill (también al volver de una expulsión: se recalcula prompt + lo generado)
+            seq.length = 0
+            tokens = seq.tokens
+            logits, _ = self.model(torch.tensor([tokens]), cache=PagedKVCache(self.pool, [seq], len(tokens)))
+            seq.out.append(sample_logits(logits[:, -1, :], self.temperature, self.top_k).item())
+            self.stats['tokens'] += 1
+            if self._done(seq):
+                self._finish(seq)
+            else:
+                self.running.append(seq)
+
+    def _preempt(self):
+        """Expulsa secuencias (la última admitida primero) hasta que cada una tenga sitio para su siguiente token."""
+        P = self.pool.page_size
+        while self.running:
+            need = sum(1 for s in self.running if s.length + 1 > len(s.pages) * P)
+            if need <= self.pool.n_free:
+                return
+            victim = self.running.pop()
+            self.pool.release(victim.pages)
+            victim.length = 0
+            self.waiting.appendleft(victim)
+            self.stats['preemptions'] += 1
+
+    @torch.no_grad()
+    def step(self):
+        self._admit()
+        self._preempt()
+        if not self.running:
+            return
+        self.stats['steps'] += 1
+        self.stats['rows'] += len(self.running)
+        self.stats['peak_running'] = max(self.stats['peak_running'], len(self.running))
+        x = torch.tensor([[s.out[-1]] for s in self.running])
+        logits, _ = self.model(x, cache=PagedKVCache(self.pool, self.running, 1))
+        self.stats['peak_pages'] = max(self.stats['peak_pages'], self.pool.n_pages - self.pool.n_free)
+        nxt = sample_logits(logits[:, -1, :], self.temperature, self.top_k)[:, 0].tolist()
+        still = []
+        for seq, t in zip(self.running, nxt):
+            seq.out.append(t)
+            if self._done(seq):
+                self._finish(seq)
+            else:
+                still.append(seq)
+        self.stats['tokens'] += len(self.running)
+        self.running = still
+
+    def run(self):
+        """Hasta vaciar la cola; devuelve las secuencias terminadas en orden de rid."""
+        if self.pool.pages_for(self.model.config.block_size) > self.pool.n_pages:
+            raise ValueError("la reserva de páginas debe admitir al menos una secuencia de block_size")
+        while self.waiting or self.running:
+            self.step()
+        return sorted(self.finished, key=lambda s: s.rid)
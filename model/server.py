@@ -0,0 +1,319 @@
+# server.py
+# Servidor HTTP local de inferencia, con asyncio y sin dependencias aparte de torch.
+# Las peticiones se encolan y un único bucle las agrupa en micro-lotes: espera la primera
+# y recoge las que lleguen durante window_ms (hasta max_batch). Cada lote se genera con
+# una KVCache común, prompts rellenados por la izquierda (batch_generate.left_pad) y cada
+# secuencia saliendo del lote al llegar a <END> o a su max_new_tokens. La generación va en
+# un hilo aparte para que el bucle de eventos siga aceptando y enviando tokens.
+#
+#   POST /generate  {"prompt", "max_new_tokens", "temperature", "top_k", "seed", "stream"}
+#                   con "stream": true, la respuesta es NDJSON por trozos: {"token": ...} por
+#                   token y al final {"done": true, "text": ..., "cached": ...}
+#   GET  /metrics   profundidad de la cola, tamaños de lote, tokens y aciertos de la caché
+#
+# Las generaciones completas se guardan en una caché LRU con clave prompt + parámetros.
+import argparse
+import asyncio
+import json
+from collections import Counter, OrderedDict
+from dataclasses import astuple, dataclass
+from pathlib import Path
+
+import torch
+
+from batch_generate import END_TAG, left_pad
+from model import KVCache, sample_logits
+from tokens import CharTokenizer
+from train import load_model
+
+MAX_BODY = 1 << 20
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+
+@dataclass(frozen=True)
+class GenParams:
+    prompt: str
+    max_new_tokens: int = 128
+    temperature: float = 1.0
+    top_k: int = 0     # 0 = sin top-k
+    seed: int = -1     # -1 = sin semilla propia
+
+    def check(self):
+        """ValueError si algún campo no tiene el tipo o el rango que espera la generación."""
+        def is_int(x):
+            return isinstance(x, int) and not isinstance(x, bool)  # True/False no cuentan como números
+        if not isinstance(self.prompt, str):
+            raise ValueError("prompt debe ser un texto")
+        for name in ('max_new_tokens', 'top_k', 'seed'):
+            if not is_int(getattr(self, name)):
+                raise ValueError(f"{name} debe ser un entero")
+        if not (is_int(self.temperature) or isinstance(self.temperature, float)) or not self.temperature >= 0:
+            raise ValueError("temperature debe ser un número >= 0")
+        if self.max_new_tokens < 1:
+            raise ValueError("max_new_tokens debe ser positivo")
+        if self.top_k < 0:
+            raise ValueError("top_k debe ser >= 0")
+
+
+class Pending:
+    """Una petición en cola: sus parámetros, los ids del prompt y la cola por la que recibe los trozos."""
+    def __init__(self, params, ids):
+        self.params = params
+        self.ids = ids
+        self.out = []
+        self.pieces = asyncio.Queue()
+        self.generator = None if params.seed < 0 else torch.Generator().manual_seed(params.seed)
+
+
+class LRUCache:
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        if key not in self._data:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class InferenceServer:
+    def __init__(self, model, tokenizer, max_batch=16, window_ms=10.0, cache_size=1024):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.cache = LRUCache(cache_size)
+        self.end_ids = tokenizer.encode(END_TAG)
+        self.queue = asyncio.Queue()
+        self.batch_sizes = Counter()
+        self.requests = self.tokens = self.active = self.max_queue_depth = 0
+
+    # ---------- Cola y micro-lotes ----------
+    def submit(self, params):
+        """
+        Texto ya generado (si está en la caché) o la petición encolada. ValueError si algún
+        parámetro no es válido o si el prompt está vacío, es demasiado largo o tiene
+        caracteres fuera del vocabulario.
+        """
+        self.requests += 1
+        params.check()
+        cached = self.cache.get(astuple(params))
+        if cached is not None:
+            return cached
+        try:
+            ids = self.tokenizer.encode(params.prompt)
+        except KeyError as e:
+            raise ValueError(e.args[0]) from None
+        if not ids or len(ids) >= self.model.config.block_size:
+            raise ValueError(f"el prompt debe tener entre 1 y {self.model.config.block_size - 1} tokens")
+        req = Pending(params, ids)
+        self.queue.put_nowait(req)
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return req
+
+    async def stream(self, req):
+        """Itera los trozos de texto de una petición encolada y guarda el resultado en la caché."""
+        pieces = []
+        while (piece := await req.pieces.get()) is not None:
+            if isinstance(piece, Exception):
+                raise piece
+            pieces.append(piece)
+            yield piece
+        self.cache.put(astuple(req.params), ''.join(pieces))
+
+    async def batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.batch_sizes[len(batch)] += 1
+            await loop.run_in_executor(None, self.run_batch, batch, loop)
+
+    @torch.no_grad()
+    def run_batch(self, batch, loop):
+        """
+        Genera un lote completo (en un hilo); cada token se envía a su petición en cuanto sale.
+        Si falla el muestreo de una fila, solo esa petición recibe el error y sale del lote.
+        """
+        def emit(req, piece):
+            loop.call_soon_threadsafe(req.pieces.put_nowait, piece)
+
+        block_size, n_end = self.model.config.block_size, len(self.end_ids)
+        try:
+            rows = list(batch)
+            cache = KVCache(self.model.config, len(batch), dtype=self.model.lm_head.weight.dtype)
+            logits, _ = self.model(left_pad(cache, [r.ids for r in batch]), cache=cache)
+            self.active = len(rows)
+            steps = block_size - cache.length + 1
+            for step in range(steps):
+                last = logits[:, -1, :]
+                keep = []
+                for i, r in enumerate(rows):
+                    p = r.params
+                    try:
+                        t = sample_logits(last[i:i + 1], p.temperature, p.top_k or None, r.generator).item()
+                    except Exception as e:
+                        emit(r, e)
+                        continue
+                    r.out.append(t)
+                    emit(r, self.tokenizer.decode([t]))
+                    if r.out[-n_end:] == self.end_ids or len(r.out) >= p.max_new_tokens or step == steps - 1:
+                        emit(r, None)
+                    else:
+                        keep.append(i)
+                self.tokens += len(rows)
+                if not keep:
+                    break
+                if len(keep) < len(rows):
+                    index = torch.tensor(keep)
+                    cache.keep(index)
+                    rows = [rows[i] for i in keep]
+                    self.active = len(rows)
+                logits, _ = self.model(torch.tensor([[r.out[-1]] for r in rows]), cache=cache)
+        except Exception as e:
+            # un fallo del forward sí afecta a todo el lote: se avisa a las que siguen abiertas
+            for r in rows:
+                emit(r, e)
+        finally:
+            self.active = 0
+
+    def metrics(self):
+        batches = sum(self.batch_sizes.values())
+        return {'queue_depth': self.queue.qsize(), 'max_queue_depth': self.max_queue_depth,
+                'active': self.active, 'requests': self.requests,
+                'batches': batches, 'tokens': self.tokens,
+                'mean_batch_size': sum(k * v for k, v in self.batch_sizes.items()) / batches if batches else 0.0,
+                'batch_sizes': {str(k): v for k, v in sorted(self.batch_sizes.items())},
+                'cache': {'size': len(self.cache), 'hits': self.cache.hits, 'misses': self.cache.misses}}
+
+    # ---------- HTTP ----------
+    async def handle(self, reader, writer):
+        started = False  # ya se han enviado las cabeceras de una respuesta por trozos
+        try:
+            request_line = await reader.readline()
+            if not request_line:  # el cliente ha cerrado sin enviar nada
+                return
+            try:
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    name, colon, value = line.decode('latin-1').partition(':')
+                    if not colon:
+                        raise ValueError(f"cabecera sin ':': {line[:64]!r}")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length < 0:
+                    raise ValueError(f"Content-Length negativo: {length}")
+            except ValueError as e:  # petición mal formada: es culpa del cliente, no un 500
+                return await send_json(writer, 400, {'error': f'petición mal formada: {e}'})
+            if length > MAX_BODY:
+                return await send_json(writer, 413, {'error': 'cuerpo demasiado grande'})
+            body = await reader.readexactly(length)
+
+            if method == 'GET' and path == '/metrics':
+                return await send_json(writer, 200, self.metrics())
+            if method != 'POST' or path != '/generate':
+                return await send_json(writer, 404, {'error': f'{method} {path} no existe'})
+            try:
+                payload = json.loads(body or b'{}')
+                if not isinstance(payload, dict):
+                    raise ValueError("el cuerpo debe ser un objeto JSON")
+                streaming = bool(payload.pop('stream', False))
+                result = self.submit(GenParams(**payload))
+            except (ValueError, TypeError) as e:
+                return await send_json(writer, 400, {'error': str(e)})
+
+            cached = isinstance(result, str)
+            if not streaming:
+                text = result if cached else ''.join([p async for p in self.stream(result)])
+                return await send_json(writer, 200, {'text': text, 'cached': cached})
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n'
+                         b'Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n')
+            started = True
+            pieces = [result] if cached else []
+            if not cached:
+                async for piece in self.stream(result):
+                    pieces.append(piece)
+                    await send_chunk(writer, {'token': piece})
+            await send_chunk(writer, {'done': True, 'text': ''.join(pieces), 'cached': cached})
+            writer.write(b'0\r\n\r\n')
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            # con la respuesta por trozos ya empezada solo se puede cortar la conexión
+            if not started:
+                try:
+                    await send_json(writer, 500, {'error': f'{type(e).__name__}: {e}'})
+                except ConnectionError:
+                    pass
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8000):
+        """Arranca el bucle de micro-lotes y el servidor (port=0: un puerto libre cualquiera)."""
+        self._batcher = asyncio.create_task(self.batcher())
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def serve(self, host='127.0.0.1', port=8000):
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+
+async def send_json(writer, status, data):
+    body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+    await writer.drain()
+
+async def send_chunk(writer, data):
+    line = json.dumps(data, ensure_ascii=False).encode('utf-8') + b'\n'
+    writer.write(f"{len(line):x}\r\n".encode('latin-1') + line + b'\r\n')
+    await writer.drain()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local de inferencia de nano-GPT.")
+    parser.add_argument('--ckpt', default=str(Path(__file__).resolve().parent / 'out' / 'ckpt.pt'))
+    parser.add_argument('--data_dir', default=None, help="donde está meta.pkl (por defecto, el del checkpoint)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max_batch', type=int, default=16)
+    parser.add_argument('--window_ms', type=float, default=10.0)
+    parser.add_argument('--cache_size', type=int, default=1024)
+    args = parser.parse_args()
+
+    model, train_cfg = load_model(args.ckpt)
+    tokenizer = CharTokenizer.load(Path(args.data_dir or train_cfg['data_dir']) / 'meta.pkl')
+    server = InferenceServer(model, tokenizer, args.max_batch, args.window_ms, args.cache_size)
+    print(f"Sirviendo en http://{args.host}:{args.port} (lotes de hasta {args.max_batch}, ventana {args.window_ms} ms)")
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
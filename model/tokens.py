@@ -1,18 +1,118 @@
-import torch
-import torch.nn as nn
-from torch.nn import functional as F
+import pickle
+import sys
+from pathlib import Path
 
-# Configuramos el dispositivo
-device = 'cuda' if torch.cuda.is_available() else 'cpu'
-print(f"Estamos usando: {device}")
+import numpy as np
 
-# Para reproducibilidad
-torch.manual_seed(1337)
+OUT_DIR = Path(__file__).resolve().parent
+TRAIN_PATH = OUT_DIR.parent / 'data' / 'catalan_medieval_train.txt'
+CHUNK_CHARS = 1 << 20   # caracteres por trozo al leer y codificar
+VAL_FRACTION = 0.1
 
-# Carga de datos
-with open('/Users/polpedrajas/Desktop/PythonProjects/nano-GPT/data/catalan_medieval_train.txt', 'r', encoding='utf-8') as f:
-    text = f.read()
 
-print("Longitud del dataset en caracteres: ", len(text))
-print("\n--- Primeros 700 caracteres del dataset ---")
-print(text[:700])
\ No newline at end of file
+def iter_chunks(path, chunk_chars=CHUNK_CHARS):
+    with open(path, 'r', encoding='utf-8') as f:
+        for chunk in iter(lambda: f.read(chunk_chars), ''):
+            yield chunk
+
+def codepoints(chunk):
+    # un uint32 por carácter, sin pasar por una lista de Python
+    return np.frombuffer(chunk.encode('utf-32-le'), dtype=np.uint32)
+
+def token_dtype(vocab_size):
+    """El tipo sin signo más pequeño en el que caben todos los ids."""
+    return np.uint8 if vocab_size <= 1 << 8 else np.uint16 if vocab_size <= 1 << 16 else np.uint32
+
+
+class CharTokenizer:
+    """Tokenizador a nivel de carácter: un id por carácter distinto, en orden de código."""
+    def __init__(self, chars):
+        self.chars = sorted(chars)
+        self.vocab_size = len(self.chars)
+        self.stoi = {ch: i for i, ch in enumerate(self.chars)}
+        self.itos = {i: ch for i, ch in enumerate(self.chars)}
+        self._codes = np.array([ord(c) for c in self.chars], dtype=np.uint32)
+        self.dtype = token_dtype(self.vocab_size)
+
+    @classmethod
+    def from_file(cls, path, chunk_chars=CHUNK_CHARS):
+        chars = set()
+        for chunk in iter_chunks(path, chunk_chars):
+            chars.update(chunk)
+        return cls(chars)
+
+    @classmethod
+    def load(cls, meta_path):
+        with open(meta_path, 'rb') as f:
+            meta = pickle.load(f)
+        return cls(meta['itos'][i] for i in range(meta['vocab_size']))
+
+    def encode(self, s):
+        return self.encode_array(s).tolist()
+
+    def encode_array(self, s):
+        # searchsorted sobre los códigos ordenados: todo el trozo de una vez
+        codes = codepoints(s)
+        ids = np.searchsorted(self._codes, codes)
+        if len(codes) and (ids.max() >= self.vocab_size or (self._codes[ids] != codes).any()):
+            raise KeyError("carácter fuera del vocabulario")
+        return ids.astype(self.dtype)
+
+    def decode(self, ids):
+        return ''.join(self.itos[int(i)] for i in ids)
+
+    def meta(self):
+        return {'vocab_size': self.vocab_size, 'itos': self.itos, 'stoi': self.stoi,
+                'dtype': np.dtype(self.dtype).name}
+
+
+def prepare(path, out_dir=OUT_DIR, val_fraction=VAL_FRACTION, chunk_chars=CHUNK_CHARS):
+    """
+    Dos pasadas por trozos: la primera construye el vocabulario y cuenta caracteres, la
+    segunda codifica y escribe train.bin (primer 90%) y val.bin (resto). Nunca hay más
+    de un trozo en memoria. Devuelve el tokenizador y el número de tokens de cada split.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    chars, total = set(), 0
+    for chunk in iter_chunks(path, chunk_chars):
+        chars.update(chunk)
+        total += len(chunk)
+    tok = CharTokenizer(chars)
+    n_train = int(total * (1 - val_fraction))
+
+    written = 0
+    with open(out_dir / 'train.bin', 'wb') as train, open(out_dir / 'val.bin', 'wb') as val:
+        for chunk in iter_chunks(path, chunk_chars):
+            ids = tok.encode_array(chunk)
+            cut = max(0, min(len(ids), n_train - written))
+            train.write(ids[:cut].tobytes())
+            val.write(ids[cut:].tobytes())
+            written += len(ids)
+
+    with open(out_dir / 'meta.pkl', 'wb') as f:
+        pickle.dump(dict(tok.meta(), train_tokens=n_train, val_tokens=total - n_train), f)
+    return tok, n_train, total - n_train
+
+def load_tokens(split, out_dir=OUT_DIR):
+    """train.bin / val.bin mapeados en memoria, con el dtype guardado en meta.pkl."""
+    with open(Path(out_dir) / 'meta.pkl', 'rb') as f:
+        meta = pickle.load(f)
+    return np.memmap(Path(out_dir) / f'{split}.bin', dtype=np.dtype(meta['dtype']), mode='r')
+
+
+if __name__ == "__main__":
+    # Carga de datos
+    train_path = sys.argv[1] if len(sys.argv) > 1 else TRAIN_PATH
+    with open(train_path, 'r', encoding='utf-8') as f:
+        text = f.read(700)
+
+    print("Longitud del dataset en caracteres: ", sum(len(c) for c in iter_chunks(train_path)))
+    print("\n--- Primeros 700 caracteres del dataset ---")
+    print(text[:700])
+
+    # Vocabulario y codificación a train.bin / val.bin
+    tok, n_train, n_val = prepare(train_path)
+    print(f"\nTamaño del vocabulario: {tok.vocab_size} ({np.dtype(tok.dtype).name})")
+    print(''.join(tok.chars))
+    print(f"train.bin: {n_train:,} tokens, val.bin: {n_val:,} tokens -> {OUT_DIR}")
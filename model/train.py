@@ -0,0 +1,286 @@
+# train.py
+# Bucle de entrenamiento de nano-GPT pensado para CPU: AdamW con acumulación de gradiente,
+# LR con warmup + coseno, autocast bf16 en CPU, torch.compile opcional y checkpoints que
+# permiten reanudar. Los datos salen de train.bin/val.bin (tokens.py + loader.py) o de las
+# secuencias empaquetadas por entrada (packing.py).
+import argparse
+import math
+import pickle
+import time
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+
+import torch
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel as DDP
+
+from loader import BatchLoader
+from memory import PeakMemory, fmt_bytes
+from model import GPT, GPTConfig
+from packing import PackedBatches
+from tokens import OUT_DIR, load_tokens
+
+
+@dataclass
+class TrainConfig:
+    # datos
+    data_dir: str = str(OUT_DIR)
+    packed: bool = False         # secuencias empaquetadas por entrada (packing.py)
+    batch_size: int = 16
+    block_size: int = 256
+    grad_accum: int = 4
+    memory_budget_mb: float = 0  # >0: tune.py elige batch_size × grad_accum que quepa en este presupuesto
+    effective_batch: int = 0     # secuencias por paso para el ajuste (0 = batch_size × grad_accum)
+    # modelo
+    n_layer: int = 4
+    n_head: int = 4
+    n_embd: int = 128
+    dropout: float = 0.1
+    bias: bool = False
+    checkpoint_activations: bool = False  # recalcula cada bloque en el backward (menos RAM)
+    attn_chunk: int = 0                   # >0: atención por trozos de queries (menos RAM)
+    # optimizador
+    learning_rate: float = 1e-3
+    min_lr: float = 1e-4
+    warmup_iters: int = 100
+    lr_decay_iters: int = 5000
+    max_iters: int = 5000
+    weight_decay: float = 0.1
+    beta1: float = 0.9
+    beta2: float = 0.99
+    grad_clip: float = 1.0
+    # evaluación y checkpoints
+    eval_interval: int = 250
+    eval_iters: int = 20
+    log_interval: int = 10
+    out_dir: str = str(OUT_DIR / 'out')
+    resume: bool = False
+    # sistema
+    device: str = 'cuda' if torch.cuda.is_available() else 'cpu'
+    dtype: str = 'bfloat16'      # 'float32' o 'bfloat16' (autocast, también en CPU)
+    compile: bool = False
+    threads: int = 0             # 0 = lo que decida torch
+    seed: int = 1337
+    # paralelismo de datos (train_ddp.py)
+    bucket_mb: float = 25.0      # tamaño de los buckets del all-reduce de gradientes
+
+
+def get_lr(it, cfg):
+    """Warmup lineal y después decaimiento en coseno hasta min_lr."""
+    if it < cfg.warmup_iters:
+        return cfg.learning_rate * (it + 1) / (cfg.warmup_iters + 1)
+    if it > cfg.lr_decay_iters:
+        return cfg.min_lr
+    ratio = (it - cfg.warmup_iters) / (cfg.lr_decay_iters - cfg.warmup_iters)
+    return cfg.min_lr + 0.5 * (1.0 + math.cos(math.pi * ratio)) * (cfg.learning_rate - cfg.min_lr)
+
+def configure_optimizer(model, cfg):
+    # weight decay solo en matrices (pesos de Linear y embeddings), no en biases ni LayerNorm
+    params = [p for p in model.parameters() if p.requires_grad]
+    decay = [p for p in params if p.dim() >= 2]
+    no_decay = [p for p in params if p.dim() < 2]
+    groups = [{'params': decay, 'weight_decay': cfg.weight_decay}, {'params': no_decay, 'weight_decay': 0.0}]
+    return torch.optim.AdamW(groups, lr=cfg.learning_rate, betas=(cfg.beta1, cfg.beta2))
+
+def autocast_context(cfg):
+    if cfg.dtype == 'bfloat16':
+        return torch.autocast(device_type=torch.device(cfg.device).type, dtype=torch.bfloat16)
+    return nullcontext()
+
+
+def shard(data, rank, world_size):
+    """Trozo contiguo y disjunto de `data` para el proceso `rank`."""
+    n = len(data) // world_size
+    return data[rank * n:(rank + 1) * n]
+
+
+class Batches:
+    """
+    Une las dos fuentes de datos bajo next() -> (x, y, doc_ids o None). Con varios
+    procesos, cada uno muestrea solo de su shard del stream de tokens (o de secuencias).
+    """
+    def __init__(self, split, cfg, seed, rank=0, world_size=1):
+        self.packed = cfg.packed
+        if cfg.packed:
+            self.source = PackedBatches(split, cfg.batch_size, cfg.data_dir, seed=seed,
+                                        shard=(rank, world_size))
+        else:
+            data = shard(load_tokens(split, cfg.data_dir), rank, world_size)
+            self.source = BatchLoader(data, cfg.batch_size, cfg.block_size, seed=seed)
+
+    def next(self):
+        if self.packed:
+            return self.source.next()
+        x, y = self.source.next()
+        return x, y, None
+
+    def close(self):
+        if not self.packed:
+            self.source.close()
+
+
+def vocab_size(cfg):
+    with open(Path(cfg.data_dir) / 'meta.pkl', 'rb') as f:
+        return pickle.load(f)['vocab_size']
+
+def build_model(cfg, vocab):
+    return GPT(GPTConfig(block_size=cfg.block_size, vocab_size=vocab,
+                         n_layer=cfg.n_layer, n_head=cfg.n_head, n_embd=cfg.n_embd,
+                         dropout=cfg.dropout, bias=cfg.bias,
+                         checkpoint_activations=cfg.checkpoint_activations, attn_chunk=cfg.attn_chunk))
+
+def save_checkpoint(path, model, optimizer, cfg, iter_num, best_val_loss):
+    torch.save({'model': model.state_dict(), 'optimizer': optimizer.state_dict(),
+                'model_args': asdict(model.config), 'config': asdict(cfg),
+                'iter_num': iter_num, 'best_val_loss': best_val_loss}, path)
+
+def load_checkpoint(path, device):
+    return torch.load(path, map_location=device, weights_only=False)
+
+def load_model(path, device='cpu'):
+    """Modelo en modo eval y configuración de entrenamiento (dict) de un checkpoint."""
+    checkpoint = load_checkpoint(path, device)
+    model = GPT(GPTConfig(**checkpoint['model_args']))
+    model.load_state_dict(checkpoint['model'])
+    return model.to(device).eval(), checkpoint['config']
+
+
+@torch.no_grad()
+def estimate_loss(model, batches, cfg, ctx):
+    model.eval()
+    out = {}
+    for split, source in batches.items():
+        losses = torch.zeros(cfg.eval_iters)
+        for k in range(cfg.eval_iters):
+            x, y, docs = source.next()
+            with ctx:
+                _, loss = model(x, y, docs)
+            losses[k] = loss.item()
+        mean = losses.mean()
+        if dist.is_initialized():  # media entre todos los procesos
+            dist.all_reduce(mean)
+            mean /= dist.get_world_size()
+        out[split] = mean.item()
+    model.train()
+    return out
+
+
+def train(cfg, rank=0, world_size=1):
+    """
+    Entrena según `cfg`; devuelve el número de pasos, las pérdidas finales, el historial y
+    el modelo. Con world_size > 1 el grupo de procesos ya debe estar iniciado (train_ddp.py):
+    el modelo se envuelve en DDP y solo el rank 0 escribe logs y checkpoints.
+    """
+    master = rank == 0
+    torch.manual_seed(cfg.seed)
+    if cfg.threads:
+        torch.set_num_threads(cfg.threads)
+    out_dir = Path(cfg.out_dir)
+    if master:
+        out_dir.mkdir(parents=True, exist_ok=True)
+    ckpt_path = out_dir / 'ckpt.pt'
+
+    iter_num, best_val_loss = 0, float('inf')
+    checkpoint = load_checkpoint(ckpt_path, cfg.device) if cfg.resume and ckpt_path.exists() else None
+    model = build_model(cfg, vocab_size(cfg))
+    if checkpoint is not None:
+        model.load_state_dict(checkpoint['model'])
+        iter_num, best_val_loss = checkpoint['iter_num'], checkpoint['best_val_loss']
+    model.to(cfg.device)
+    optimizer = configure_optimizer(model, cfg)
+    if checkpoint is not None:
+        optimizer.load_state_dict(checkpoint['optimizer'])
+    checkpoint = None
+    raw_model = model
+    if world_size > 1:
+        # DDP agrupa los gradientes en buckets de bucket_mb y lanza cada all-reduce en cuanto
+        # el bucket está listo, solapándolo con el resto del backward
+        model = DDP(model, bucket_cap_mb=cfg.bucket_mb)
+    if cfg.compile:
+        model = torch.compile(model)
+    ctx = autocast_context(cfg)
+
+    # al reanudar, la semilla de los datos avanza con iter_num para no repetir los mismos batches
+    data_seed = cfg.seed + iter_num
+    train_batches = Batches('train', cfg, data_seed, rank, world_size)
+    eval_batches = {'train': Batches('train', cfg, data_seed + 1, rank, world_size),
+                    'val': Batches('val', cfg, data_seed + 2, rank, world_size)}
+    tokens_per_iter = cfg.grad_accum * cfg.batch_size * cfg.block_size * world_size
+    log = print if master else (lambda *a, **k: None)
+    log(f"Parámetros: {raw_model.num_params() / 1e6:.2f}M, tokens por iteración: {tokens_per_iter:,}")
+
+    history = []
+    t0 = time.perf_counter()
+    tokens_window = 0
+    try:
+        with PeakMemory(cfg.device) as mem:
+            while iter_num < cfg.max_iters:
+                lr = get_lr(iter_num, cfg)
+                for group in optimizer.param_groups:
+                    group['lr'] = lr
+
+                if iter_num % cfg.eval_interval == 0 and iter_num > 0:
+                    losses = estimate_loss(model, eval_batches, cfg, ctx)
+                    log(f"paso {iter_num}: train {losses['train']:.4f}, val {losses['val']:.4f}")
+                    best_val_loss = min(best_val_loss, losses['val'])
+                    # se guarda siempre el último estado: es lo que necesita --resume
+                    if master:
+                        save_checkpoint(ckpt_path, raw_model, optimizer, cfg, iter_num, best_val_loss)
+
+                for micro in range(cfg.grad_accum):
+                    x, y, docs = train_batches.next()
+                    x, y = x.to(cfg.device), y.to(cfg.device)
+                    docs = docs.to(cfg.device) if docs is not None else None
+                    # con DDP, los micro-pasos intermedios no sincronizan: un solo all-reduce por paso
+                    sync = world_size == 1 or micro == cfg.grad_accum - 1
+                    with nullcontext() if sync else model.no_sync():
+                        with ctx:
+                            _, loss = model(x, y, docs)
+                            loss = loss / cfg.grad_accum
+                        loss.backward()
+                    tokens_window += x.numel() * world_size
+                if cfg.grad_clip:
+                    torch.nn.utils.clip_grad_norm_(model.parameters(), cfg.grad_clip)
+                optimizer.step()
+                optimizer.zero_grad(set_to_none=True)
+                iter_num += 1
+
+                if iter_num % cfg.log_interval == 0:
+                    dt = time.perf_counter() - t0
+                    tok_s = tokens_window / dt
+                    history.append({'iter': iter_num, 'loss': loss.item() * cfg.grad_accum, 'lr': lr, 'tok_s': tok_s})
+                    log(f"paso {iter_num}: loss {loss.item() * cfg.grad_accum:.4f}, lr {lr:.2e}, "
+                        f"{tok_s:,.0f} tokens/s")
+                    t0, tokens_window = time.perf_counter(), 0
+            losses = estimate_loss(model, eval_batches, cfg, ctx) if cfg.eval_iters else {}
+    finally:
+        train_batches.close()
+        for b in eval_batches.values():
+            b.close()
+
+    log(f"Memoria pico: {fmt_bytes(mem.peak)} (+{fmt_bytes(mem.delta)} durante el entrenamiento)")
+    if master:
+        save_checkpoint(ckpt_path, raw_model, optimizer, cfg, iter_num,
+                        min(best_val_loss, losses.get('val', best_val_loss)))
+    return {'iter_num': iter_num, 'losses': losses, 'history': history, 'model': raw_model,
+            'peak_memory': mem.peak}
+
+
+def parse_config(argv=None):
+    """Cada campo de TrainConfig es una opción --campo (los bool aceptan true/false)."""
+    parser = argparse.ArgumentParser(description="Entrena nano-GPT sobre el dataset de catalán medieval.")
+    for f in fields(TrainConfig):
+        kind = (lambda s: s.lower() in ('1', 'true', 'yes', 'si', 'sí')) if f.type is bool else f.type
+        parser.add_argument(f"--{f.name}", type=kind, default=f.default)
+    return TrainConfig(**vars(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    from tune import autotune  # tune.py importa este módulo
+    cfg = autotune(parse_config())
+    print(f"Estamos usando: {cfg.device} ({cfg.dtype}{', compile' if cfg.compile else ''}), "
+          f"{torch.get_num_threads() if not cfg.threads else cfg.threads} hilos")
+    result = train(cfg)
+    print(f"✓ {result['iter_num']} pasos, pérdidas finales: {result['losses']}")
+    print(f"✓ Checkpoint: {Path(cfg.out_dir) / 'ckpt.pt'}")
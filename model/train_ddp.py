@@ -0,0 +1,71 @@
+# train_ddp.py
+# Entrenamiento con paralelismo de datos en CPU: lanza N procesos locales con
+# torch.distributed sobre gloo. Cada proceso entrena una réplica del modelo sobre su shard
+# disjunto de los tokens, DDP promedia los gradientes con all-reduce por buckets y solo el
+# rank 0 escribe logs y checkpoints. Acepta las mismas opciones que train.py más --workers.
+import os
+import queue
+import socket
+import sys
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from train import parse_config, train
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def worker(rank, world_size, cfg, port, results):
+    os.environ['MASTER_ADDR'] = '127.0.0.1'
+    os.environ['MASTER_PORT'] = str(port)
+    dist.init_process_group('gloo', rank=rank, world_size=world_size)
+    try:
+        # los núcleos se reparten entre procesos; si no, cada uno intentaría usarlos todos
+        torch.set_num_threads(cfg.threads or max(1, (os.cpu_count() or 1) // world_size))
+        result = train(cfg, rank, world_size)
+        if rank == 0:
+            results.put({'iter_num': result['iter_num'], 'losses': result['losses'],
+                         'history': result['history']})
+    finally:
+        dist.destroy_process_group()
+
+def train_ddp(cfg, world_size):
+    """Lanza `world_size` procesos y devuelve el resumen del rank 0."""
+    results = mp.get_context('spawn').Queue()
+    procs = mp.spawn(worker, args=(world_size, cfg, free_port(), results), nprocs=world_size, join=False)
+    # el resumen se lee antes de esperar a los procesos: con un historial largo no cabe
+    # en el buffer de la tubería y el rank 0 no termina hasta que alguien lo lee
+    while True:
+        try:
+            result = results.get(timeout=1.0)
+            break
+        except queue.Empty:
+            # join() relanza el error si algún proceso ha fallado
+            if procs.join(timeout=0):
+                try:
+                    result = results.get(timeout=1.0)
+                    break
+                except queue.Empty:
+                    raise RuntimeError("los procesos han terminado sin devolver el resumen del rank 0") from None
+    while not procs.join():
+        pass
+    return result
+
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    world_size = 2
+    if '--workers' in argv:
+        i = argv.index('--workers')
+        world_size = int(argv[i + 1])
+        del argv[i:i + 2]
+    from tune import autotune  # el presupuesto es por proceso
+    cfg = autotune(parse_config(argv))
+    print(f"Procesos: {world_size} (gloo), hilos por proceso: {cfg.threads or max(1, (os.cpu_count() or 1) // world_size)}")
+    result = train_ddp(cfg, world_size)
+    print(f"✓ {result['iter_num']} pasos, pérdidas finales: {result['losses']}")
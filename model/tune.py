@@ -0,0 +1,162 @@
+# tune.py
+# Ajuste automático de batch_size × grad_accum contra un presupuesto de memoria.
+# Dado un batch efectivo (secuencias por paso de optimizador), prueba micro-batches
+# crecientes que lo dividan con unos pocos pasos forward+backward+AdamW, mide la RSS pico
+# y los tokens/s, y se queda con el reparto más rápido que cabe en el presupuesto.
+# Cada prueba va en un proceso nuevo: la RSS que reserva el allocator no vuelve a bajar,
+# y si una prueba se queda sin memoria solo muere ese proceso. El resultado se guarda por
+# configuración de modelo y máquina en tune_cache.json.
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import asdict, replace
+from pathlib import Path
+
+import torch
+
+from memory import PeakMemory, fmt_bytes
+from train import TrainConfig, autocast_context, build_model, configure_optimizer, parse_config, vocab_size
+
+CACHE_NAME = 'tune_cache.json'
+# campos de TrainConfig que cambian la memoria o la velocidad de un paso
+MODEL_FIELDS = ('block_size', 'n_layer', 'n_head', 'n_embd', 'bias', 'dropout', 'packed',
+                'checkpoint_activations', 'attn_chunk', 'device', 'dtype', 'compile', 'threads')
+
+
+def candidates(effective_batch):
+    """Micro-batches que dividen el batch efectivo, de menor a mayor."""
+    return [b for b in range(1, effective_batch + 1) if effective_batch % b == 0]
+
+def host_id():
+    return {'node': platform.node(), 'machine': platform.machine(), 'cpus': os.cpu_count(),
+            'torch': torch.__version__}
+
+def cache_key(cfg, vocab, budget, effective_batch):
+    key = {f: getattr(cfg, f) for f in MODEL_FIELDS}
+    key.update(vocab=vocab, budget=budget, effective_batch=effective_batch, host=host_id())
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()[:16]
+
+def load_cache(path):
+    try:
+        return json.loads(Path(path).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(path, cache):
+    path = Path(path)
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(json.dumps(cache, indent=2), encoding='utf-8')
+    os.replace(tmp, path)
+
+
+def probe(cfg, steps=3):
+    """
+    Unos pasos completos (forward, backward y AdamW) con batch_size secuencias de tokens
+    aleatorios; el primero es de calentamiento y no cuenta para los tokens/s. Devuelve la
+    RSS pico del proceso, que es lo que hay que comparar con el presupuesto.
+    """
+    torch.manual_seed(cfg.seed)
+    if cfg.threads:
+        torch.set_num_threads(cfg.threads)
+    vocab = vocab_size(cfg)
+    with PeakMemory(cfg.device) as mem:
+        model = build_model(cfg, vocab).to(cfg.device)
+        optimizer = configure_optimizer(model, cfg)
+        if cfg.compile:
+            model = torch.compile(model)
+        ctx = autocast_context(cfg)
+        x = torch.randint(0, vocab, (cfg.batch_size, cfg.block_size), device=cfg.device)
+        # con packed, varias entradas por secuencia para que se use la máscara por bloques
+        docs = (torch.arange(cfg.block_size, device=cfg.device) * 4 // cfg.block_size).expand_as(x) if cfg.packed else None
+        for step in range(steps + 1):
+            if step == 1:
+                t0 = time.perf_counter()
+            with ctx:
+                _, loss = model(x, x, docs)
+            loss.backward()
+            optimizer.step()
+            optimizer.zero_grad(set_to_none=True)
+        seconds = time.perf_counter() - t0
+    return {'peak': mem.peak, 'tok_s': steps * x.numel() / seconds}
+
+def run_probe(cfg, micro_batch, steps=3):
+    """probe() en un proceso aparte; None si el proceso muere (por ejemplo, sin memoria)."""
+    cmd = [sys.executable, str(Path(__file__).resolve()), '--probe', json.dumps(asdict(replace(cfg, batch_size=micro_batch))),
+           str(steps)]
+    out = subprocess.run(cmd, capture_output=True, text=True, cwd=Path(__file__).resolve().parent)
+    if out.returncode != 0:
+        return None
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def tune(cfg, budget_mb, effective_batch, cache_path=None, force=False, verbose=True):
+    """
+    Devuelve {'batch_size', 'grad_accum', 'tok_s', 'peak', 'probes'} para `cfg` con
+    batch_size × grad_accum == effective_batch y RSS pico <= budget_mb. Consulta y actualiza
+    la caché salvo con force=True. ValueError si ni el micro-batch de 1 cabe.
+    """
+    log = print if verbose else (lambda *a, **k: None)
+    budget = int(budget_mb * (1 << 20))
+    cache_path = Path(cache_path or Path(cfg.data_dir) / CACHE_NAME)
+    key = cache_key(cfg, vocab_size(cfg), budget, effective_batch)
+    cache = load_cache(cache_path)
+    if key in cache and not force:
+        log(f"Ajuste en caché ({cache_path.name}): batch_size {cache[key]['batch_size']} × grad_accum {cache[key]['grad_accum']}")
+        return cache[key]
+
+    probes = []
+    for micro_batch in candidates(effective_batch):
+        r = run_probe(cfg, micro_batch)
+        fits = r is not None and r['peak'] <= budget
+        probes.append({'batch_size': micro_batch, **(r or {'peak': None, 'tok_s': None}), 'fits': fits})
+        if r is None:
+            log(f"  micro-batch {micro_batch:>4}: la prueba ha fallado")
+        else:
+            log(f"  micro-batch {micro_batch:>4}: {fmt_bytes(r['peak']):>10}, {r['tok_s']:,.0f} tokens/s"
+                f"{'' if fits else '  (fuera de presupuesto)'}")
+        # la memoria crece con el micro-batch: a partir del primero que no cabe, ninguno cabe
+        if not fits:
+            break
+
+    fitting = [p for p in probes if p['fits']]
+    if not fitting:
+        raise ValueError(f"ni con micro-batch 1 cabe en {budget_mb} MB: reduce block_size o activa "
+                         f"checkpoint_activations / attn_chunk")
+    best = max(fitting, key=lambda p: p['tok_s'])
+    result = {'batch_size': best['batch_size'], 'grad_accum': effective_batch // best['batch_size'],
+              'tok_s': best['tok_s'], 'peak': best['peak'], 'probes': probes}
+    cache[key] = result
+    save_cache(cache_path, cache)
+    return result
+
+def autotune(cfg, verbose=True):
+    """Si cfg.memory_budget_mb > 0, devuelve una copia de cfg con batch_size y grad_accum ajustados."""
+    if not cfg.memory_budget_mb:
+        return cfg
+    effective_batch = cfg.effective_batch or cfg.batch_size * cfg.grad_accum
+    result = tune(cfg, cfg.memory_budget_mb, effective_batch, verbose=verbose)
+    return replace(cfg, batch_size=result['batch_size'], grad_accum=result['grad_accum'])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--probe':
+        cfg = TrainConfig(**json.loads(sys.argv[2]))
+        print(json.dumps(probe(cfg, int(sys.argv[3]))))
+        sys.exit()
+
+    argv = sys.argv[1:]
+    force = '--force' in argv
+    if force:
+        argv.remove('--force')
+    cfg = parse_config(argv)
+    if not cfg.memory_budget_mb:
+        sys.exit("Indica el presupuesto con --memory_budget_mb (y opcionalmente --effective_batch)")
+    effective_batch = cfg.effective_batch or cfg.batch_size * cfg.grad_accum
+    print(f"Presupuesto {cfg.memory_budget_mb:,.0f} MB, batch efectivo {effective_batch} × {cfg.block_size} tokens")
+    result = tune(cfg, cfg.memory_budget_mb, effective_batch, force=force)
+    print(f"✓ batch_size {result['batch_size']} × grad_accum {result['grad_accum']}: "
+          f"{fmt_bytes(result['peak'])}, {result['tok_s']:,.0f} tokens/s")